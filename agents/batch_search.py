@@ -0,0 +1,135 @@
+import asyncio
+import copy
+import json
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_refiner import AsyncSearchRefiner
+from agents.query_validator import AsyncQueryValidator, QueryValidationError, validate_and_raise_async
+from agents.search_pipeline import collect_search, run_search_pipeline
+from utils.resilience import CircuitOpenError, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class EfetchBatcher:
+    """
+    Junta os efetch de buscas concorrentes: pedidos que chegam dentro de `window` segundos viram
+    uma única leitura da união dos PMIDs (cada PMID uma vez), repartida entre quem pediu.
+
+    Envolve um AsyncPubmedAPI; esearch, count_results etc. passam direto para ele.
+    """
+
+    def __init__(self, api, window: float = 0.05):
+        self.api = api
+        self.window = window
+        self.flushes = 0
+        self._pending: List = []
+        self._flusher: Optional[asyncio.Task] = None
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+    async def aiter_abstracts(self, pmids: List[str] = None, history=None, retstart: int = 0, retmax: int = None):
+        wanted = self.api._known_pmids(pmids, history, retstart, retmax)
+        if wanted is None:
+            # Página além da lista conhecida: só o history server sabe quais PMIDs vêm
+            async for article in self.api.aiter_abstracts(pmids, history, retstart, retmax):
+                yield article
+            return
+        articles = await self._request(wanted)
+        for pmid in wanted:
+            if pmid in articles:
+                yield articles[pmid]
+
+    async def fetch_abstracts(self, pmids: List[str] = None, history=None, retstart: int = 0, retmax: int = None):
+        return [article async for article in self.aiter_abstracts(pmids, history, retstart, retmax)]
+
+    async def _request(self, pmids: List[str]) -> Dict[str, Dict]:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((pmids, future))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        pending, self._pending, self._flusher = self._pending, [], None
+        union = list(dict.fromkeys(pmid for pmids, _ in pending for pmid in pmids))
+        self.flushes += 1
+        logger.info("Efetch compartilhado: %s PMIDs para %s pedidos", len(union), len(pending))
+        try:
+            articles = {article["pmid"]: article for article in await self.api.fetch_abstracts(union)}
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in pending:
+            if not future.done():
+                future.set_result(articles)
+
+
+def _dedupe_key(options: Dict) -> str:
+    return json.dumps(options, sort_keys=True, ensure_ascii=False)
+
+
+async def run_batch_search(searches: List[Dict], concurrency: int = 4, searcher=None, refiner=None,
+                           validate=None, efetch_window: float = 0.05) -> AsyncIterator[Dict]:
+    """
+    Executa várias buscas compartilhando validador, refinador, searcher e efetch.
+
+    searches são kwargs de run_search_pipeline (user_query obrigatório). Entradas idênticas rodam
+    uma vez só; até `concurrency` buscas rodam ao mesmo tempo, todas sob o rate limiter do processo.
+    Gera um evento por busca única assim que ela termina:
+        job: indexes (posições na lista de entrada), query, total_results e results.
+        error: indexes, status (400 para query inválida, 504 prazo esgotado, 503 eutils indisponível,
+            500 para os demais) e detail.
+    """
+    unique: Dict[str, List[int]] = {}
+    for index, options in enumerate(searches):
+        unique.setdefault(_dedupe_key(options), []).append(index)
+    logger.info("Lote recebido: %s buscas, %s únicas", len(searches), len(unique))
+
+    owned_refiner, owned_validator = refiner is None, None
+    refiner = refiner or AsyncSearchRefiner()
+    if validate is None:
+        owned_validator = AsyncQueryValidator()
+        validate = lambda query: validate_and_raise_async(query, validator=owned_validator)
+    # Cópia do searcher para o lote: o efetch de buscas que terminam juntas sai numa requisição só
+    searcher = copy.copy(searcher or AsyncPubmedSearcher())
+    searcher.api = EfetchBatcher(searcher.api, window=efetch_window)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(options: Dict, indexes: List[int]) -> Dict:
+        options = dict(options)
+        user_query = options.pop("user_query")
+        async with semaphore:
+            events = run_search_pipeline(user_query, searcher=searcher, refiner=refiner, validate=validate, **options)
+            try:
+                result = await collect_search(events)
+            except QueryValidationError as e:
+                return {"event": "error", "indexes": indexes, "status": 400, "detail": f"Query inválida: {str(e)}"}
+            except (DeadlineExceeded, CircuitOpenError) as e:
+                status = 504 if isinstance(e, DeadlineExceeded) else 503
+                return {"event": "error", "indexes": indexes, "status": status, "detail": str(e)}
+            except Exception as e:
+                logger.error("Erro na busca do lote %s: %s", indexes, e)
+                return {"event": "error", "indexes": indexes, "status": 500, "detail": f"Erro durante a busca: {str(e)}"}
+            finally:
+                await events.aclose()
+        return {"event": "job", "indexes": indexes, **result}
+
+    tasks = [asyncio.create_task(run_one(json.loads(key), indexes)) for key, indexes in unique.items()]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if owned_refiner:
+            await refiner.aclose()
+        if owned_validator is not None:
+            await owned_validator.aclose()
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_refiner import AsyncSearchRefiner
+from agents.query_validator import AsyncQueryValidator, validate_and_raise_async
+from utils.async_pubmed_api import build_async_client
+from utils.article_store import get_article_store
+from utils.pubmed_api import get_esearch_cache
+from utils.llm_cache import get_llm_cache
+
+logger = logging.getLogger(__name__)
+
+
+class Components:
+    """
+    Agentes de vida longa da API: searcher, refinador e validador (com seus clientes httpx e
+    AsyncAnthropic) criados uma vez no startup e compartilhados por todas as requisições.
+
+    Todos são usados no event loop da aplicação; os clientes são seguros para corrotinas
+    concorrentes e guardam só o pool de conexões, nenhum estado da busca.
+    """
+
+    def __init__(self):
+        self.searcher: Optional[AsyncPubmedSearcher] = None
+        self.refiner: Optional[AsyncSearchRefiner] = None
+        self.validator: Optional[AsyncQueryValidator] = None
+        self._client = None
+
+    @property
+    def started(self) -> bool:
+        return self.searcher is not None
+
+    async def start(self) -> "Components":
+        """Cria os agentes e abre os caches em disco (idempotente; chamado no lifespan)."""
+        if self.started:
+            return self
+        self._build()
+        # Os singletons abrem o SQLite na primeira chamada: melhor no startup que na 1ª requisição
+        await asyncio.to_thread(lambda: (get_article_store(), get_esearch_cache(), get_llm_cache()))
+        return self
+
+    def _build(self) -> None:
+        self._client = build_async_client()
+        self.searcher = AsyncPubmedSearcher(client=self._client)
+        self.refiner = AsyncSearchRefiner()
+        self.validator = AsyncQueryValidator()
+        logger.info("Componentes da API criados")
+
+    async def validate(self, query):
+        return await validate_and_raise_async(query, validator=self.validator)
+
+    def pipeline_kwargs(self) -> Dict:
+        """searcher, refiner e validate compartilhados, para run_search_pipeline/run_batch_search."""
+        if not self.started:
+            self._build()  # Sem lifespan (ex.: TestClient fora de `with`), cria na primeira requisição
+        return {"searcher": self.searcher, "refiner": self.refiner, "validate": self.validate}
+
+    def health(self) -> Dict:
+        """Estado de cada componente: criado e com o cliente aberto."""
+        checks = {
+            "pubmed": self._client is not None and not self._client.is_closed,
+            "refiner": self.refiner is not None and not self.refiner.client.is_closed(),
+            "validator": self.validator is not None and not self.validator.client.is_closed(),
+        }
+        return {"ok": all(checks.values()), "components": checks}
+
+    async def aclose(self) -> None:
+        refiner, validator, client = self.refiner, self.validator, self._client
+        self.searcher = self.refiner = self.validator = self._client = None
+        if refiner is not None:
+            await refiner.aclose()
+        if validator is not None:
+            await validator.aclose()
+        if client is not None:
+            await client.aclose()
+        logger.info("Componentes da API fechados")
@@ -0,0 +1,136 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from utils.resilience import remaining
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Step:
+    """Uma query executada no refinamento: contagem e o custo da iteração que a produziu."""
+    iteration: int
+    query: str
+    count: int
+    seconds: float = 0.0
+    llm_calls: int = 0
+
+
+class ConvergenceController:
+    """
+    Orçamento adaptativo de iterações do refinamento.
+
+    Acompanha a trajetória das contagens e o custo de cada iteração e, antes de cada nova
+    iteração, diz se ela vale a pena. A distância ao alvo é medida em escala log
+    (|ln((count + 1) / (target + 1))|): sair de 5000 para 500 é o mesmo ganho que de 500 para 50.
+
+    Para quando:
+        converged: a contagem está na janela target * (1 ± tolerance).
+        oscillation: a contagem cruzou o alvo duas vezes seguidas sem chegar mais perto que antes.
+        diverging: duas iterações seguidas se afastaram do alvo.
+        diminishing_returns: o ganho relativo da última iteração (a estimativa do próximo) ficou
+            abaixo de min_gain.
+        budget: o tempo gasto mais o custo médio de uma iteração passa de budget_seconds.
+        llm_budget: a próxima iteração passaria de max_llm_calls chamadas ao LLM.
+        deadline: o custo médio de uma iteração não cabe na metade do prazo restante da busca
+            (a outra metade fica para o efetch final).
+        max_iterations: teto fixo de iterações.
+
+    O pipeline também encerra com stable, no_candidates ou invalid_query quando o refinador não
+    produz uma query nova. A query devolvida no fim é a melhor vista (mais perto do alvo), não
+    necessariamente a última.
+    """
+
+    def __init__(self, target: int, max_iterations: int = 5, tolerance: float = 0.5, min_gain: float = 0.1,
+                 budget_seconds: Optional[float] = None, max_llm_calls: Optional[int] = None):
+        self.target = target
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.min_gain = min_gain
+        self.budget_seconds = budget_seconds
+        self.max_llm_calls = max_llm_calls
+        self.steps: List[Step] = []
+        self.best: Optional[Step] = None
+        self.reason: Optional[str] = None
+
+    def distance(self, count: int) -> float:
+        return abs(math.log((count + 1) / (self.target + 1)))
+
+    def _side(self, count: int) -> int:
+        return (count > self.target) - (count < self.target)
+
+    def observe(self, query: str, count: int, seconds: float = 0.0, llm_calls: int = 0) -> Step:
+        """Registra a query executada (a inicial com iteração 0) e atualiza a melhor."""
+        step = Step(len(self.steps), query, count, seconds, llm_calls)
+        self.steps.append(step)
+        if self.best is None or self.distance(count) < self.distance(self.best.count):
+            self.best = step
+        return step
+
+    @property
+    def iterations(self) -> int:
+        return len(self.steps) - 1
+
+    @property
+    def elapsed(self) -> float:
+        return sum(step.seconds for step in self.steps[1:])
+
+    @property
+    def llm_calls(self) -> int:
+        return sum(step.llm_calls for step in self.steps)
+
+    def expected_cost(self) -> float:
+        """Custo estimado da próxima iteração: a média das anteriores (0 antes da primeira)."""
+        return self.elapsed / self.iterations if self.iterations else 0.0
+
+    def expected_gain(self) -> Optional[float]:
+        """Ganho relativo esperado da próxima iteração: o da última (None antes da primeira)."""
+        if self.iterations < 1:
+            return None
+        before, after = self.distance(self.steps[-2].count), self.distance(self.steps[-1].count)
+        return (before - after) / before if before else 0.0
+
+    def _stop_reason(self) -> Optional[str]:
+        count = self.steps[-1].count
+        if self.target * (1 - self.tolerance) <= count <= self.target * (1 + self.tolerance):
+            return "converged"
+        if self.iterations >= self.max_iterations:
+            return "max_iterations"
+        if self.iterations >= 2:
+            distances = [self.distance(step.count) for step in self.steps[-3:]]
+            sides = [self._side(step.count) for step in self.steps[-3:]]
+            if sides[0] != sides[1] != sides[2] and distances[2] >= min(distances[:2]):
+                return "oscillation"
+            if distances[0] < distances[1] < distances[2]:
+                return "diverging"
+        gain = self.expected_gain()
+        if gain is not None and 0 <= gain < self.min_gain:
+            return "diminishing_returns"
+        cost = self.expected_cost()
+        if self.budget_seconds is not None and self.elapsed + cost > self.budget_seconds:
+            return "budget"
+        if self.max_llm_calls is not None and self.llm_calls + 1 > self.max_llm_calls:
+            return "llm_budget"
+        left = remaining()
+        if left is not None and cost * 2 > left:
+            return "deadline"
+        return None
+
+    def should_continue(self) -> bool:
+        """Decide se roda mais uma iteração; o motivo da parada fica em self.reason."""
+        self.reason = self._stop_reason()
+        if self.reason is not None and self.iterations:
+            logger.info("Refinamento encerrado (%s) após %s iterações; melhor: iteração %s com %s resultados",
+                        self.reason, self.iterations, self.best.iteration, self.best.count)
+        return self.reason is None
+
+    def summary(self) -> Dict:
+        return {
+            "reason": self.reason,
+            "iterations": self.iterations,
+            "best_iteration": self.best.iteration if self.best else None,
+            "llm_calls": self.llm_calls,
+            "seconds": round(self.elapsed, 3),
+        }
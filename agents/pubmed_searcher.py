@@ -1,48 +1,235 @@
 # C:\Users\Usuario\Desktop\projetos\PUBMED_CREW\agents\pubmed_searcher.py
-from utils.pubmed_api import PubmedAPI
+from utils.pubmed_api import ESearchResult, PubmedAPI
+from utils.async_pubmed_api import AsyncPubmedAPI
 import logging
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+def _pubmed_credentials():
+    return {
+        "email": os.getenv("PUBMED_EMAIL", "seu_email@example.com"),
+        "api_key": os.getenv("PUBMED_API_KEY")
+    }
+
+@dataclass
+class SearchResult:
+    """
+    Estado de uma query executada, carregado pelo loop de refinamento até a resposta final.
+
+    articles guarda os artigos já lidos por PMID; fetched, os PMIDs já pedidos ao efetch (um PMID
+    pedido e não devolvido não é pedido de novo). provenance registra a iteração que gerou o
+    resultado e quantas chamadas ao eutils ele custou.
+    """
+    query: str
+    count: int
+    pmids: List[str] = field(default_factory=list)
+    articles: Dict[str, Dict] = field(default_factory=dict)
+    fetched: Set[str] = field(default_factory=set)
+    history: Optional[ESearchResult] = None
+    provenance: Dict = field(default_factory=dict)
+    retmax: int = 0  # Tamanho da página de PMIDs pedida ao esearch
+
+    @classmethod
+    def from_history(cls, history: ESearchResult, retmax, iteration=None):
+        return cls(history.query, history.count, list(history.pmids), history=history, retmax=retmax,
+                   provenance={"iteration": iteration, "esearch": 1, "efetch": 0})
+
+    def needs_expansion(self, wanted) -> bool:
+        return len(self.pmids) < min(wanted, self.count) and self.retmax < wanted
+
+    @property
+    def abstracts(self) -> List[Dict]:
+        return [self.articles[pmid] for pmid in self.pmids if pmid in self.articles]
+
+    def missing(self, limit=None) -> List[str]:
+        return [pmid for pmid in self.pmids[:limit] if pmid not in self.fetched]
+
+    def add_articles(self, articles, requested):
+        for article in articles:
+            self.articles[article["pmid"]] = article
+        self.fetched.update(requested)
+        self.provenance["efetch"] = self.provenance.get("efetch", 0) + 1
+
 class PubmedSearcher:
     def __init__(self):
-        self.api = PubmedAPI(
-            email=os.getenv("PUBMED_EMAIL", "seu_email@example.com"),
-            api_key=os.getenv("PUBMED_API_KEY")
-        )
+        self.api = PubmedAPI(**_pubmed_credentials())
         self.retmax = 500  # Limite para recuperar PMIDs
 
+    def run(self, query, max_returned_results, iteration=None, fetch=True):
+        """
+        Executa a query com uma única esearch (usehistory=y) e, se fetch, lê os abstracts do history server.
+
+        Returns:
+            SearchResult: contagem, PMIDs, artigos lidos e o handle do history server.
+        """
+        retmax = min(self.retmax, max_returned_results)
+        result = SearchResult.from_history(self.api.esearch(query, retmax=retmax), retmax, iteration)
+        if fetch and result.count and result.pmids:
+            result.add_articles(self.api.fetch_abstracts(history=result.history, retmax=len(result.pmids)), result.pmids)
+        return result
+
+    def search(self, query, max_returned_results):
+        """
+        Returns:
+            tuple: (abstracts, ESearchResult) — o ESearchResult carrega contagem, PMIDs e WebEnv.
+        """
+        result = self.run(query, max_returned_results)
+        return result.abstracts, result.history
+
+    def probe(self, query, sample_size=10, iteration=None):
+        """Só contagem e uma amostra de PMIDs (sem efetch), para iterações intermediárias."""
+        result = SearchResult.from_history(self.api.esearch(query, retmax=sample_size), sample_size, iteration)
+        result.provenance["probe"] = True
+        return result
+
+    def sample(self, result, sample_size=10):
+        """Primeiros sample_size artigos de result, lendo do efetch só os que faltam."""
+        return list(self.iter_articles(result, sample_size))
+
+    def expand(self, result, max_returned_results):
+        """Completa a lista de PMIDs de um resultado obtido em modo probe (uma esearch a mais)."""
+        wanted = min(self.retmax, max_returned_results)
+        if not result.needs_expansion(wanted):
+            return result
+        history = self.api.esearch(result.query, retmax=wanted)
+        result.pmids, result.history, result.count, result.retmax = list(history.pmids), history, history.count, wanted
+        result.provenance["esearch"] = result.provenance.get("esearch", 0) + 1
+        return result
+
+    def iter_articles(self, result, limit=None):
+        """Artigos de result na ordem do esearch; só os PMIDs ainda não lidos vão ao efetch."""
+        missing = result.missing(limit)
+        if missing:
+            logger.info("Buscando %s abstracts ausentes para a query: %s", len(missing), result.query)
+            if len(missing) == len(result.pmids[:limit]) and result.history is not None and result.history.has_history:
+                articles = self.api.fetch_abstracts(history=result.history, retmax=len(missing))
+            else:
+                articles = self.api.fetch_abstracts(missing)
+            result.add_articles(articles, missing)
+        for pmid in result.pmids[:limit]:
+            if pmid in result.articles:
+                yield result.articles[pmid]
+
     def search_initial(self, query, max_returned_results):
-        total_results = self.api.count_results(query)
+        abstracts, history = self.search(query, max_returned_results)
+        total_results = history.count
         if total_results == 0:
-            logger.warning(f"Nenhum resultado encontrado para a query: {query}")
+            logger.warning("Nenhum resultado encontrado para a query: %s", query)
             return [], [], 0
         
-        pmids = self.api.fetch_pmids(query, retmax=min(self.retmax, total_results))
-        if not pmids:
-            logger.warning(f"Nenhum PMID retornado para a query: {query}")
+        if not history.pmids:
+            logger.warning("Nenhum PMID retornado para a query: %s", query)
             return [], [], total_results
         
-        selected_pmids = pmids[:max_returned_results]  # Usa o limite do request
-        abstracts = self.api.fetch_abstracts(selected_pmids)
-        logger.info(f"Inicial: {len(abstracts)} abstracts recuperados de {total_results} resultados.")
-        return abstracts, selected_pmids, total_results
+        logger.info("Inicial: %s abstracts recuperados de %s resultados.", len(abstracts), total_results)
+        return abstracts, history.pmids, total_results
 
     def search_refined(self, query, previous_abstracts, max_returned_results):
-        total_results = self.api.count_results(query)
+        abstracts, history = self.search(query, max_returned_results)
+        total_results = history.count
         if total_results == 0:
-            logger.warning(f"Nenhum resultado encontrado para a query refinada: {query}")
+            logger.warning("Nenhum resultado encontrado para a query refinada: %s", query)
             return previous_abstracts, [], total_results
         
-        pmids = self.api.fetch_pmids(query, retmax=min(self.retmax, total_results))
-        if not pmids:
-            logger.warning(f"Nenhum PMID retornado para a query refinada: {query}")
+        if not history.pmids:
+            logger.warning("Nenhum PMID retornado para a query refinada: %s", query)
             return previous_abstracts, [], total_results
         
-        selected_pmids = pmids[:max_returned_results]  # Usa o limite do request
-        abstracts = self.api.fetch_abstracts(selected_pmids)
-        logger.info(f"Refinado: {len(abstracts)} abstracts recuperados de {total_results} resultados.")
-        return abstracts, selected_pmids, total_results
\ No newline at end of file
+        logger.info("Refinado: %s abstracts recuperados de %s resultados.", len(abstracts), total_results)
+        return abstracts, history.pmids, total_results
+
+class AsyncPubmedSearcher:
+    """Mesmo fluxo do PubmedSearcher usando o AsyncPubmedAPI."""
+
+    def __init__(self, client=None):
+        # Sem client, usa o AsyncClient compartilhado do event loop atual
+        self.api = AsyncPubmedAPI(**_pubmed_credentials(), client=client)
+        self.retmax = 500  # Limite para recuperar PMIDs
+
+    async def run(self, query, max_returned_results, iteration=None, fetch=True):
+        retmax = min(self.retmax, max_returned_results)
+        result = SearchResult.from_history(await self.api.esearch(query, retmax=retmax), retmax, iteration)
+        if fetch and result.count and result.pmids:
+            result.add_articles(await self.api.fetch_abstracts(history=result.history, retmax=len(result.pmids)), result.pmids)
+        return result
+
+    async def search(self, query, max_returned_results):
+        result = await self.run(query, max_returned_results)
+        return result.abstracts, result.history
+
+    async def probe(self, query, sample_size=10, iteration=None):
+        result = SearchResult.from_history(await self.api.esearch(query, retmax=sample_size), sample_size, iteration)
+        result.provenance["probe"] = True
+        return result
+
+    async def sample(self, result, sample_size=10):
+        return [article async for article in self.aiter_articles(result, sample_size)]
+
+    async def expand(self, result, max_returned_results):
+        wanted = min(self.retmax, max_returned_results)
+        if not result.needs_expansion(wanted):
+            return result
+        history = await self.api.esearch(result.query, retmax=wanted)
+        result.pmids, result.history, result.count, result.retmax = list(history.pmids), history, history.count, wanted
+        result.provenance["esearch"] = result.provenance.get("esearch", 0) + 1
+        return result
+
+    async def aiter_articles(self, result, limit=None):
+        """Artigos de result na ordem do esearch; os ausentes são lidos em streaming e guardados em result."""
+        missing = result.missing(limit)
+        if not missing:
+            for pmid in result.pmids[:limit]:
+                if pmid in result.articles:
+                    yield result.articles[pmid]
+            return
+        logger.info("Buscando %s abstracts ausentes para a query: %s", len(missing), result.query)
+        if len(missing) == len(result.pmids[:limit]) and result.history is not None and result.history.has_history:
+            articles = self.api.aiter_abstracts(history=result.history, retmax=len(missing))
+        else:
+            articles = self.api.aiter_abstracts(missing)
+        # Os artigos chegam na ordem de missing; os já conhecidos são intercalados na ordem do esearch
+        pending = iter(result.pmids[:limit])
+        fetched = []
+        async for article in articles:
+            fetched.append(article)
+            result.articles[article["pmid"]] = article
+            for pmid in pending:
+                if pmid in result.articles:
+                    yield result.articles[pmid]
+                if pmid == article["pmid"]:
+                    break
+        result.add_articles(fetched, missing)
+        for pmid in pending:
+            if pmid in result.articles:
+                yield result.articles[pmid]
+
+    async def search_initial(self, query, max_returned_results):
+        abstracts, history = await self.search(query, max_returned_results)
+        total_results = history.count
+        if total_results == 0:
+            logger.warning("Nenhum resultado encontrado para a query: %s", query)
+            return [], [], 0
+
+        if not history.pmids:
+            logger.warning("Nenhum PMID retornado para a query: %s", query)
+            return [], [], total_results
+
+        logger.info("Inicial: %s abstracts recuperados de %s resultados.", len(abstracts), total_results)
+        return abstracts, history.pmids, total_results
+
+    async def search_refined(self, query, previous_abstracts, max_returned_results):
+        abstracts, history = await self.search(query, max_returned_results)
+        total_results = history.count
+        if total_results == 0:
+            logger.warning("Nenhum resultado encontrado para a query refinada: %s", query)
+            return previous_abstracts, [], total_results
+
+        if not history.pmids:
+            logger.warning("Nenhum PMID retornado para a query refinada: %s", query)
+            return previous_abstracts, [], total_results
+
+        logger.info("Refinado: %s abstracts recuperados de %s resultados.", len(abstracts), total_results)
+        return abstracts, history.pmids, total_results
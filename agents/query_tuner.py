@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from itertools import combinations, product
+from typing import Dict, Iterable, List, Optional
+
+from utils.query_syntax import parse_blocks, render_blocks
+from utils.term_matrix import TermMatrix
+
+logger = logging.getLogger(__name__)
+
+# Combinações avaliadas de uma vez na TermMatrix; acima disso vale a bisseção
+MAX_VARIANTS = 4096
+_MAX_SUBSET_TERMS = 8
+
+
+@dataclass
+class TunedQuery:
+    query: str
+    count: int
+    probes: int  # Contagens pedidas ao eutils durante o ajuste
+
+
+class QueryTuner:
+    """
+    Ajusta a contagem de uma query (A OR B ...) AND (C OR D ...) sem chamar o LLM.
+
+    Para reduzir resultados, cada bloco é testado mantendo só os k sinônimos mais produtivos
+    (contagem de cada termo junto aos demais blocos, pedida em lote concorrente) e k é escolhido
+    por bisseção; blocos vistos em queries anteriores (ex.: OUTCOMES) podem ser acrescentados.
+    Para ampliar, um bloco extra (OUTCOMES) é removido ou os sinônimos de queries anteriores
+    voltam ao bloco correspondente. Retorna None quando nenhuma combinação cai na janela de
+    0.5x–1.5x do alvo: aí o vocabulário precisa mudar e o refinador (LLM) é chamado.
+
+    Com matrix_cap > 0 (padrão: QUERY_TUNER_MATRIX_CAP ou 2000), os PMIDs de cada termo são
+    baixados uma vez para uma TermMatrix, mantida entre as chamadas de tune (um tuner por busca),
+    e todas as combinações de sinônimos/blocos (até MAX_VARIANTS) são contadas localmente; só a
+    query escolhida é conferida no eutils. Se nenhuma combinação servir, ou a conferência falhar,
+    não há nova rodada com contagens reais: a resposta vai para o refinador.
+    """
+
+    def __init__(self, api, max_probes: int = 16, matrix_cap: Optional[int] = None, budget: Optional[int] = None):
+        self.api = api
+        self.max_probes = max_probes
+        if matrix_cap is None:
+            matrix_cap = int(os.getenv("QUERY_TUNER_MATRIX_CAP", 2000))
+        self.matrix_cap = matrix_cap
+        # Chamadas ao eutils somadas entre todos os tune() desta instância (uma por requisição):
+        # o rate limit de 3 req/s é do processo, então uma busca não pode gastar o orçamento de todas
+        self.budget = budget if budget is not None else int(os.getenv("QUERY_TUNER_BUDGET", 24))
+        self.spent = 0
+        self._exhausted = set()  # Vocabulários (conjuntos de termos) para os quais o ajuste já falhou
+        self._matrix: Optional[TermMatrix] = None
+
+    async def tune(self, query: str, total_results: int, target_results: int,
+                   previous_queries: Iterable[str] = ()) -> Optional[TunedQuery]:
+        blocks = parse_blocks(query)
+        if not blocks or len(blocks) < 2:
+            logger.debug("Query fora do formato de blocos, ajuste local ignorado: '%s'", query)
+            return None
+        history = [parsed for parsed in map(parse_blocks, previous_queries) if parsed and parsed != blocks]
+        low, high = 0.5 * target_results, 1.5 * target_results
+        if low <= total_results <= high:
+            return TunedQuery(query, total_results, 0)
+        terms = [term for parsed in [blocks] + history for block in parsed for term in block]
+        vocabulary = frozenset(map(_key, terms))
+        if vocabulary in self._exhausted:
+            logger.info("Ajuste local já falhou com estes termos, o refinador será chamado")
+            return None
+        tuned = None
+        if self.spent < self.budget:
+            # Com matriz, uma estimativa não confirmada não leva a outra rodada de contagens reais:
+            # a bisseção no eutils custaria mais que a chamada ao refinador que ela tenta evitar
+            counter = self._counter(query, total_results, terms if self.matrix_cap > 0 else ())
+            tuned = await self._search(counter, blocks, history, total_results, low, high)
+            self._matrix = counter.matrix or self._matrix
+        if tuned is None:
+            self._exhausted.add(vocabulary)
+            logger.info("Ajuste local sem solução, o refinador será chamado (%s/%s chamadas gastas)", self.spent, self.budget)
+        return tuned
+
+    def _counter(self, query, total_results, terms=()) -> "_Counter":
+        max_probes = min(self.max_probes, self.budget - self.spent)
+        if terms:
+            return _Counter(self.api, max_probes, {query: total_results}, terms, self.matrix_cap, base=self._matrix)
+        return _Counter(self.api, max_probes, {query: total_results})
+
+    async def _search(self, counter, blocks, history, total_results, low, high) -> Optional[TunedQuery]:
+        try:
+            variants = _variants(blocks, history, narrow=total_results > high) if counter.matrix_cap > 0 else None
+            if variants is not None:
+                tuned = await self._best_variant(counter, variants, low, high)
+            elif total_results > high:
+                tuned = await self._narrow(counter, blocks, history, low, high)
+            else:
+                tuned = await self._broaden(counter, blocks, history, low, high)
+            if tuned is not None and tuned not in counter.counts:
+                # Contagem estimada pela matriz: confere a query escolhida no eutils
+                if not low <= await counter.verify(tuned) <= high:
+                    logger.info("Estimativa da matriz não confirmada para '%s' (%s resultados)", tuned, counter.counts[tuned])
+                    tuned = None
+        except _BudgetExceeded:
+            tuned = None
+        finally:
+            self.spent += counter.calls
+        probes = len(counter.counts) - 1
+        if tuned is None:
+            return None
+        logger.info("Ajuste local: '%s' (%s resultados, %s contagens, %s estimadas localmente)",
+                    tuned, counter.counts[tuned], probes, len(counter.estimates))
+        return TunedQuery(tuned, counter.counts[tuned], probes)
+
+    async def _best_variant(self, counter, variants, low, high) -> Optional[str]:
+        """Conta todas as variantes na matriz; fica a mais próxima do alvo (empate: mais termos)."""
+        if not variants:
+            return None
+        matrix = await counter.get_matrix()
+        target = (low + high) / 2
+        best = None
+        for variant in variants:
+            count = matrix.count(variant)
+            if low <= count <= high:
+                rank = (abs(count - target), -sum(map(len, variant)))
+                if best is None or rank < best[0]:
+                    best = (rank, variant, count)
+        logger.debug("%s variantes contadas localmente", len(variants))
+        if best is None:
+            return None
+        query = render_blocks(best[1])
+        counter.estimates[query] = best[2]
+        return query
+
+    async def _ranked_terms(self, counter, blocks: List[List[str]], index: int, terms: List[str]) -> List[str]:
+        """Termos ordenados pela contagem de cada um junto aos demais blocos (lote concorrente)."""
+        counts = await asyncio.gather(*(counter.count(render_blocks(_replace(blocks, index, [term]))) for term in terms))
+        return [term for _, term in sorted(zip(counts, terms), key=lambda pair: -pair[0])]
+
+    async def _bisect(self, counter, build, lo: int, hi: int, low: float, high: float) -> Optional[str]:
+        """Menor k em [lo, hi] com contagem >= low (a contagem cresce com k); a query se ficar <= high."""
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if await counter.count(build(middle)) >= low:
+                hi = middle
+            else:
+                lo = middle + 1
+        query = build(lo)
+        count = await counter.count(query)
+        return query if low <= count <= high else None
+
+    async def _narrow(self, counter, blocks, history, low, high) -> Optional[str]:
+        # Acrescentar um bloco de queries anteriores que não está na atual (ex.: OUTCOMES)
+        for extra in _extra_blocks(blocks, history):
+            candidate = render_blocks(blocks + [extra])
+            if low <= await counter.count(candidate) <= high:
+                return candidate
+        # Manter só os k sinônimos mais produtivos de um bloco, começando pelos maiores
+        for index in sorted(range(len(blocks)), key=lambda i: -len(blocks[i])):
+            terms = blocks[index]
+            if len(terms) < 2:
+                continue
+            ranked = await self._ranked_terms(counter, blocks, index, terms)
+            tuned = await self._bisect(counter, lambda k: render_blocks(_replace(blocks, index, ranked[:k])),
+                                       1, len(ranked) - 1, low, high)
+            if tuned is not None:
+                return tuned
+            if await counter.count(render_blocks(_replace(blocks, index, ranked[:1]))) > high:
+                # Nem o melhor termo sozinho basta: fixa este bloco nele e segue restringindo o próximo
+                blocks = _replace(blocks, index, ranked[:1])
+        return None
+
+    async def _broaden(self, counter, blocks, history, low, high) -> Optional[str]:
+        # Remover o último bloco (OUTCOMES) quando a query tem mais de dois
+        if len(blocks) > 2:
+            candidate = render_blocks(blocks[:-1])
+            count = await counter.count(candidate)
+            if low <= count <= high:
+                return candidate
+            if count < low:
+                blocks = blocks[:-1]
+        # Devolver a cada bloco os sinônimos usados em queries anteriores, os mais produtivos primeiro
+        for index, terms in enumerate(blocks):
+            extra = _synonyms_from_history(terms, history)
+            if not extra:
+                continue
+            ranked = terms + await self._ranked_terms(counter, blocks, index, extra)
+            tuned = await self._bisect(counter, lambda k: render_blocks(_replace(blocks, index, ranked[:k])),
+                                       len(terms) + 1, len(ranked), low, high)
+            if tuned is not None:
+                return tuned
+        return None
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class _Counter:
+    """
+    Contagens de um ajuste: cada query vai ao eutils uma vez, até max_probes contagens.
+    Com terms e matrix_cap, as contagens vêm de uma TermMatrix montada na primeira necessidade.
+    calls soma as requisições ao eutils (contagens, conferências e uma esearch por termo da matriz).
+    """
+
+    def __init__(self, api, max_probes: int, counts: Dict[str, int], terms: List[str] = (), matrix_cap: int = 0,
+                 base: Optional[TermMatrix] = None):
+        self.api = api
+        self.max_probes = max_probes
+        self.counts = counts
+        self.estimates: Dict[str, int] = {}
+        self.terms = terms
+        self.matrix_cap = matrix_cap
+        self.calls = 0
+        self.matrix: Optional[TermMatrix] = None
+        self._base = base  # Matriz de chamadas anteriores: só termos novos vão ao eutils
+        self._matrix_lock = asyncio.Lock()
+
+    async def count(self, query: str) -> int:
+        if query in self.counts:
+            return self.counts[query]
+        if self.matrix_cap > 0:
+            if query not in self.estimates:
+                matrix = await self.get_matrix()
+                self.estimates[query] = matrix.count(parse_blocks(query))
+            return self.estimates[query]
+        return await self.verify(query)
+
+    async def verify(self, query: str) -> int:
+        """Contagem real no eutils, dentro do limite de max_probes."""
+        if len(self.counts) > self.max_probes:
+            raise _BudgetExceeded()
+        self.calls += 1
+        self.counts[query] = await self.api.count_results(query)
+        return self.counts[query]
+
+    async def get_matrix(self) -> TermMatrix:
+        async with self._matrix_lock:
+            if self.matrix is None:
+                new_terms = self._base.missing(self.terms) if self._base is not None else list(dict.fromkeys(self.terms))
+                if len(new_terms) > self.max_probes:
+                    raise _BudgetExceeded()
+                self.calls += len(new_terms)
+                self.matrix = await TermMatrix.build(self.api, self.terms, cap=self.matrix_cap, base=self._base)
+            return self.matrix
+
+
+def _subsets(terms: List[str], keep: List[str] = ()) -> List[List[str]]:
+    """keep mais cada subconjunto não vazio de terms (ou só os prefixos, se forem muitos), maiores primeiro."""
+    if len(terms) > _MAX_SUBSET_TERMS:
+        chosen = [terms[:k] for k in range(len(terms), 0, -1)]
+    else:
+        chosen = [list(combo) for size in range(len(terms), 0, -1) for combo in combinations(terms, size)]
+    return [list(keep) + subset for subset in chosen]
+
+
+def _variants(blocks, history, narrow: bool) -> Optional[List[List[List[str]]]]:
+    """
+    Todas as combinações de termos a avaliar na matriz, ou None se passarem de MAX_VARIANTS.
+
+    Para restringir: subconjuntos dos sinônimos de cada bloco, com ou sem um bloco extra de
+    queries anteriores. Para ampliar: cada bloco mais subconjuntos dos sinônimos de queries
+    anteriores, com ou sem o último bloco (OUTCOMES).
+    """
+    if narrow:
+        structures = [blocks] + [blocks + [extra] for extra in _extra_blocks(blocks, history)]
+        options = lambda block: _subsets(block)
+    else:
+        structures = [blocks] + ([blocks[:-1]] if len(blocks) > 2 else [])
+        options = lambda block: [block] + _subsets(_synonyms_from_history(block, history), keep=block)
+    variants = []
+    for structure in structures:
+        per_block = [options(block) for block in structure]
+        total = 1
+        for choices in per_block:
+            total *= len(choices)
+        if len(variants) + total > MAX_VARIANTS:
+            return None
+        variants += [list(choice) for choice in product(*per_block)]
+    return [variant for variant in variants if variant != blocks]
+
+
+def _replace(blocks: List[List[str]], index: int, terms: List[str]) -> List[List[str]]:
+    return blocks[:index] + [terms] + blocks[index + 1:]
+
+
+def _key(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def _extra_blocks(blocks: List[List[str]], history: List[List[List[str]]]) -> List[List[str]]:
+    """Blocos de queries anteriores sem nenhum termo em comum com os blocos da query atual."""
+    known = {_key(term) for terms in blocks for term in terms}
+    extras = []
+    for previous in history:
+        for terms in previous:
+            if not known & {_key(term) for term in terms} and terms not in extras:
+                extras.append(terms)
+    return extras
+
+
+def _synonyms_from_history(terms: List[str], history: List[List[List[str]]]) -> List[str]:
+    """Termos de blocos anteriores que compartilham ao menos um termo com este bloco."""
+    current = {_key(term) for term in terms}
+    extra = []
+    for previous in history:
+        for block in previous:
+            if current & {_key(term) for term in block}:
+                for term in block:
+                    if _key(term) not in current:
+                        current.add(_key(term))
+                        extra.append(term)
+    return extra
@@ -1,9 +1,8 @@
-from anthropic import Anthropic, APIError
+from anthropic import Anthropic, AsyncAnthropic, APIError
 import logging
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+from utils.llm_cache import acached_completion, cached_completion, get_llm_cache
 
 logger = logging.getLogger(__name__)
 
@@ -11,14 +10,22 @@ class QueryValidationError(Exception):
     pass
 
 class QueryValidator:
-    def __init__(self):
+    def __init__(self, use_cache=None):
         api_key = os.getenv("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY não definida no .env")
-        self.client = Anthropic(api_key=api_key)
+        self.client = self._build_client(api_key)
         self.model = "claude-3-7-sonnet-20250219"
+        # Opt-in (QUERY_VALIDATOR_CACHE=1): com temperature 0.8 a resposta hoje não é determinística
+        if use_cache is None:
+            use_cache = os.getenv("QUERY_VALIDATOR_CACHE", "0").lower() in ("1", "true", "on")
+        self.cache = get_llm_cache() if use_cache else None
+
+    def _build_client(self, api_key):
+        return Anthropic(api_key=api_key)
 
-    def validate_query(self, user_query):
+    def _build_prompt(self, user_query):
+        """Valida a entrada, aplica o hotfix de TTS e retorna (user_query ajustada, prompt)."""
         if not user_query or user_query.strip() == "":
             logger.error("Query vazia ou inválida fornecida")
             raise QueryValidationError("A query não pode ser vazia")
@@ -26,7 +33,7 @@ class QueryValidator:
         # Hotfix aplicado ANTES de enviar ao Claude
         if "TTS" in user_query:
             user_query = user_query.replace("TTS", "Tumor Treating Fields (TTFields)")
-            logger.debug(f"Query ajustada manualmente antes do LLM: {user_query}")
+            logger.debug("Query ajustada manualmente antes do LLM: %s", user_query)
         
         prompt = f"""
         Recebi a seguinte query do usuário: "{user_query}"
@@ -41,60 +48,142 @@ class QueryValidator:
         
         IMPORTANTE: Aceite qualquer query do usuário mesmo que não seja específica ou não contenha claramente uma população e intervenção.
         """
+        return user_query, prompt
+
+    def _request_params(self, prompt):
+        return {
+            "model": self.model,
+            "max_tokens": 4000,
+            "temperature": 0.8,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+
+    def _parse_response(self, response, user_query):
+        logger.debug("Query inicial gerada pelo LLM: %s", response)
+        
+        # Verificar se a resposta tem um formato minimamente válido (contém parênteses)
+        if not response or "(" not in response or ")" not in response:
+            logger.warning("LLM não gerou uma query estruturada válida, aplicando estruturação básica")
+            # Estruturação básica da query original em vez de fallback genérico
+            terms = user_query.split()
+            structured_query = "(" + " OR ".join([term for term in terms if len(term) > 3]) + ")"
+            logger.info("Query estruturada manualmente: %s", structured_query)
+            return structured_query
+            
+        return response
+
+    def _fallback_on_api_error(self, e, user_query):
+        logger.error("Erro na API Anthropic: %s", e)
+        # Em vez de levantar erro, tenta estruturar a query original
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=4000,
-                temperature=0.8,
-                messages=[{"role": "user", "content": prompt}]
+            terms = user_query.split()
+            structured_query = "(" + " OR ".join([term for term in terms if len(term) > 3]) + ")"
+            logger.info("Falha na API, query estruturada manualmente: %s", structured_query)
+            return structured_query
+        except:
+            logger.error("Falha ao estruturar query manualmente")
+            raise QueryValidationError("Erro ao processar a query com a API")
+
+    def validate_query(self, user_query, bypass_cache=False):
+        user_query, prompt = self._build_prompt(user_query)
+        try:
+            params = self._request_params(prompt)
+            response = cached_completion(
+                self.cache, "anthropic", params,
+                lambda: self.client.messages.create(**params).content[0].text.strip(),
+                bypass=bypass_cache
             )
-            response = message.content[0].text.strip()
-            logger.debug(f"Query inicial gerada pelo LLM: {response}")
+            return self._parse_response(response, user_query)
             
-            # Verificar se a resposta tem um formato minimamente válido (contém parênteses)
-            if not response or "(" not in response or ")" not in response:
-                logger.warning("LLM não gerou uma query estruturada válida, aplicando estruturação básica")
-                # Estruturação básica da query original em vez de fallback genérico
-                terms = user_query.split()
-                structured_query = "(" + " OR ".join([term for term in terms if len(term) > 3]) + ")"
-                logger.info(f"Query estruturada manualmente: {structured_query}")
-                return structured_query
-                
-            return response
+        except APIError as e:
+            return self._fallback_on_api_error(e, user_query)
+        except Exception as e:
+            logger.error("Erro inesperado: %s", e)
+            raise QueryValidationError("Erro desconhecido ao validar a query")
+
+class AsyncQueryValidator(QueryValidator):
+    """Versão assíncrona do QueryValidator, usando o cliente AsyncAnthropic."""
+
+    def _build_client(self, api_key):
+        return AsyncAnthropic(api_key=api_key)
+
+    async def aclose(self):
+        """Fecha o pool httpx do AsyncAnthropic."""
+        await self.client.close()
+
+    async def validate_query(self, user_query, bypass_cache=False):
+        user_query, prompt = self._build_prompt(user_query)
+        try:
+            params = self._request_params(prompt)
+
+            async def call():
+                message = await self.client.messages.create(**params)
+                return message.content[0].text.strip()
+
+            response = await acached_completion(self.cache, "anthropic", params, call, bypass=bypass_cache)
+            return self._parse_response(response, user_query)
             
         except APIError as e:
-            logger.error(f"Erro na API Anthropic: {e}")
-            # Em vez de levantar erro, tenta estruturar a query original
-            try:
-                terms = user_query.split()
-                structured_query = "(" + " OR ".join([term for term in terms if len(term) > 3]) + ")"
-                logger.info(f"Falha na API, query estruturada manualmente: {structured_query}")
-                return structured_query
-            except:
-                logger.error("Falha ao estruturar query manualmente")
-                raise QueryValidationError("Erro ao processar a query com a API")
+            return self._fallback_on_api_error(e, user_query)
         except Exception as e:
-            logger.error(f"Erro inesperado: {e}")
+            logger.error("Erro inesperado: %s", e)
             raise QueryValidationError("Erro desconhecido ao validar a query")
 
-def validate_and_raise(query):
-    """
-    Valida a query e retorna a query formatada.
-    Se a query for inválida, lança QueryValidationError.
-    Aceita qualquer consulta que tenha conteúdo, mesmo que genérica.
-    """
-    logger.info(f"Função validate_and_raise chamada com query: '{query}'")
+def _prevalidate(query, caller):
+    """Checagens comuns às versões síncrona e assíncrona; retorna a query pronta ou None."""
+    logger.info("Função %s chamada com query: '%s'", caller, query)
     
     if not query or query.strip() == "":
-        logger.error("Query vazia detectada em validate_and_raise")
+        logger.error("Query vazia detectada em %s", caller)
         raise QueryValidationError("A query não pode ser vazia")
     
     # É uma consulta minimalista mas válida (só tem um termo)
     if len(query.split()) == 1 and len(query) >= 3:
-        logger.info(f"Query minimalista detectada: '{query}', estruturando manualmente")
+        logger.info("Query minimalista detectada: '%s', estruturando manualmente", query)
         return f"({query})"
+    return None
+
+_shared_validator = None
+_shared_validator_lock = threading.Lock()
+
+def get_shared_validator():
+    """QueryValidator do processo: o cliente Anthropic (síncrono, thread-safe) é criado uma vez só."""
+    global _shared_validator
+    with _shared_validator_lock:
+        if _shared_validator is None:
+            _shared_validator = QueryValidator()
+        return _shared_validator
+
+def validate_and_raise(query):
+    """
+    Valida a query e retorna a query formatada.
+    Se a query for inválida, lança QueryValidationError.
+    Aceita qualquer consulta que tenha conteúdo, mesmo que genérica.
+    """
+    structured = _prevalidate(query, "validate_and_raise")
+    if structured is not None:
+        return structured
     
-    validator = QueryValidator()
-    result = validator.validate_query(query)
-    logger.info(f"Query foi validada e retornou: '{result}'")
-    return result
\ No newline at end of file
+    result = get_shared_validator().validate_query(query)
+    logger.info("Query foi validada e retornou: '%s'", result)
+    return result
+
+async def validate_and_raise_async(query, validator=None):
+    """
+    Equivalente assíncrono de validate_and_raise, sem bloquear o event loop.
+    Com validator, usa a instância dada (e seu cliente) em vez de criar e fechar uma por chamada.
+    """
+    structured = _prevalidate(query, "validate_and_raise_async")
+    if structured is not None:
+        return structured
+    
+    if validator is not None:
+        result = await validator.validate_query(query)
+    else:
+        validator = AsyncQueryValidator()
+        try:
+            result = await validator.validate_query(query)
+        finally:
+            await validator.aclose()
+    logger.info("Query foi validada e retornou: '%s'", result)
+    return result
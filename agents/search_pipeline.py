@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Dict
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_refiner import AsyncSearchRefiner
+from agents.query_validator import validate_and_raise_async
+from agents.query_tuner import QueryTuner
+from agents.convergence import ConvergenceController
+from utils.resilience import check_deadline, reset_deadline, set_deadline
+from utils.tracing import Stopwatch, record_stage, span
+
+logger = logging.getLogger(__name__)
+
+
+def summarize_abstract(abstract, max_words=50):
+    if abstract is None:
+        return "Abstract não disponível"
+    # maxsplit: abstracts estruturados completos são longos, só as primeiras palavras são separadas
+    words = abstract.split(None, max_words)
+    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+
+
+def build_result(abstract):
+    # Verificar se o abstract tem os campos necessários
+    if abstract and "pmid" in abstract:
+        return {"pmid": abstract["pmid"], "abstract": summarize_abstract(abstract.get("abstract"))}
+    logger.warning("Abstract sem campos obrigatórios: %s", abstract)
+    return None
+
+
+async def collect_search(events, on_event=None):
+    """Consome os eventos do pipeline e monta a resposta de /api/search."""
+    results = []
+    async for event in events:
+        if on_event is not None:
+            await on_event(event)
+        if event["event"] == "result":
+            results.append({"pmid": event["pmid"], "abstract": event["abstract"]})
+        elif event["event"] == "done":
+            return {"query": event["query"], "results": results, "total_results": event["total_results"]}
+
+
+async def run_search_pipeline(user_query, target_results=100, max_iterations=5, max_returned_results=50,
+                              searcher=None, refiner=None, validate=validate_and_raise_async,
+                              probe=True, strategy="sequential", candidates=3, tune=False,
+                              deadline_seconds=None, budget_seconds=None, max_llm_calls=None) -> AsyncIterator[Dict]:
+    """
+    Executa validação, busca inicial, refinamento e busca final, emitindo um evento por etapa.
+
+    Eventos (dicts com a chave "event"):
+        accepted: requisição aceita, antes de qualquer chamada externa.
+        validated: query validada pelo LLM.
+        iteration: query executada numa iteração (0 = busca inicial) e sua contagem.
+        result: um artigo resumido, emitido assim que o efetch é lido.
+        done: query final, total, quantidade de resultados retornados, provenance do resultado e
+            convergence (motivo da parada, iterações, melhor iteração, chamadas ao LLM, tempo).
+
+    O número de iterações é adaptativo (agents.convergence): o refinamento para ao convergir,
+    oscilar, divergir ou render pouco, ou quando a próxima iteração não cabe em budget_seconds,
+    max_llm_calls ou no prazo; max_iterations é só o teto. A query final é a melhor vista, não a última.
+
+    Com probe, as iterações fazem só contagem + amostra de PMIDs; os abstracts são lidos sob
+    demanda (apenas os que o refinador usa) e o download completo fica para a query final.
+
+    Com tune (opt-in), cada iteração tenta antes o QueryTuner (subconjuntos de sinônimos/blocos
+    escolhidos por contagens, sem LLM); o refinador só é chamado quando o vocabulário precisa mudar.
+    O tuner é um por busca, com orçamento próprio de chamadas ao eutils.
+
+    strategy="speculative" pede ao refinador `candidates` queries por iteração, conta todas em
+    paralelo e segue com a mais próxima de target_results.
+
+    Cada etapa (validate, tune, refine, esearch/efetch, llm, parse, summarize) é medida em
+    utils.tracing e exportada no /metrics; os spans de refinamento levam o número da iteração.
+
+    deadline_seconds limita a busca inteira: o prazo vale para toda chamada ao eutils e ao LLM
+    feita por ela (utils.resilience) e, esgotado, a busca termina com DeadlineExceeded.
+
+    A API passa searcher, refiner e validate compartilhados (agents.components); sem refiner, o
+    pipeline cria um e o fecha no fim.
+
+    Erros (ex.: QueryValidationError) são propagados para quem consome o gerador; fechar o
+    gerador (aclose) cancela a busca em andamento.
+    """
+    searcher = searcher or AsyncPubmedSearcher()
+    # Refinador criado aqui é fechado no fim (o AsyncAnthropic mantém um pool httpx próprio)
+    owned_refiner = refiner is None
+    refiner = refiner or AsyncSearchRefiner()
+    sample_size = getattr(refiner, "sample_size", 10)
+    tuner = QueryTuner(searcher.api) if tune else None
+
+    async def execute(query, iteration):
+        if probe:
+            return await searcher.probe(query, sample_size, iteration=iteration)
+        return await searcher.run(query, max_returned_results, iteration=iteration)
+
+    deadline = set_deadline(deadline_seconds)
+    try:
+        yield {"event": "accepted", "query": user_query, "target_results": target_results}
+
+        # Log detalhado antes da validação
+        logger.info("Chamando validate_and_raise_async para a query: '%s'", user_query)
+        with span("validate"):
+            validated_query = await validate(user_query)
+        logger.info("Query validada com sucesso: '%s'", validated_query)
+        yield {"event": "validated", "query": validated_query}
+
+        # Busca inicial
+        logger.info("Iniciando busca inicial com a query validada: '%s'", validated_query)
+        # Uma única esearch (usehistory=y) traz contagem, PMIDs e o handle do history server
+        result = await execute(validated_query, 0)
+        # Resultados por query executada: a resposta final reaproveita o da query escolhida
+        results = {result.query: result}
+        # Resultado com PMIDs de onde saem os abstracts do refinador
+        source = result
+        pmids, total_results = result.pmids, result.count
+        current_query = validated_query
+        logger.info("Busca inicial concluída - Query: '%s', Total: %s", validated_query, total_results)
+        yield {"event": "iteration", "iteration": 0, "query": current_query, "total_results": total_results}
+
+        if not pmids:
+            logger.warning("Sem resultados na busca inicial - Query: '%s'", current_query)
+            yield {"event": "done", "query": current_query, "total_results": total_results, "returned": 0}
+            return
+
+        logger.info("Busca inicial - Total: %s, PMIDs: %s", total_results, len(pmids))
+
+        controller = ConvergenceController(target_results, max_iterations, budget_seconds=budget_seconds,
+                                           max_llm_calls=max_llm_calls)
+        controller.observe(current_query, total_results)
+        iteration = 0
+        while controller.should_continue():
+            iteration += 1
+            check_deadline(f"a iteração {iteration}")
+            logger.info("Iteração %s/%s - Total: %s, Target: %s", iteration, max_iterations, total_results, target_results)
+            started = time.perf_counter()
+
+            evaluated = None
+            # Primeiro tenta acertar a contagem só recombinando termos, sem chamar o LLM
+            tuned = None
+            if tuner:
+                with span("tune", iteration=iteration) as current:
+                    tuned = await tuner.tune(current_query, total_results, target_results, list(results))
+                    current.set(found=tuned is not None)
+            if tuned is not None:
+                current_query = tuned.query
+                result = await execute(current_query, iteration)
+                results[result.query] = result
+            elif strategy == "speculative":
+                logger.info("Iniciando refinamento da query: '%s'", current_query)
+                abstracts = await searcher.sample(source, sample_size)
+                with span("refine", iteration=iteration, strategy=strategy, abstracts=len(abstracts)):
+                    proposals = await refiner.refine_candidates(current_query, abstracts, user_query, total_results,
+                                                                target_results, n=candidates)
+                proposals = [query for query in proposals
+                             if query != current_query and query.count("(") >= 2 and query.count(")") >= 2]
+                if not proposals:
+                    logger.info("Nenhuma query candidata nova na iteração %s", iteration)
+                    controller.reason = "no_candidates"
+                    break
+                # As contagens das candidatas saem em paralelo (só esearch); fica a mais próxima do alvo
+                logger.info("Avaliando %s queries candidatas", len(proposals))
+                evaluated = await asyncio.gather(*(searcher.probe(query, sample_size, iteration=iteration)
+                                                   for query in proposals))
+                for candidate in evaluated:
+                    results[candidate.query] = candidate
+                result = min(evaluated, key=lambda candidate: controller.distance(candidate.count))
+                current_query = result.query
+                if not probe:
+                    # Sem probe, só a candidata escolhida baixa os abstracts
+                    await searcher.expand(result, max_returned_results)
+                    await searcher.sample(result, max_returned_results)
+                logger.info("Candidata escolhida: '%s' (%s resultados)", current_query, result.count)
+            else:
+                logger.info("Iniciando refinamento da query: '%s'", current_query)
+                abstracts = await searcher.sample(source, sample_size)
+                with span("refine", iteration=iteration, strategy=strategy, abstracts=len(abstracts)):
+                    refined_query = await refiner.refine_search(current_query, abstracts, user_query, total_results, target_results)
+                logger.info("Query refinada: '%s'", refined_query)
+
+                if refined_query == current_query:
+                    logger.info("Query estabilizada na iteração %s", iteration)
+                    controller.reason = "stable"
+                    break
+
+                current_query = refined_query
+
+                # Valida se a query refinada tem a estrutura correta com parênteses
+                if current_query.count("(") < 2 or current_query.count(")") < 2:
+                    logger.warning("Query refinada com formato inválido: '%s', ficando com a melhor anterior", current_query)
+                    controller.reason = "invalid_query"
+                    break
+
+                # Executa a busca com a nova query
+                logger.info("Executando busca com query refinada: '%s'", current_query)
+                result = await execute(current_query, iteration)
+                results[result.query] = result
+            pmids, total_results = result.pmids, result.count
+            if pmids:
+                source = result  # Sem resultados, o refinador continua com os abstracts anteriores
+            controller.observe(current_query, total_results, time.perf_counter() - started,
+                               llm_calls=0 if tuned is not None else 1)
+            logger.info("Busca refinada - Total: %s, PMIDs: %s", total_results, len(pmids))
+            event = {"event": "iteration", "iteration": iteration, "query": current_query, "total_results": total_results}
+            if tuned is not None:
+                event["tuned"] = True
+            if evaluated is not None:
+                event["candidates"] = [{"query": candidate.query, "total_results": candidate.count} for candidate in evaluated]
+            yield event
+
+        # Resultado final com a melhor query vista (uma oscilação pode terminar longe do alvo)
+        if controller.best.query != current_query:
+            logger.info("Voltando à melhor query (iteração %s, %s resultados)", controller.best.iteration,
+                        controller.best.count)
+            current_query = controller.best.query
+        logger.info("Finalizando busca com query final: '%s'", current_query)
+        final = results.get(current_query)
+        if final is None:
+            final = await searcher.run(current_query, max_returned_results, fetch=False)
+        await searcher.expand(final, max_returned_results)
+        # Artigos já lidos no loop saem direto; só os ausentes vão ao efetch, resumidos à medida que são lidos
+        reused = len(final.fetched)
+        returned = 0
+        # Resumo medido só no build_result: o span não pode atravessar os yields para o consumidor
+        summarizing = Stopwatch()
+        async for abstract in searcher.aiter_articles(final, max_returned_results):
+            with summarizing:
+                summary = build_result(abstract)
+            if summary is not None:
+                returned += 1
+                yield {"event": "result", **summary}
+        record_stage("summarize", summarizing.seconds, articles=returned)
+
+        logger.info("Busca finalizada - Query: '%s', Total: %s, Retornados: %s", current_query, final.count, returned)
+        yield {"event": "done", "query": current_query, "total_results": final.count, "returned": returned,
+               "provenance": {**final.provenance, "reused_articles": min(reused, returned)},
+               "convergence": controller.summary()}
+    finally:
+        reset_deadline(deadline)
+        if owned_refiner:
+            await refiner.aclose()
@@ -1,33 +1,40 @@
 # C:\Users\Usuario\Desktop\projetos\PUBMED_CREW\agents\search_refiner.py
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 import logging
 import os
-from dotenv import load_dotenv
 import json
 import re
-
-load_dotenv()
+from utils.article import Article
+from utils.llm_cache import acached_completion, cached_completion, get_llm_cache
 
 logger = logging.getLogger(__name__)
 
 class SearchRefiner:
-    def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+    sample_size = 10  # Abstracts lidos por refinamento
+
+    def __init__(self, use_cache=True):
+        self.client = self._build_client()
         self.model = "claude-3-7-sonnet-20250219"
+        # Mesma query + abstracts + contagens geram o mesmo prompt: a resposta vem do cache
+        self.cache = get_llm_cache() if use_cache else None
+
+    def _build_client(self):
+        return Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-    def refine_search(self, current_query, abstracts, original_query, total_results, target_results):
+    def _build_prompts(self, current_query, abstracts, original_query, total_results, target_results):
+        """Monta (system_prompt, user_prompt) ou retorna None se não houver abstracts válidos."""
         # Filtrar abstracts válidos
         valid_abstracts = []
-        for abstract in abstracts[:10]:
-            if abstract and isinstance(abstract, dict) and "abstract" in abstract and abstract["abstract"] is not None:
+        for abstract in abstracts[:self.sample_size]:
+            if abstract and isinstance(abstract, (dict, Article)) and "abstract" in abstract and abstract["abstract"] is not None:
                 valid_abstracts.append(abstract["abstract"])
             else:
-                logger.warning(f"Abstract inválido ou sem conteúdo encontrado: {abstract}")
+                logger.warning("Abstract inválido ou sem conteúdo encontrado: %s", abstract)
         
         # Se não houver abstracts válidos, retornar a query atual
         if not valid_abstracts:
             logger.warning("Nenhum abstract válido para refinar a busca")
-            return current_query
+            return None
         
         sampled_abstracts = valid_abstracts
         
@@ -65,44 +72,166 @@ class SearchRefiner:
         - RETURN ONLY THE QUERY, NOTHING ELSE.
         """
         
-        logger.info(f"Starting query refinement for original query: '{original_query}'")
-        logger.debug(f"Current query: '{current_query}'")
-        logger.debug(f"Total results: {total_results}, Target results: {target_results}")
-        logger.debug(f"Sampled abstracts: {json.dumps(sampled_abstracts)}")
+        logger.info("Starting query refinement for original query: '%s'", original_query)
+        logger.debug("Current query: '%s'", current_query)
+        logger.debug("Total results: %s, Target results: %s", total_results, target_results)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sampled abstracts: %s", json.dumps(sampled_abstracts))
+        
+        return system_prompt, user_prompt
+
+    def _request_params(self, system_prompt, user_prompt):
+        return {
+            "model": self.model,
+            "max_tokens": 7000,
+            "temperature": 0.2,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": user_prompt}]
+        }
+
+    @staticmethod
+    def _message_text(message):
+        text = ""
+        for content in message.content:
+            if content.type == "text":
+                text = content.text.strip()
+        return text
+
+    def _build_candidate_prompts(self, current_query, abstracts, original_query, total_results, target_results, n):
+        """Mesmos prompts do refinamento, pedindo n variantes (mais ampla, equilibrada, mais restrita)."""
+        prompts = self._build_prompts(current_query, abstracts, original_query, total_results, target_results)
+        if prompts is None:
+            return None
+        system_prompt, user_prompt = prompts
+        user_prompt += f"""
+        Return {n} DIFFERENT candidate queries instead of one, ONE QUERY PER LINE, ordered from the
+        broadest to the narrowest variant (e.g., broader, balanced, narrower), each following all rules above.
+        NO numbering, labels or any other text.
+        """
+        return system_prompt, user_prompt
+
+    def _is_valid_query(self, query):
+        if not query or query.count("(") < 2 or query.count(")") < 2:
+            return False
+        return all(len(term.split()) <= 3 for term in re.findall(r'"([^"]*)"', query))
+
+    def _parse_candidates(self, text, n):
+        candidates = []
+        for line in (text or "").splitlines():
+            query = line.strip()
+            if self._is_valid_query(query) and query not in candidates:
+                candidates.append(query)
+            elif query:
+                logger.warning("Discarding invalid candidate query: '%s'", query)
+        if not candidates:
+            # Nenhuma linha válida: trata a resposta como uma query única (com o fallback habitual)
+            return [self._parse_response(text)]
+        logger.info("%s candidate queries generated", len(candidates[:n]))
+        return candidates[:n]
+
+    def _parse_response(self, refined_query):
+        logger.debug("Raw response from Claude: '%s'", refined_query)
+        
+        # Validação com regex
+        if not refined_query or refined_query.count("(") < 2 or refined_query.count(")") < 2:
+            logger.warning("Response lacks two parenthetical blocks, applying fallback")
+            refined_query = '("high grade glioma" OR GBM OR "brain tumor" OR HGG OR "grade 4") AND ("tumor treating fields" OR TTF OR Optune OR "electric fields" OR Novocure)'
+        else:
+            quoted_terms = re.findall(r'"([^"]*)"', refined_query)
+            for term in quoted_terms:
+                if len(term.split()) > 3:
+                    logger.warning("Found invalid term with more than 3 words: '%s', applying fallback", term)
+                    refined_query = '("high grade glioma" OR GBM OR "brain tumor" OR HGG OR "grade 4") AND ("tumor treating fields" OR TTF OR Optune OR "electric fields" OR Novocure)'
+                    break
+        
+        logger.info("Refined query generated: '%s'", refined_query)
+        return refined_query
+
+    def refine_search(self, current_query, abstracts, original_query, total_results, target_results, bypass_cache=False):
+        prompts = self._build_prompts(current_query, abstracts, original_query, total_results, target_results)
+        if prompts is None:
+            return current_query
         
         try:
             logger.debug("Sending prompt to Claude")
             
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=7000,
-                temperature=0.2,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_prompt}]
+            params = self._request_params(*prompts)
+            text = cached_completion(
+                self.cache, "anthropic", params,
+                lambda: self._message_text(self.client.messages.create(**params)),
+                bypass=bypass_cache
             )
+            return self._parse_response(text)
             
-            refined_query = ""
-            for content in message.content:
-                if content.type == "text":
-                    refined_query = content.text.strip()
-            
-            logger.debug(f"Raw response from Claude: '{refined_query}'")
-            
-            # Validação com regex
-            if not refined_query or refined_query.count("(") < 2 or refined_query.count(")") < 2:
-                logger.warning("Response lacks two parenthetical blocks, applying fallback")
-                refined_query = '("high grade glioma" OR GBM OR "brain tumor" OR HGG OR "grade 4") AND ("tumor treating fields" OR TTF OR Optune OR "electric fields" OR Novocure)'
-            else:
-                quoted_terms = re.findall(r'"([^"]*)"', refined_query)
-                for term in quoted_terms:
-                    if len(term.split()) > 3:
-                        logger.warning(f"Found invalid term with more than 3 words: '{term}', applying fallback")
-                        refined_query = '("high grade glioma" OR GBM OR "brain tumor" OR HGG OR "grade 4") AND ("tumor treating fields" OR TTF OR Optune OR "electric fields" OR Novocure)'
-                        break
+        except Exception as e:
+            logger.error("Error refining query: %s", e)
+            return current_query
+
+    def refine_candidates(self, current_query, abstracts, original_query, total_results, target_results, n=3,
+                          bypass_cache=False):
+        """Pede n queries candidatas numa única chamada; retorna [current_query] se não houver o que refinar."""
+        prompts = self._build_candidate_prompts(current_query, abstracts, original_query, total_results, target_results, n)
+        if prompts is None:
+            return [current_query]
+
+        try:
+            params = self._request_params(*prompts)
+            text = cached_completion(
+                self.cache, "anthropic", params,
+                lambda: self._message_text(self.client.messages.create(**params)),
+                bypass=bypass_cache
+            )
+            return self._parse_candidates(text, n)
+
+        except Exception as e:
+            logger.error("Error generating candidate queries: %s", e)
+            return [current_query]
+
+class AsyncSearchRefiner(SearchRefiner):
+    """Versão assíncrona do SearchRefiner, usando o cliente AsyncAnthropic."""
+
+    def _build_client(self):
+        return AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+    async def aclose(self):
+        """Fecha o pool httpx do AsyncAnthropic."""
+        await self.client.close()
+
+    async def refine_search(self, current_query, abstracts, original_query, total_results, target_results, bypass_cache=False):
+        prompts = self._build_prompts(current_query, abstracts, original_query, total_results, target_results)
+        if prompts is None:
+            return current_query
+        
+        try:
+            logger.debug("Sending prompt to Claude")
             
-            logger.info(f"Refined query generated: '{refined_query}'")
-            return refined_query
+            params = self._request_params(*prompts)
+
+            async def call():
+                return self._message_text(await self.client.messages.create(**params))
+
+            text = await acached_completion(self.cache, "anthropic", params, call, bypass=bypass_cache)
+            return self._parse_response(text)
             
         except Exception as e:
-            logger.error(f"Error refining query: {e}")
-            return current_query
\ No newline at end of file
+            logger.error("Error refining query: %s", e)
+            return current_query
+
+    async def refine_candidates(self, current_query, abstracts, original_query, total_results, target_results, n=3,
+                                bypass_cache=False):
+        prompts = self._build_candidate_prompts(current_query, abstracts, original_query, total_results, target_results, n)
+        if prompts is None:
+            return [current_query]
+
+        try:
+            params = self._request_params(*prompts)
+
+            async def call():
+                return self._message_text(await self.client.messages.create(**params))
+
+            text = await acached_completion(self.cache, "anthropic", params, call, bypass=bypass_cache)
+            return self._parse_candidates(text, n)
+
+        except Exception as e:
+            logger.error("Error generating candidate queries: %s", e)
+            return [current_query]
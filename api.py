@@ -1,12 +1,27 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from dotenv import load_dotenv
 import os
-from agents.pubmed_searcher import PubmedSearcher
-from agents.search_refiner import SearchRefiner
-from agents.query_validator import validate_and_raise, QueryValidationError
+from typing import List, Literal, Optional
+from agents.query_validator import QueryValidationError
+from agents.search_pipeline import collect_search, run_search_pipeline
+from agents.batch_search import run_batch_search
+from agents.components import Components
+from utils.metrics import all_metrics, render_prometheus
+from utils.article_store import get_article_store
+from utils.pubmed_api import get_esearch_cache
+from utils.async_pubmed_api import close_shared_async_client
+from utils.llm_cache import get_llm_cache
+from utils.single_flight import flight_stats
+from utils.cassette import record_events, recording_dir
+from utils.job_queue import JobQueue, QueueFullError, build_job_store
+from utils.resilience import CircuitOpenError, DeadlineExceeded, breaker_stats
 
 load_dotenv()
 
@@ -22,7 +37,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    await components.start()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await components.aclose()
+    # Fecha as conexões keep-alive do cliente assíncrono do eutils
+    await close_shared_async_client()
+
+# Searcher, refinador e validador compartilhados por todas as requisições
+components = Components()
+
+# Jobs de busca: workers limitam quantas buscas (e chamadas ao Claude) rodam ao mesmo tempo
+job_queue = JobQueue(
+    lambda payload, emit: run_search_job(payload, emit),  # Definida mais abaixo
+    workers=int(os.getenv("JOB_WORKERS", 4)),
+    max_queued=int(os.getenv("JOB_QUEUE_MAX", 32)),
+    result_ttl=float(os.getenv("JOB_RESULT_TTL", 3600)),
+    store=build_job_store(os.getenv("JOB_STORE_PATH"), float(os.getenv("JOB_RESULT_TTL", 3600))),
+)
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuração de CORS
 app.add_middleware(
@@ -36,117 +73,260 @@ app.add_middleware(
 class SearchRequest(BaseModel):
     picott_text: str
     target_results: int = 100
-    max_iterations: int = 5
+    max_iterations: int = 5  # Teto; o refinamento para antes ao convergir ou render pouco
     max_returned_results: int = 50
+    probe: bool = True  # Iterações intermediárias só com contagem + amostra
+    strategy: Literal["sequential", "speculative"] = "sequential"
+    candidates: int = 3  # Queries avaliadas por iteração na estratégia speculative
+    tune: bool = False  # Ajuste local da contagem (sem LLM) antes de cada refinamento; gasta esearches extras
+    deadline_seconds: Optional[float] = None  # Prazo total da busca (padrão SEARCH_DEADLINE_SECONDS ou 120 s)
+    budget_seconds: Optional[float] = None  # Tempo máximo gasto no loop de refinamento
+    max_llm_calls: Optional[int] = None  # Chamadas ao LLM permitidas no refinamento
 
-def summarize_abstract(abstract, max_words=50):
-    if abstract is None:
-        return "Abstract não disponível"
-    words = abstract.split()
-    return " ".join(words[:max_words]) + ("..." if len(words) > max_words else "")
+class BatchSearchRequest(BaseModel):
+    searches: List[SearchRequest]
+    concurrency: int = 4  # Buscas simultâneas do lote (todas sob o mesmo rate limiter do eutils)
 
 @app.post("/api/search")
 async def search_pubmed(request: SearchRequest):
     user_query = request.picott_text
-    max_iterations = min(request.max_iterations, 5)
-    max_returned_results = min(request.max_returned_results, 100)
-    target_results = request.target_results
+    logger.info("Requisição recebida - Query: '%s', Target: %s, Max iterações: %s", user_query, request.target_results, request.max_iterations)
+    check_query(user_query)
+
+    try:
+        return await collect_search(search_events(request))
 
-    logger.info(f"Requisição recebida - Query: '{user_query}', Target: {target_results}, Max iterações: {max_iterations}")
+    except QueryValidationError as e:
+        logger.error("Erro na validação da query: %s", str(e))
+        raise HTTPException(status_code=400, detail=f"Query inválida: {str(e)}")
+
+    except DeadlineExceeded as e:
+        logger.warning("Prazo da busca esgotado: %s", e)
+        raise HTTPException(status_code=504, detail=str(e))
+
+    except CircuitOpenError as e:
+        logger.warning("Busca recusada: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+        logger.error("Erro inesperado: %s", str(e))
+        raise HTTPException(status_code=500, detail=f"Erro durante a busca: {str(e)}")
 
+@app.post("/api/search/stream")
+async def search_pubmed_stream(request: SearchRequest):
+    """Mesma busca de /api/search, emitindo cada etapa como Server-Sent Events."""
+    logger.info("Requisição de stream recebida - Query: '%s'", request.picott_text)
+    check_query(request.picott_text)
+
+    async def stream():
+        async for event in error_events(search_events(request)):
+            yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    # Se o cliente desconectar, o Starlette cancela o gerador e a busca para junto
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/search/batch")
+async def search_pubmed_batch(batch: BatchSearchRequest):
+    """
+    Várias buscas numa requisição, respondidas em NDJSON (uma linha por busca, na ordem em que
+    terminam). Entradas idênticas rodam uma vez; validador, refinador e efetch são compartilhados.
+    """
+    if not batch.searches:
+        raise HTTPException(status_code=400, detail="O lote precisa de ao menos uma busca")
+    max_searches = int(os.getenv("BATCH_MAX_SEARCHES", 100))
+    if len(batch.searches) > max_searches:
+        raise HTTPException(status_code=400, detail=f"O lote aceita no máximo {max_searches} buscas")
+    for request in batch.searches:
+        check_query(request.picott_text)
+    logger.info("Lote recebido - %s buscas", len(batch.searches))
+
+    async def stream():
+        events = batch_events(batch)
+        try:
+            async for event in events:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/search")
+async def search_pubmed_ws(websocket: WebSocket):
+    """
+    Busca via WebSocket: o cliente envia o JSON de SearchRequest e recebe um evento por mensagem.
+    Enviar {"action": "cancel"} ou fechar a conexão interrompe a busca.
+    """
+    await websocket.accept()
+    try:
+        request = SearchRequest(**await websocket.receive_json())
+        check_query(request.picott_text)
+    except (ValidationError, HTTPException, ValueError) as e:
+        await websocket.send_json({"event": "error", "status": 400, "detail": str(getattr(e, "detail", e))})
+        await websocket.close()
+        return
+
+    async def send_events():
+        async for event in error_events(search_events(request)):
+            await websocket.send_json(event)
+
+    async def wait_cancel():
+        while True:
+            message = await websocket.receive_json()
+            if message.get("action") == "cancel":
+                return
+
+    sender = asyncio.create_task(send_events())
+    listener = asyncio.create_task(wait_cancel())
+    try:
+        done, _ = await asyncio.wait({sender, listener}, return_when=asyncio.FIRST_COMPLETED)
+        if listener in done and sender not in done:
+            # Pedido de cancelamento ou desconexão (exceção no listener): a busca para aqui
+            sender.cancel()
+            if listener.exception() is None:
+                logger.info("Busca cancelada pelo cliente - Query: '%s'", request.picott_text)
+                await websocket.send_json({"event": "cancelled"})
+    finally:
+        sender.cancel()
+        listener.cancel()
+        await asyncio.gather(sender, listener, return_exceptions=True)
+    try:
+        await websocket.close()
+    except RuntimeError:
+        pass  # Conexão já encerrada pelo cliente
+
+@app.post("/api/jobs", status_code=202)
+async def submit_search_job(request: SearchRequest):
+    """Enfileira a busca e responde na hora com o id do job; o resultado é consultado depois."""
+    check_query(request.picott_text)
+    try:
+        job = job_queue.submit(request.model_dump())
+    except QueueFullError as e:
+        logger.warning("Job recusado: %s", e)
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    logger.info("Job %s enfileirado - Query: '%s'", job.id, request.picott_text)
+    return {"job_id": job.id, "status": job.status, "position": job_queue.position(job.id)}
+
+@app.get("/api/jobs/stats")
+async def search_job_stats():
+    """Profundidade da fila, jobs em execução e contadores de admissão."""
+    return job_queue.stats()
+
+@app.get("/api/jobs/{job_id}")
+async def get_search_job(job_id: str):
+    snapshot = job_queue.get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    return {**snapshot, "position": job_queue.position(job_id)}
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_search_job(job_id: str):
+    """Assina o progresso do job em Server-Sent Events (histórico desde o início + snapshot final)."""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+
+    async def stream():
+        async for event in job_queue.subscribe(job_id):
+            yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_search_job(job_id: str):
+    snapshot = job_queue.get(job_id)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado ou expirado")
+    cancelled = job_queue.cancel(job_id)
+    return {"job_id": job_id, "cancelled": cancelled, "status": "cancelled" if cancelled else snapshot["status"]}
+
+def check_query(user_query):
     # Verificação adicional para debug
     if not user_query or user_query.strip() == "":
         logger.error("Query vazia recebida na API")
         raise HTTPException(status_code=400, detail="Query inválida: a query não pode ser vazia")
-    
-    logger.info(f"Iniciando validação da query: '{user_query}'")
-    
+
+def pipeline_options(request: SearchRequest):
+    """kwargs de run_search_pipeline a partir da requisição, com os limites da API."""
+    return {
+        "target_results": request.target_results,
+        "max_iterations": min(request.max_iterations, 5),
+        "max_returned_results": min(request.max_returned_results, 500),  # efetch em lotes paralelos aguenta o retmax do searcher
+        "probe": request.probe,
+        "strategy": request.strategy,
+        "candidates": max(1, min(request.candidates, 5)),
+        "tune": request.tune,
+        "deadline_seconds": request.deadline_seconds or float(os.getenv("SEARCH_DEADLINE_SECONDS", 120)),
+        "budget_seconds": request.budget_seconds,
+        "max_llm_calls": request.max_llm_calls,
+    }
+
+def search_events(request: SearchRequest):
+    events = run_search_pipeline(request.picott_text, **pipeline_options(request), **components.pipeline_kwargs())
+    # Gravação opt-in (CASSETTE_DIR): o tráfego da busca vira uma cassete reproduzível offline
+    directory = recording_dir()
+    if not directory:
+        return events
+    return record_events(events, {"user_query": request.picott_text, **pipeline_options(request)}, directory)
+
+def batch_events(batch: "BatchSearchRequest"):
+    searches = [{"user_query": request.picott_text, **pipeline_options(request)} for request in batch.searches]
+    return run_batch_search(searches, concurrency=max(1, min(batch.concurrency, 8)), **components.pipeline_kwargs())
+
+async def run_search_job(payload, emit):
+    request = SearchRequest(**payload)
     try:
-        # Log detalhado antes da validação
-        logger.info(f"Chamando validate_and_raise para a query: '{user_query}'")
-        validated_query = validate_and_raise(user_query)
-        logger.info(f"Query validada com sucesso: '{validated_query}'")
-
-        searcher = PubmedSearcher()
-        refiner = SearchRefiner()
-
-        # Busca inicial
-        logger.info(f"Iniciando busca inicial com a query validada: '{validated_query}'")
-        abstracts, pmids, total_results = searcher.search_initial(validated_query, max_returned_results)
-        current_query = validated_query
-        logger.info(f"Busca inicial concluída - Query: '{validated_query}', Total: {total_results}")
-
-        if not pmids:
-            logger.warning(f"Sem resultados na busca inicial - Query: '{current_query}'")
-            return {"query": current_query, "results": [], "total_results": total_results}
-
-        logger.info(f"Busca inicial - Total: {total_results}, PMIDs: {len(pmids)}")
-
-        # Refinamento similar ao test_search_refiner.py
-        iteration = 0
-        while iteration < max_iterations:
-            iteration += 1
-            logger.info(f"Iteração {iteration}/{max_iterations} - Total: {total_results}, Target: {target_results}")
-            
-            # Verifica se já está próximo do alvo
-            if 0.5 * target_results <= total_results <= 1.5 * target_results:
-                logger.info(f"Total de resultados {total_results} já está próximo do alvo {target_results}, parando refinamento")
-                break
-            
-            # Armazena o valor atual para comparação posterior
-            previous_total_results = total_results
-                
-            logger.info(f"Iniciando refinamento da query: '{current_query}'")
-            refined_query = refiner.refine_search(current_query, abstracts, user_query, total_results, target_results)
-            logger.info(f"Query refinada: '{refined_query}'")
-
-            if refined_query == current_query:
-                logger.info(f"Query estabilizada na iteração {iteration}")
-                break
-
-            current_query = refined_query
-            
-            # Valida se a query refinada tem a estrutura correta com parênteses
-            if current_query.count("(") < 2 or current_query.count(")") < 2:
-                logger.warning(f"Query refinada com formato inválido: '{current_query}', retornando à query anterior")
-                current_query = validated_query
-                break
-            
-            # Executa a busca com a nova query
-            logger.info(f"Executando busca com query refinada: '{current_query}'")
-            abstracts, pmids, total_results = searcher.search_refined(current_query, abstracts, max_returned_results)
-            logger.info(f"Busca refinada - Total: {total_results}, PMIDs: {len(pmids)}")
-            
-            # Validação adicional de resultados - inspirada no teste
-            if (previous_total_results > target_results and total_results > previous_total_results) or \
-               (previous_total_results < target_results and total_results < previous_total_results):
-                logger.warning(f"Refinamento moveu-se na direção errada: de {previous_total_results} para {total_results} (alvo: {target_results})")
-                # O próximo refinamento deve corrigir isso
-
-        # Resultado final com a query refinada
-        logger.info(f"Finalizando busca com query final: '{current_query}'")
-        final_pmids = searcher.api.fetch_pmids(current_query, retmax=max_returned_results)
-        final_abstracts = searcher.api.fetch_abstracts(final_pmids)
-        
-        # Verificar se os abstracts têm os campos necessários
-        results = []
-        for abstract in final_abstracts:
-            if abstract and "pmid" in abstract:
-                pmid = abstract["pmid"]
-                abstract_text = abstract.get("abstract")
-                results.append({"pmid": pmid, "abstract": summarize_abstract(abstract_text)})
-            else:
-                logger.warning(f"Abstract sem campos obrigatórios: {abstract}")
-
-        logger.info(f"Busca finalizada - Query: '{current_query}', Total: {total_results}, Retornados: {len(results)}")
-        return {"query": current_query, "results": results, "total_results": total_results}
+        return await collect_search(search_events(request), on_event=emit)
+    except QueryValidationError as e:
+        raise ValueError(f"Query inválida: {str(e)}")
 
+async def error_events(events):
+    """Converte exceções do pipeline num evento final "error" (o stream já começou, não há status HTTP)."""
+    try:
+        async for event in events:
+            yield event
     except QueryValidationError as e:
-        logger.error(f"Erro na validação da query: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Query inválida: {str(e)}")
+        logger.error("Erro na validação da query: %s", str(e))
+        yield {"event": "error", "status": 400, "detail": f"Query inválida: {str(e)}"}
+    except (DeadlineExceeded, CircuitOpenError) as e:
+        logger.warning("Busca interrompida: %s", e)
+        yield {"event": "error", "status": 504 if isinstance(e, DeadlineExceeded) else 503, "detail": str(e)}
     except Exception as e:
-        logger.error(f"Erro inesperado: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erro durante a busca: {str(e)}")
+        logger.error("Erro inesperado: %s", str(e))
+        yield {"event": "error", "status": 500, "detail": f"Erro durante a busca: {str(e)}"}
+    finally:
+        await events.aclose()
+
+@app.get("/api/health")
+async def health():
+    """Verifica se searcher, refinador e validador estão criados e com os clientes abertos."""
+    status = components.health()
+    if not status["ok"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/api/metrics/latency")
+async def pubmed_latency():
+    """Histogramas de latência (eutils, rate limiter, etapas da busca) e contadores, em JSON."""
+    return {name: metric.snapshot() for name, metric in all_metrics().items()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """As mesmas métricas no formato de exposição do Prometheus, para scraping."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/metrics/cache")
+async def cache_stats():
+    """Contadores de hit/miss dos caches locais, do single-flight e estado dos circuit breakers."""
+    store = get_article_store()
+    esearch_cache = get_esearch_cache()
+    llm_cache = get_llm_cache()
+    return {
+        "article_store": store.stats() if store is not None else None,
+        "esearch": esearch_cache.stats() if esearch_cache is not None else None,
+        "llm": llm_cache.stats() if llm_cache is not None else None,
+        "single_flight": flight_stats(),
+        "circuit_breakers": breaker_stats(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
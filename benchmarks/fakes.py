@@ -0,0 +1,304 @@
+"""
+Servidores locais que substituem o E-utilities do NCBI e a API do Anthropic nos benchmarks.
+
+FakeEutils responde esearch/efetch com o XML do eutils, a partir de um corpus gravado (JSON) ou
+de artigos sintéticos determinísticos por PMID. ScriptedLLM responde /v1/messages com queries
+montadas por regras fixas a partir do prompt. Os dois rodam em threads no próprio processo.
+
+Para apontar o código para eles:
+    PUBMED_EUTILS_URL=<FakeEutils.url>   ANTHROPIC_BASE_URL=<ScriptedLLM.url>
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from utils.query_syntax import canonicalize_query, parse_blocks, render_blocks
+
+VOCABULARY = ("glioblastoma glioma tumor treating fields temozolomide survival progression patients cohort "
+              "randomized trial efficacy safety radiotherapy recurrent newly diagnosed median overall "
+              "device therapy electric alternating outcomes analysis quality life adverse events brain").split()
+JOURNALS = ("Journal of Neuro-Oncology", "Neuro-Oncology", "JAMA Oncology", "The Lancet Oncology",
+            "Frontiers in Oncology", "Cancers", "World Neurosurgery", "CNS Oncology")
+MESH = ("Glioblastoma", "Brain Neoplasms", "Glioma", "Electric Stimulation Therapy", "Temozolomide",
+        "Combined Modality Therapy", "Survival Analysis", "Humans", "Quality of Life", "Retrospective Studies")
+PUBLICATION_TYPES = ("Journal Article", "Randomized Controlled Trial", "Review", "Clinical Trial", "Meta-Analysis")
+LABELS = ("BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS")
+
+
+def _seed(text: str) -> int:
+    return zlib.crc32(text.encode())
+
+
+def _percent(value: float) -> float:
+    return max(0.0, min(1.0, value))
+
+
+class _Server:
+    """ThreadingHTTPServer em 127.0.0.1 numa porta livre, servido por uma thread daemon."""
+
+    def __init__(self, handler):
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como o eutils
+    disable_nagle_algorithm = True  # Cabeçalho e corpo saem em writes separados
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self) -> Dict:
+        """Parâmetros da query string e do corpo (form do efetch ou JSON da API de mensagens)."""
+        params = parse_qs(urlparse(self.path).query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        if body and self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(body)
+        params.update(parse_qs(body))
+        return {name: values[-1] for name, values in params.items()}
+
+    def _reply(self, status: int, body: str, content_type: str = "text/xml") -> None:
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self.server.fake.handle(self, urlparse(self.path).path, self._params())
+
+    do_POST = do_GET
+
+
+class FakeEutils(_Server):
+    """
+    Stand-in do E-utilities (esearch.fcgi e efetch.fcgi, com history server).
+
+    Args:
+        corpus (str): JSON gravado com {"esearch": {query: {"count", "pmids"}},
+            "articles": {pmid: Article.to_dict()}}; o que não estiver nele é sintetizado.
+        latency (float): Atraso fixo por requisição, em segundos.
+        jitter (float): Atraso extra aleatório (uniforme entre 0 e jitter).
+        error_rate (float): Fração das requisições respondidas com 429.
+        throttle_first (int): As primeiras N requisições recebem 429 (falhas determinísticas).
+        abstract_words (int): Tamanho dos abstracts sintéticos (controla o tamanho do payload).
+        total_records (int): Tamanho nominal da base usado nas contagens sintéticas.
+    """
+
+    def __init__(self, corpus: Optional[str] = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_first: int = 0, abstract_words: int = 200,
+                 total_records: int = 200_000, seed: int = 0):
+        super().__init__(_Handler)
+        data = {}
+        if corpus:
+            with open(corpus, encoding="utf-8") as f:
+                data = json.load(f)
+        self.recorded_searches = {canonicalize_query(query): entry for query, entry in data.get("esearch", {}).items()}
+        self.recorded_articles = data.get("articles", {})
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_first = throttle_first
+        self.abstract_words = abstract_words
+        self.total_records = total_records
+        self.requests = {"esearch": 0, "efetch": 0, "throttled": 0}
+        self._random = random.Random(seed)
+        self._histories: Dict[str, str] = {}
+
+    def handle(self, handler: _Handler, path: str, params: Dict[str, str]) -> None:
+        endpoint = path.rsplit("/", 1)[-1].split(".", 1)[0]
+        with self.lock:
+            throttled = sum(self.requests.values()) < self.throttle_first or self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            counter = "throttled" if throttled else endpoint
+            self.requests[counter] = self.requests.get(counter, 0) + 1
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            handler._reply(429, '{"error":"API rate limit exceeded"}', "application/json")
+        elif endpoint == "esearch":
+            handler._reply(200, self.esearch_xml(params))
+        elif endpoint == "efetch":
+            handler._reply(200, self.efetch_xml(params))
+        else:
+            handler._reply(404, "<error>unknown endpoint</error>")
+
+    # --- esearch ---
+
+    def count(self, query: str) -> int:
+        recorded = self.recorded_searches.get(canonicalize_query(query))
+        if recorded is not None:
+            return recorded["count"]
+        # Cada bloco AND restringe e cada sinônimo OR amplia, como no PubMed
+        blocks = parse_blocks(query) or [[query]]
+        fraction = 1.0
+        for terms in blocks:
+            fraction *= _percent(0.04 * len(terms))
+        spread = 0.5 + (_seed(canonicalize_query(query)) % 100) / 100
+        return int(self.total_records * fraction * spread)
+
+    def pmids(self, query: str, retstart: int, retmax: int) -> List[str]:
+        recorded = self.recorded_searches.get(canonicalize_query(query))
+        if recorded is not None:
+            return recorded["pmids"][retstart:retstart + retmax]
+        stop = min(self.count(query), retstart + retmax)
+        base = _seed(canonicalize_query(query))
+        return [str(10_000_000 + (base + index * 7919) % 20_000_000) for index in range(retstart, stop)]
+
+    def esearch_xml(self, params: Dict[str, str]) -> str:
+        query = params.get("term", "")
+        retstart, retmax = int(params.get("retstart", 0)), int(params.get("retmax", 20))
+        ids = "".join(f"<Id>{pmid}</Id>" for pmid in self.pmids(query, retstart, retmax))
+        history = ""
+        if params.get("usehistory") == "y":
+            with self.lock:
+                webenv = f"MCID_fake_{len(self._histories) + 1}"
+                self._histories[webenv] = query
+            history = f"<QueryKey>1</QueryKey><WebEnv>{webenv}</WebEnv>"
+        return (f'<?xml version="1.0" encoding="UTF-8" ?><eSearchResult><Count>{self.count(query)}</Count>'
+                f"<RetMax>{ids.count('<Id>')}</RetMax><RetStart>{retstart}</RetStart>{history}"
+                f"<IdList>{ids}</IdList></eSearchResult>")
+
+    # --- efetch ---
+
+    def efetch_xml(self, params: Dict[str, str]) -> str:
+        if params.get("id"):
+            pmids = params["id"].split(",")
+        else:
+            query = self._histories.get(params.get("WebEnv"), "")
+            pmids = self.pmids(query, int(params.get("retstart", 0)), int(params.get("retmax", 20)))
+        articles = "".join(self.article_xml(pmid) for pmid in pmids)
+        return f'<?xml version="1.0" ?><PubmedArticleSet>{articles}</PubmedArticleSet>'
+
+    def article(self, pmid: str) -> Dict:
+        recorded = self.recorded_articles.get(pmid)
+        if recorded is not None:
+            return recorded
+        rng = random.Random(int(pmid) if pmid.isdigit() else _seed(pmid))
+        per_section = max(1, self.abstract_words // len(LABELS))
+        return {
+            "pmid": pmid,
+            "title": " ".join(rng.choices(VOCABULARY, k=10)).capitalize(),
+            "journal": rng.choice(JOURNALS),
+            "year": rng.randint(2000, 2025),
+            "sections": [[label, " ".join(rng.choices(VOCABULARY, k=per_section)).capitalize() + "."] for label in LABELS],
+            "mesh": rng.sample(MESH, 4),
+            "publication_types": [rng.choice(PUBLICATION_TYPES)],
+        }
+
+    def article_xml(self, pmid: str) -> str:
+        article = self.article(pmid)
+        sections = "".join(f'<AbstractText Label="{label}">{escape(text)}</AbstractText>' if label
+                           else f"<AbstractText>{escape(text)}</AbstractText>" for label, text in article["sections"])
+        mesh = "".join(f"<MeshHeading><DescriptorName>{escape(term)}</DescriptorName></MeshHeading>" for term in article["mesh"])
+        types = "".join(f"<PublicationType>{escape(kind)}</PublicationType>" for kind in article["publication_types"])
+        year = f"<Year>{article['year']}</Year>" if article.get("year") else ""
+        return (f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article><Journal>"
+                f"<Title>{escape(article['journal'])}</Title><JournalIssue><PubDate>{year}</PubDate></JournalIssue>"
+                f"</Journal><ArticleTitle>{escape(article['title'])}</ArticleTitle><Abstract>{sections}</Abstract>"
+                f"<PublicationTypeList>{types}</PublicationTypeList></Article>"
+                f"<MeshHeadingList>{mesh}</MeshHeadingList></MedlineCitation></PubmedArticle>")
+
+
+# --- LLM ---
+
+OUTCOMES = ["survival", "efficacy", "prognosis"]
+
+
+def validator_reply(user_query: str) -> str:
+    """Query inicial "validada": palavras da pergunta em dois blocos (população AND intervenção)."""
+    words = [word for word in re.findall(r"[\w-]+", user_query) if len(word) > 3] or [user_query.strip()]
+    half = max(1, len(words) // 2)
+    return render_blocks([words[:half], words[half:] or words[:half]])
+
+
+def refiner_reply(current_query: str, total_results: int, target_results: int, variant: int = 0) -> str:
+    """Restringe (bloco de outcomes / menos sinônimos) ou amplia (mais sinônimos) conforme a contagem."""
+    blocks = parse_blocks(current_query) or [[current_query]]
+    if total_results > target_results:
+        if len(blocks) < 3:
+            return render_blocks(blocks + [OUTCOMES[:1 + variant % 3]])
+        blocks = [terms[:-1] if len(terms) > 1 else terms for terms in blocks]
+    else:
+        blocks = [terms + [f'"{terms[0].strip(chr(34))} {VOCABULARY[(variant + index) % len(VOCABULARY)]}"']
+                  for index, terms in enumerate(blocks[:2])]
+    return render_blocks(blocks)
+
+
+class ScriptedLLM(_Server):
+    """
+    Stand-in da API de mensagens do Anthropic (POST /v1/messages) com respostas roteirizadas.
+
+    Reconhece os prompts do QueryValidator e do SearchRefiner (inclusive o pedido de n candidatas)
+    e responde com queries determinísticas; latency simula o tempo de geração.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(_Handler)
+        self.latency = latency
+        self.calls = 0
+
+    def reply(self, prompt: str) -> str:
+        validator = re.search(r'Recebi a seguinte query do usuário: "(.*)"', prompt)
+        if validator:
+            return validator_reply(validator.group(1))
+        current = re.search(r'Current query: "(.*)"', prompt)
+        total = re.search(r"Total results: (\d+)", prompt)
+        target = re.search(r"Target results: (\d+)", prompt)
+        if not (current and total and target):
+            return ""
+        candidates = re.search(r"Return (\d+) DIFFERENT candidate queries", prompt)
+        n = int(candidates.group(1)) if candidates else 1
+        return "\n".join(refiner_reply(current.group(1), int(total.group(1)), int(target.group(1)), variant)
+                         for variant in range(n))
+
+    def handle(self, handler: _Handler, path: str, params: Dict) -> None:
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if not path.endswith("/messages"):
+            handler._reply(404, '{"type":"error"}', "application/json")
+            return
+        prompt = "\n".join(message["content"] if isinstance(message["content"], str)
+                           else " ".join(part.get("text", "") for part in message["content"])
+                           for message in params.get("messages", []))
+        text = self.reply(prompt)
+        body = {
+            "id": f"msg_fake_{self.calls}", "type": "message", "role": "assistant", "model": params.get("model"),
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": len(prompt.split()), "output_tokens": len(text.split())},
+        }
+        handler._reply(200, json.dumps(body), "application/json")
@@ -0,0 +1,92 @@
+"""
+Reproduz offline uma busca gravada pela API (CASSETTE_DIR) e mostra onde o tempo foi gasto.
+
+O pipeline roda de novo com as mesmas opções; eutils e LLM respondem a partir da cassete, na
+ordem gravada, então só o processamento local é medido. Compara o tempo de cada etapa com a
+gravação e confere se a query final é a mesma:
+    python benchmarks/replay.py .cassettes/20260101-120000-ab12cd34.json.gz
+    python benchmarks/replay.py <cassete> --repeat 20 --profile
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Os clientes são criados, mas nenhuma chamada sai do processo
+os.environ.setdefault("ANTHROPIC_API_KEY", "replay")
+os.environ.setdefault("PUBMED_EMAIL", "replay@example.com")
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.query_validator import AsyncQueryValidator, validate_and_raise_async
+from agents.search_pipeline import run_search_pipeline
+from agents.search_refiner import AsyncSearchRefiner
+from utils.cassette import Cassette, activate, deactivate
+
+
+async def replay(path: str) -> dict:
+    """Executa a busca da cassete e retorna os eventos reproduzidos com os tempos das duas execuções."""
+    cassette = Cassette.load(path)
+    options = dict(cassette.request)
+    user_query = options.pop("user_query")
+    searcher, refiner, validator = AsyncPubmedSearcher(), AsyncSearchRefiner(), AsyncQueryValidator()
+    token = activate(cassette)
+    try:
+        began = time.perf_counter()
+        events = []
+        async for event in run_search_pipeline(user_query, searcher=searcher, refiner=refiner,
+                                               validate=lambda query: validate_and_raise_async(query, validator),
+                                               **options):
+            events.append({"event": event["event"], "offset": round(time.perf_counter() - began, 6),
+                           **{name: event[name] for name in ("iteration", "query", "total_results") if name in event}})
+        local = time.perf_counter() - began
+    finally:
+        deactivate(token)
+        await refiner.aclose()
+        await validator.aclose()
+    recorded_done = next((event for event in cassette.recorded_events if event["event"] == "done"), None)
+    replayed_done = next((event for event in events if event["event"] == "done"), None)
+    return {
+        "request": cassette.request,
+        "recorded": cassette.timings(),
+        "replay_local_seconds": round(local, 6),
+        "same_result": recorded_done is not None and replayed_done is not None
+                       and (recorded_done["query"], recorded_done["total_results"]) == (replayed_done["query"], replayed_done["total_results"]),
+        "stages": [{"event": replayed["event"], "recorded_offset": recorded["offset"], "replay_offset": replayed["offset"]}
+                   for recorded, replayed in zip(cassette.recorded_events, events)],
+        "events": events,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("cassette")
+    parser.add_argument("--repeat", type=int, default=1, help="Execuções (a última é reportada)")
+    parser.add_argument("--profile", action="store_true", help="cProfile das execuções, 25 funções mais caras")
+    args = parser.parse_args(argv)
+
+    profiler = cProfile.Profile() if args.profile else None
+    report = None
+    for _ in range(args.repeat):
+        if profiler is not None:
+            profiler.enable()
+        report = asyncio.run(replay(args.cassette))
+        if profiler is not None:
+            profiler.disable()
+    report.pop("events")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if profiler is not None:
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        print(output.getvalue())
+    return report
+
+
+if __name__ == "__main__":
+    main()
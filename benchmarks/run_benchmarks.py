@@ -0,0 +1,271 @@
+"""
+Benchmarks de ponta a ponta contra os fakes locais (benchmarks/fakes.py), sem rede.
+
+Cenários:
+    esearch: PubmedAPI.esearch (contagem + página de PMIDs).
+    single_search: PubmedSearcher.run (esearch + efetch dos abstracts).
+    refinement: run_search_pipeline completo (validação + loop de refinamento com o LLM roteirizado).
+    api_load: POST /api/search concorrentes na app FastAPI (transporte ASGI em processo).
+
+Para cada cenário reporta p50/p95/p99 (ms), throughput e pico de RSS, e grava tudo em JSON:
+    python benchmarks/run_benchmarks.py --iterations 50 --concurrency 8
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<anterior>.json
+
+Os caches (article store, esearch, LLM) ficam desligados, a menos que --caches seja passado,
+e o rate limiter do eutils fica em --rate-limit req/s (o fake não limita).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Adicionar o diretório raiz do projeto ao sys.path
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+
+from benchmarks.fakes import FakeEutils, ScriptedLLM
+
+QUERIES = [
+    "TTS em glioblastoma recorrente",
+    "Optune glioblastoma newly diagnosed survival",
+    "tumor treating fields high grade glioma",
+    "temozolomide radiotherapy elderly glioblastoma",
+    "electric fields therapy brain metastases",
+    "TTFields pancreatic cancer",
+    "bevacizumab recurrent glioma progression",
+    "glioblastoma immunotherapy checkpoint inhibitors",
+]
+SCENARIOS = ("esearch", "single_search", "refinement", "api_load")
+
+
+def percentile(values, fraction):
+    """Percentil por nearest-rank."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, wall, errors, extra=None):
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "runs": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(milliseconds, 0.50), 2) if milliseconds else None,
+        "p95_ms": round(percentile(milliseconds, 0.95), 2) if milliseconds else None,
+        "p99_ms": round(percentile(milliseconds, 0.99), 2) if milliseconds else None,
+        "mean_ms": round(sum(milliseconds) / len(milliseconds), 2) if milliseconds else None,
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "peak_rss_mb": peak_rss_mb(),
+        **(extra or {}),
+    }
+
+
+def timed_sync(fn, iterations):
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for index in range(iterations):
+        began = time.perf_counter()
+        try:
+            fn(index)
+        except Exception as e:
+            errors += 1
+            print(f"  erro: {e}", file=sys.stderr)
+            continue
+        latencies.append(time.perf_counter() - began)
+    return latencies, time.perf_counter() - start, errors
+
+
+async def timed_async(fn, iterations, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        nonlocal errors
+        async with semaphore:
+            began = time.perf_counter()
+            try:
+                await fn(index)
+            except Exception as e:
+                errors += 1
+                print(f"  erro: {e}", file=sys.stderr)
+                return
+            latencies.append(time.perf_counter() - began)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(iterations)))
+    return latencies, time.perf_counter() - start, errors
+
+
+def configure_environment(args, eutils, llm, workdir):
+    """Aponta os clientes para os fakes; precisa rodar antes de importar os módulos do projeto."""
+    os.environ["PUBMED_EUTILS_URL"] = eutils.url
+    os.environ["ANTHROPIC_BASE_URL"] = llm.url
+    os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-benchmark")
+    os.environ.setdefault("PUBMED_EMAIL", "benchmark@example.com")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")  # Logs por requisição distorcem as latências
+    os.environ["PUBMED_RATE_LIMIT"] = str(args.rate_limit)
+    os.environ["PUBMED_RATE_BURST"] = str(max(1, int(args.rate_limit)))
+    if args.caches:
+        os.environ["PUBMED_ARTICLE_STORE"] = os.path.join(workdir, "articles.sqlite3")
+        os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm.sqlite3")
+    else:
+        os.environ["PUBMED_ARTICLE_STORE"] = "off"
+        os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+        os.environ["LLM_CACHE"] = "off"
+
+
+def run_scenarios(args, eutils, llm):
+    from utils.pubmed_api import PubmedAPI
+    from agents.pubmed_searcher import PubmedSearcher
+
+    results = {}
+
+    def measure(name, run):
+        if name not in args.scenarios:
+            return
+        eutils_before, llm_before = dict(eutils.requests), llm.calls
+        print(f"Cenário {name}...", file=sys.stderr)
+        latencies, wall, errors = run()
+        requests_made = {key: value - eutils_before.get(key, 0) for key, value in eutils.requests.items()}
+        results[name] = summarize(latencies, wall, errors, {"eutils_requests": requests_made,
+                                                            "llm_calls": llm.calls - llm_before})
+
+    api = PubmedAPI(email=os.environ["PUBMED_EMAIL"])
+    measure("esearch", lambda: timed_sync(
+        lambda index: api.esearch(f"({QUERIES[index % len(QUERIES)]}) AND ({index})", retmax=20), args.iterations))
+
+    searcher = PubmedSearcher()
+    measure("single_search", lambda: timed_sync(
+        lambda index: searcher.run(f"({QUERIES[index % len(QUERIES)]}) AND ({index})", args.results), args.iterations))
+
+    def refinement():
+        from agents.components import Components
+        from agents.search_pipeline import collect_search, run_search_pipeline
+
+        async def run():
+            components = await Components().start()
+            try:
+                return await timed_async(lambda index: collect_search(run_search_pipeline(
+                    QUERIES[index % len(QUERIES)], target_results=args.target, max_iterations=args.max_iterations,
+                    max_returned_results=args.results, **components.pipeline_kwargs())), args.iterations, 1)
+            finally:
+                await components.aclose()
+
+        return asyncio.run(run())
+
+    measure("refinement", refinement)
+
+    def api_load():
+        import httpx
+        import api as api_module
+
+        async def run():
+            await api_module.components.start()
+            transport = httpx.ASGITransport(app=api_module.app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                    async def post(index):
+                        response = await client.post("/api/search", json={
+                            "picott_text": QUERIES[index % len(QUERIES)], "target_results": args.target,
+                            "max_iterations": args.max_iterations, "max_returned_results": args.results})
+                        response.raise_for_status()
+
+                    return await timed_async(post, args.iterations, args.concurrency)
+            finally:
+                await api_module.components.aclose()
+
+        return asyncio.run(run())
+
+    measure("api_load", api_load)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)["scenarios"]
+    lines = [f"{'cenário':<15}{'métrica':<18}{'anterior':>12}{'atual':>12}{'variação':>10}"]
+    for name, stats in current.items():
+        if name not in previous:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s", "peak_rss_mb"):
+            old, new = previous[name].get(metric), stats.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+            lines.append(f"{name:<15}{metric:<18}{old:>12}{new:>12}{change:>10}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requisições simultâneas em api_load")
+    parser.add_argument("--results", type=int, default=50, help="max_returned_results das buscas")
+    parser.add_argument("--target", type=int, default=100)
+    parser.add_argument("--max-iterations", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02, help="Atraso do fake eutils (s)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de 429 injetados")
+    parser.add_argument("--abstract-words", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--corpus", help="JSON gravado para o fake eutils")
+    parser.add_argument("--rate-limit", type=float, default=100.0, help="req/s do rate limiter do eutils")
+    parser.add_argument("--caches", action="store_true", help="Mantém article store, esearch e LLM cache ligados")
+    parser.add_argument("--output", help="Arquivo JSON (padrão: benchmarks/results/<data>.json)")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args(argv)
+
+    eutils = FakeEutils(corpus=args.corpus, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, abstract_words=args.abstract_words)
+    llm = ScriptedLLM(latency=args.llm_latency)
+    with eutils, llm, tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, eutils, llm, workdir)
+        scenarios = run_scenarios(args, eutils, llm)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "options": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(scenarios, indent=2, ensure_ascii=False))
+    print(f"Resultados salvos em {output}", file=sys.stderr)
+    if args.compare:
+        print(compare(scenarios, args.compare))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 # C:\Users\Usuario\Desktop\projetos\PUBMED_CREW\main.py
 import os
+import time
 import logging
 from dotenv import load_dotenv
 from agents.query_validator import QueryValidator, QueryValidationError
 from agents.pubmed_searcher import PubmedSearcher
 from agents.search_refiner import SearchRefiner
+from agents.convergence import ConvergenceController
 
 load_dotenv()
 
@@ -47,16 +49,17 @@ def main():
     iteration = 0
     max_iterations = 3
     target_results = 100
+    # Para ao convergir, oscilar ou render pouco; max_iterations é só o teto
+    controller = ConvergenceController(target_results, max_iterations)
+    controller.observe(current_query, total_results)
+    # Abstracts, PMIDs e total de cada query executada, para voltar à melhor no fim
+    seen = {current_query: (abstracts, pmids, total_results)}
 
-    while iteration < max_iterations:
+    while controller.should_continue():
         iteration += 1
         logger.info(f"Iteração {iteration}/{max_iterations} - Total: {total_results}, Target: {target_results}")
-        
-        # Verifica se já está próximo do alvo
-        if 0.5 * target_results <= total_results <= 1.5 * target_results:
-            logger.info(f"Total de resultados {total_results} já está próximo do alvo {target_results}, parando refinamento")
-            break
-            
+        started = time.perf_counter()
+
         refined_query = refiner.refine_search(current_query, abstracts, user_query, total_results, target_results)
 
         if refined_query == current_query:
@@ -68,8 +71,15 @@ def main():
         
         # Executa a busca com a nova query
         abstracts, pmids, total_results = searcher.search_refined(current_query, abstracts, 10)
+        seen[current_query] = (abstracts, pmids, total_results)
+        controller.observe(current_query, total_results, time.perf_counter() - started, llm_calls=1)
         logger.info(f"Busca refinada - Total: {total_results}, PMIDs: {len(pmids)}")
 
+    if controller.best.query != current_query:
+        logger.info(f"Voltando à melhor query (iteração {controller.best.iteration})")
+        current_query = controller.best.query
+        abstracts, pmids, total_results = seen[current_query]
+
     # Apresentação dos resultados
     print(f"\nQuery final para o PubMed:\n{current_query}")
     print(f"\nTotal de resultados: {total_results}")
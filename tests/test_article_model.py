@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+import tracemalloc
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.article import Article
+from utils.article_store import ArticleStore
+from utils.pubmed_api import parse_abstracts
+from agents.search_refiner import SearchRefiner
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+STRUCTURED_XML = """<PubmedArticleSet><PubmedArticle><MedlineCitation>
+<PMID Version="1">30000001</PMID>
+<Article>
+  <Journal><Title>Journal of Neuro-Oncology</Title>
+    <JournalIssue><PubDate><MedlineDate>2019 Jan-Feb</MedlineDate></PubDate></JournalIssue></Journal>
+  <ArticleTitle>Tumor treating fields in <i>newly diagnosed</i> glioblastoma</ArticleTitle>
+  <Abstract>
+    <AbstractText Label="BACKGROUND" NlmCategory="BACKGROUND">TTFields are an antimitotic therapy.</AbstractText>
+    <AbstractText Label="METHODS">Patients received TTFields plus temozolomide.</AbstractText>
+    <AbstractText Label="RESULTS">Median OS was 20.9 months (HR 0.63; <i>P</i> &lt; .001).</AbstractText>
+  </Abstract>
+  <PublicationTypeList><PublicationType UI="D016449">Randomized Controlled Trial</PublicationType></PublicationTypeList>
+</Article>
+<MeshHeadingList>
+  <MeshHeading><DescriptorName UI="D005909">Glioblastoma</DescriptorName></MeshHeading>
+  <MeshHeading><DescriptorName UI="D004599">Electric Stimulation Therapy</DescriptorName></MeshHeading>
+</MeshHeadingList>
+<CommentsCorrectionsList><CommentsCorrections><PMID>111</PMID></CommentsCorrections></CommentsCorrectionsList>
+</MedlineCitation></PubmedArticle></PubmedArticleSet>"""
+
+
+def test_structured_abstract_keeps_every_section_and_metadata():
+    [article] = parse_abstracts(STRUCTURED_XML)
+    assert article.pmid == "30000001"
+    assert article.title == "Tumor treating fields in newly diagnosed glioblastoma"
+    assert article.journal == "Journal of Neuro-Oncology" and article.year == 2019
+    assert [label for label, _ in article.sections] == ["BACKGROUND", "METHODS", "RESULTS"]
+    assert article["abstract"].endswith("RESULTS: Median OS was 20.9 months (HR 0.63; P < .001).")
+    assert article.mesh == ("Glioblastoma", "Electric Stimulation Therapy")
+    assert article.publication_types == ("Randomized Controlled Trial",)
+    # Acesso de dict para o código que ainda trata artigos como dicts
+    assert article.get("pmid") == "30000001" and "abstract" in article and article.get("doi") is None
+    prompts = SearchRefiner._build_prompts(SearchRefiner.__new__(SearchRefiner), "(ttf)", [article], "TTS", 10, 5)
+    assert "antimitotic" in prompts[1]
+
+
+def test_store_round_trip_and_memory():
+    [article] = parse_abstracts(STRUCTURED_XML)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArticleStore(os.path.join(tmp, "articles.sqlite3"))
+        store.put_many([article])
+        assert store.get_many([article.pmid])[article.pmid] == article
+        store.close()
+    assert json.loads(json.dumps(article.to_dict()))["sections"][1] == ["METHODS", "Patients received TTFields plus temozolomide."]
+
+    # Mesmo texto compartilhado nos dois formatos: a diferença medida é o custo de cada registro
+    abstract = article.abstract
+    def allocated(build):
+        tracemalloc.start()
+        items = [build(str(pmid)) for pmid in range(2000)]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert len(items) == 2000
+        return size
+
+    as_dicts = allocated(lambda pmid: {"pmid": pmid, "title": article.title, "journal": "Journal of Neuro-Oncology",
+                                       "year": 2019, "abstract": abstract, "mesh": list(article.mesh)})
+    as_articles = allocated(lambda pmid: Article(pmid, article.title, article.journal, 2019, article.sections,
+                                                 article.mesh, article.publication_types))
+    logger.info(f"2000 artigos: dicts {as_dicts} bytes, Article {as_articles} bytes")
+    assert as_articles < as_dicts / 2
+
+
+if __name__ == "__main__":
+    test_structured_abstract_keeps_every_section_and_metadata()
+    test_store_round_trip_and_memory()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+from urllib.parse import parse_qs
+
+import httpx
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.article_store import ArticleStore
+from utils.async_pubmed_api import AsyncPubmedAPI
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def test_store_ttl_and_eviction():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArticleStore(os.path.join(tmp, "articles.sqlite3"), ttl_seconds=60, max_entries=3)
+        store.put_many({"pmid": str(pmid), "abstract": f"texto {pmid}"} for pmid in range(1, 4))
+        found = store.get_many(["1", "2", "9"])
+        assert {pmid: article["abstract"] for pmid, article in found.items()} == {"1": "texto 1", "2": "texto 2"}
+
+        # O PMID 3 é o menos acessado, então sai quando o limite é excedido
+        time.sleep(0.01)
+        store.put_many([{"pmid": "4", "abstract": "texto 4"}])
+        assert "3" not in store.get_many(["3"])
+
+        store.ttl_seconds = 0
+        time.sleep(0.01)
+        assert store.get_many(["1"]) == {}
+        stats = store.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 3
+        assert stats["evictions"] == 1 and stats["expired"] == 1
+        store.close()
+
+
+def test_default_store_opens_on_first_use():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "padrao.sqlite3")
+        previous = os.environ.get("PUBMED_ARTICLE_STORE")
+        os.environ["PUBMED_ARTICLE_STORE"] = path
+        try:
+            api = AsyncPubmedAPI(email="teste@example.com")
+            assert not os.path.exists(path)  # Instanciar o cliente não cria o arquivo
+            assert api.article_store is not None and os.path.exists(path)
+            api.article_store.close()
+        finally:
+            if previous is None:
+                del os.environ["PUBMED_ARTICLE_STORE"]
+            else:
+                os.environ["PUBMED_ARTICLE_STORE"] = previous
+
+
+def test_only_missing_pmids_go_to_efetch():
+    requested = []
+
+    def handler(request):
+        ids = parse_qs(request.content.decode())["id"][0].split(",")
+        requested.append(ids)
+        articles = "".join(f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article><Abstract>"
+                           f"<AbstractText>abstract {pmid}</AbstractText></Abstract></Article></MedlineCitation>"
+                           f"</PubmedArticle>" for pmid in ids)
+        return httpx.Response(200, text=f"<PubmedArticleSet>{articles}</PubmedArticleSet>")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ArticleStore(os.path.join(tmp, "articles.sqlite3"))
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                api = AsyncPubmedAPI(email="teste@example.com", client=client, article_store=store)
+                await api.fetch_abstracts(["1", "2"])
+                return await api.fetch_abstracts(["3", "1", "2"])
+
+        abstracts = asyncio.run(run())
+        assert requested == [["1", "2"], ["3"]]
+        assert [abstract["pmid"] for abstract in abstracts] == ["3", "1", "2"]
+        assert store.stats()["hits"] == 2
+        store.close()
+    logger.info("Article store verificado")
+
+
+if __name__ == "__main__":
+    test_store_ttl_and_eviction()
+    test_default_store_opens_on_first_use()
+    test_only_missing_pmids_go_to_efetch()
+    logger.info("Todos os testes passaram!")
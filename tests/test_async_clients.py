@@ -0,0 +1,166 @@
+import os
+import sys
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import httpx
+from urllib.parse import parse_qs
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Estes testes verificam as requisições ao eutils, então os caches ficam desligados
+os.environ["PUBMED_ARTICLE_STORE"] = "off"
+os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+os.environ["LLM_CACHE"] = "off"
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+
+from utils.async_pubmed_api import AsyncPubmedAPI
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_refiner import AsyncSearchRefiner
+from agents.query_validator import AsyncQueryValidator
+from agents import query_validator
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+ESEARCH_XML = ("<eSearchResult><Count>243</Count><RetMax>2</RetMax><IdList><Id>111</Id><Id>222</Id></IdList>"
+               "<QueryKey>1</QueryKey><WebEnv>MCID_teste</WebEnv></eSearchResult>")
+EFETCH_XML = """<PubmedArticleSet>
+<PubmedArticle><MedlineCitation><PMID>111</PMID><Article><Abstract>
+<AbstractText>Tumor treating fields in glioblastoma.</AbstractText></Abstract></Article></MedlineCitation></PubmedArticle>
+<PubmedArticle><MedlineCitation><PMID>222</PMID><Article></Article></MedlineCitation></PubmedArticle>
+</PubmedArticleSet>"""
+
+
+requests_seen = []
+
+
+def eutils_handler(request):
+    requests_seen.append(request)
+    if request.url.path.endswith("esearch.fcgi"):
+        return httpx.Response(200, text=ESEARCH_XML)
+    return httpx.Response(200, text=EFETCH_XML)
+
+
+class FakeMessages:
+    """Substitui client.messages do AsyncAnthropic com uma resposta fixa."""
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = []
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(0)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.text)])
+
+
+def test_async_pubmed_api_with_mock_transport():
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(eutils_handler)) as client:
+            api = AsyncPubmedAPI(email="teste@example.com", client=client)
+            total, pmids = await asyncio.gather(api.count_results("glioma"), api.fetch_pmids("glioma", retmax=2))
+            abstracts = await api.fetch_abstracts(pmids)
+            return total, pmids, abstracts
+
+    total, pmids, abstracts = asyncio.run(run())
+    assert total == 243
+    assert pmids == ["111", "222"]
+    assert [(article["pmid"], article["abstract"]) for article in abstracts] == [
+        ("111", "Tumor treating fields in glioblastoma."),
+        ("222", ""),
+    ]
+
+
+def test_searcher_reuses_history_handle():
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(eutils_handler)) as client:
+            searcher = AsyncPubmedSearcher()
+            searcher.api = AsyncPubmedAPI(email="teste@example.com", client=client)
+            return await searcher.search("glioma", max_returned_results=2)
+
+    requests_seen.clear()
+    abstracts, history = asyncio.run(run())
+    assert history.count == 243 and history.pmids == ["111", "222"]
+    assert history.webenv == "MCID_teste" and history.query_key == "1"
+    assert len(abstracts) == 2
+
+    esearch, efetch = requests_seen
+    assert esearch.url.params["usehistory"] == "y"
+    form = parse_qs(efetch.content.decode())
+    assert form["WebEnv"] == ["MCID_teste"]
+    assert "id" not in form, "efetch deveria ler do history server, sem lista de IDs"
+
+
+def test_large_pmid_lists_are_posted_in_parallel_batches():
+    batches_seen = []
+
+    def handler(request):
+        ids = parse_qs(request.content.decode())["id"][0].split(",")
+        batches_seen.append((request.method, len(ids)))
+        # Devolve o lote em ordem invertida para garantir que o cliente restaura o rank do esearch
+        articles = "".join(f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID></MedlineCitation></PubmedArticle>"
+                           for pmid in reversed(ids))
+        return httpx.Response(200, text=f"<PubmedArticleSet>{articles}</PubmedArticleSet>")
+
+    pmids = [str(pmid) for pmid in range(1000, 1450)]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = AsyncPubmedAPI(email="teste@example.com", client=client)
+            api.efetch_batch_size = 200
+            return await api.fetch_abstracts(pmids)
+
+    abstracts = asyncio.run(run())
+    assert [abstract["pmid"] for abstract in abstracts] == pmids
+    assert sorted(batches_seen) == [("POST", 50), ("POST", 200), ("POST", 200)]
+
+
+def test_async_agents_use_async_client():
+    refined = '("high grade glioma" OR GBM) AND ("tumor treating fields" OR TTF)'
+    refiner = AsyncSearchRefiner()
+    refiner.client = SimpleNamespace(messages=FakeMessages(refined))
+    validator = AsyncQueryValidator()
+    validator.client = SimpleNamespace(messages=FakeMessages("(glioma) AND (TTFields)"))
+
+    async def run():
+        return await asyncio.gather(
+            refiner.refine_search("(glioma)", [{"pmid": "1", "abstract": "texto"}], "TTS glioma", 5000, 100),
+            validator.validate_query("TTS field for high grade glioma"),
+        )
+
+    refined_query, validated_query = asyncio.run(run())
+    assert refined_query == refined
+    assert validated_query == "(glioma) AND (TTFields)"
+    assert refiner.client.messages.calls[0]["max_tokens"] == 7000
+    logger.info("Clientes assíncronos verificados")
+
+
+def test_per_call_anthropic_clients_are_closed():
+    closed = []
+
+    class FakeAsyncAnthropic:
+        def __init__(self, api_key=None):
+            self.messages = FakeMessages("(glioma) AND (TTFields)")
+
+        async def close(self):
+            closed.append(self)
+
+    original = query_validator.AsyncAnthropic
+    query_validator.AsyncAnthropic = FakeAsyncAnthropic
+    try:
+        result = asyncio.run(query_validator.validate_and_raise_async("TTS field for high grade glioma"))
+    finally:
+        query_validator.AsyncAnthropic = original
+    assert result == "(glioma) AND (TTFields)"
+    assert len(closed) == 1
+
+
+if __name__ == "__main__":
+    test_async_pubmed_api_with_mock_transport()
+    test_searcher_reuses_history_handle()
+    test_large_pmid_lists_are_posted_in_parallel_batches()
+    test_async_agents_use_async_client()
+    test_per_call_anthropic_clients_are_closed()
+    logger.info("Todos os testes passaram!")
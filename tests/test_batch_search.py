@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+os.environ["LLM_CACHE"] = "off"
+
+from fastapi.testclient import TestClient
+
+import api
+from agents.batch_search import run_batch_search
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.query_validator import QueryValidationError
+from utils.pubmed_api import BasePubmedAPI, ESearchResult
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Duas queries com PMIDs em comum (3, 4 e 5)
+PMIDS = {"(glioma) AND (ttf)": ["1", "2", "3", "4", "5"], "(gbm) AND (optune)": ["3", "4", "5", "6"]}
+
+
+class FakeEutils:
+    _known_pmids = staticmethod(BasePubmedAPI._known_pmids)
+
+    def __init__(self):
+        self.esearches = []
+        self.efetches = []
+
+    async def esearch(self, query, retmax=20, usehistory=True):
+        self.esearches.append(query)
+        await asyncio.sleep(0)
+        return ESearchResult(query, len(PMIDS[query]), PMIDS[query][:retmax], "MCID", "1")
+
+    async def fetch_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        self.efetches.append(list(pmids))
+        return [{"pmid": pmid, "abstract": f"Resumo {pmid}"} for pmid in pmids]
+
+
+class FakeSearcher(AsyncPubmedSearcher):
+    def __init__(self):
+        self.api = FakeEutils()
+        self.retmax = 500
+
+
+class FakeRefiner:
+    sample_size = 2
+
+
+async def fake_validate(user_query):
+    if user_query == "inválida":
+        raise QueryValidationError("sem conceitos")
+    return "(glioma) AND (ttf)" if "glioma" in user_query else "(gbm) AND (optune)"
+
+
+def test_batch_dedupes_and_shares_one_efetch():
+    searcher = FakeSearcher()
+    searches = [{"user_query": "TTS glioma", "target_results": 5},
+                {"user_query": "Optune gbm", "target_results": 4},
+                {"user_query": "TTS glioma", "target_results": 5},
+                {"user_query": "inválida", "target_results": 5}]
+
+    async def run():
+        return [event async for event in run_batch_search(searches, searcher=searcher, refiner=FakeRefiner(),
+                                                          validate=fake_validate)]
+
+    events = asyncio.run(run())
+    by_index = {tuple(event["indexes"]): event for event in events}
+    assert set(by_index) == {(0, 2), (1,), (3,)}
+    assert [result["pmid"] for result in by_index[(0, 2)]["results"]] == PMIDS["(glioma) AND (ttf)"]
+    assert [result["pmid"] for result in by_index[(1,)]["results"]] == PMIDS["(gbm) AND (optune)"]
+    assert by_index[(3,)]["event"] == "error" and by_index[(3,)]["status"] == 400
+    # As duas buscas terminam juntas: um único efetch com a união dos PMIDs, cada um uma vez
+    assert searcher.api.efetches == [["1", "2", "3", "4", "5", "6"]]
+    # O searcher injetado não fica com o EfetchBatcher
+    assert isinstance(searcher.api, FakeEutils)
+
+
+def test_batch_endpoint_streams_ndjson():
+    async def fake_batch(batch):
+        for index, request in enumerate(batch.searches):
+            await asyncio.sleep(0)
+            yield {"event": "job", "indexes": [index], "query": request.picott_text, "total_results": 1, "results": []}
+
+    original = api.batch_events
+    api.batch_events = fake_batch
+    try:
+        client = TestClient(api.app)
+        response = client.post("/api/search/batch", json={"searches": [{"picott_text": "a"}, {"picott_text": "b"}]})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["query"] for line in lines] == ["a", "b"]
+        assert client.post("/api/search/batch", json={"searches": []}).status_code == 400
+        assert client.post("/api/search/batch", json={"searches": [{"picott_text": " "}]}).status_code == 400
+    finally:
+        api.batch_events = original
+    logger.info("Busca em lote verificada")
+
+
+if __name__ == "__main__":
+    test_batch_dedupes_and_shares_one_efetch()
+    test_batch_endpoint_streams_ndjson()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,98 @@
+import os
+import sys
+import gzip
+import json
+import asyncio
+import logging
+import tempfile
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+
+from benchmarks.fakes import FakeEutils, ScriptedLLM
+from benchmarks.replay import replay
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.query_validator import AsyncQueryValidator, validate_and_raise_async
+from agents.search_pipeline import run_search_pipeline
+from agents.search_refiner import AsyncSearchRefiner
+from utils.cassette import Cassette, CassetteMiss, activate, deactivate, record_events
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+class ScriptedMessages:
+    """Substitui client.messages do AsyncAnthropic com as respostas do ScriptedLLM."""
+
+    def __init__(self):
+        self.script = ScriptedLLM.__new__(ScriptedLLM)
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        prompt = "\n".join(message["content"] for message in params["messages"])
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.script.reply(prompt))])
+
+
+def test_recorded_search_replays_offline():
+    options = {"user_query": "TTFields glioblastoma recorrente", "target_results": 100, "max_iterations": 3,
+               "max_returned_results": 5}
+    messages = ScriptedMessages()
+    with tempfile.TemporaryDirectory() as tmp:
+        with FakeEutils(abstract_words=40) as eutils:
+            os.environ["PUBMED_EUTILS_URL"] = eutils.url
+            os.environ["PUBMED_RATE_LIMIT"] = "1000"  # O fake não limita; o limiter do processo só atrasaria o teste
+            try:
+                async def record():
+                    searcher, refiner, validator = AsyncPubmedSearcher(), AsyncSearchRefiner(use_cache=False), AsyncQueryValidator(use_cache=False)
+                    refiner.client.messages = validator.client.messages = messages
+                    events = run_search_pipeline(options["user_query"], searcher=searcher, refiner=refiner,
+                                                 validate=lambda query: validate_and_raise_async(query, validator),
+                                                 **{name: value for name, value in options.items() if name != "user_query"})
+                    return [event async for event in record_events(events, options, tmp)]
+
+                recorded = asyncio.run(record())
+            finally:
+                del os.environ["PUBMED_EUTILS_URL"]
+                del os.environ["PUBMED_RATE_LIMIT"]
+            upstream = dict(eutils.requests)
+        [name] = os.listdir(tmp)
+        path = os.path.join(tmp, name)
+        with gzip.open(path, "rt") as f:
+            data = json.load(f)
+        # Cada chamada externa da busca está na cassete, sem e-mail nem chave
+        kinds = [interaction["kind"] for interaction in data["interactions"]]
+        assert kinds.count("eutils") == upstream["esearch"] + upstream["efetch"] and kinds.count("llm") == messages.calls
+        assert "teste@example.com" not in json.dumps(data)
+
+        # Servidor desligado e LLM sem chamadas: o replay refaz a mesma busca só com a cassete
+        calls = messages.calls
+        report = asyncio.run(replay(path))
+        assert messages.calls == calls and report["same_result"]
+        assert [event["event"] for event in report["events"]] == [event["event"] for event in recorded]
+        assert report["recorded"]["calls"]["esearch"] == upstream["esearch"] and report["recorded"]["upstream"]["llm"] >= 0
+
+
+def test_replay_fails_loudly_when_the_pipeline_diverges():
+    cassette = Cassette(replaying=True)
+    cassette.record_eutils("esearch", "GET", {"term": "(glioma)", "email": "x"}, 200, "<eSearchResult/>", 0.1)
+    token = activate(cassette)
+    try:
+        assert cassette.replay_eutils("esearch", "GET", {"term": "(glioma)", "email": "outro"}).text == "<eSearchResult/>"
+        try:
+            cassette.replay_eutils("esearch", "GET", {"term": "(glioma)"})
+            raise AssertionError("a interação já foi consumida")
+        except CassetteMiss:
+            pass
+    finally:
+        deactivate(token)
+    logger.info("Gravação e replay verificados")
+
+
+if __name__ == "__main__":
+    test_recorded_search_replays_offline()
+    test_replay_fails_loudly_when_the_pipeline_diverges()
+    logger.info("Todos os testes passaram!")
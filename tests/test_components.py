@@ -0,0 +1,60 @@
+import os
+import sys
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+os.environ["LLM_CACHE"] = "off"
+os.environ["PUBMED_ARTICLE_STORE"] = "off"
+os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+
+from fastapi.testclient import TestClient
+
+import api
+from agents.query_validator import get_shared_validator
+from api import SearchRequest
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def test_requests_share_the_components_built_at_startup():
+    calls = []
+
+    def fake_pipeline(user_query, **kwargs):
+        calls.append(kwargs)
+        return iter(())
+
+    original = api.run_search_pipeline
+    api.run_search_pipeline = fake_pipeline
+    try:
+        with TestClient(api.app) as client:
+            response = client.get("/api/health")
+            assert response.status_code == 200
+            assert response.json() == {"ok": True, "components": {"pubmed": True, "refiner": True, "validator": True}}
+            api.search_events(SearchRequest(picott_text="TTS glioma"))
+            api.search_events(SearchRequest(picott_text="Optune gbm"))
+            searcher, refiner = api.components.searcher, api.components.refiner
+            refiner_client = refiner.client
+        # Nenhuma requisição cria agentes: todas recebem as instâncias do startup
+        assert all(call["searcher"] is searcher and call["refiner"] is refiner for call in calls)
+        assert calls[0]["validate"] == api.components.validate
+        # No shutdown os clientes são fechados e o health check passa a falhar
+        assert refiner_client.is_closed() and searcher.api.client.is_closed
+        assert TestClient(api.app).get("/api/health").status_code == 503
+    finally:
+        api.run_search_pipeline = original
+
+
+def test_sync_validation_reuses_one_validator():
+    assert get_shared_validator() is get_shared_validator()
+    assert get_shared_validator().client is get_shared_validator().client
+    logger.info("Componentes compartilhados verificados")
+
+
+if __name__ == "__main__":
+    test_requests_share_the_components_built_at_startup()
+    test_sync_validation_reuses_one_validator()
+    logger.info("Todos os testes passaram!")
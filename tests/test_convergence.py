@@ -0,0 +1,123 @@
+import os
+import sys
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+
+from agents.convergence import ConvergenceController
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_pipeline import run_search_pipeline
+from utils.pubmed_api import ESearchResult
+from utils.resilience import reset_deadline, set_deadline
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# O refinador passa do alvo para baixo e depois para cima, mais longe que antes
+COUNTS = {"(glioma) AND (ttf)": 5000, "(glioma) AND (ttf) AND (trial)": 20, "(glioma) OR (ttf)": 1000}
+
+
+class FakeEutils:
+    async def esearch(self, query, retmax=20, usehistory=True):
+        pmids = [str(pmid) for pmid in range(1, min(retmax, 5) + 1)]
+        return ESearchResult(query, COUNTS[query], pmids, "MCID", "1")
+
+    async def aiter_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        for pmid in (pmids or history.pmids[:retmax]):
+            yield {"pmid": pmid, "abstract": f"Resumo do artigo {pmid}"}
+
+    async def fetch_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        return [article async for article in self.aiter_abstracts(pmids, history, retstart, retmax)]
+
+
+class FakeSearcher(AsyncPubmedSearcher):
+    def __init__(self):
+        self.api = FakeEutils()
+        self.retmax = 500
+
+
+class OscillatingRefiner:
+    sample_size = 2
+
+    def __init__(self):
+        self.calls = 0
+
+    async def refine_search(self, current_query, abstracts, original_query, total_results, target_results):
+        self.calls += 1
+        return "(glioma) AND (ttf) AND (trial)" if total_results > target_results else "(glioma) OR (ttf)"
+
+
+async def fake_validate(user_query):
+    return "(glioma) AND (ttf)"
+
+
+def _controller(counts, **options):
+    controller = ConvergenceController(100, **options)
+    controller.observe(f"q{counts[0]}", counts[0])
+    for count in counts[1:]:
+        controller.observe(f"q{count}", count, 0.4, llm_calls=1)
+    return controller
+
+
+def test_stop_reasons():
+    # Só a busca inicial, longe do alvo: ainda não há trajetória para julgar
+    controller = _controller([5000])
+    assert controller.should_continue() and controller.reason is None
+
+    cases = [
+        ([5000, 120], {}, "converged"),
+        ([5000, 20, 1000], {}, "oscillation"),
+        ([5000, 4800], {}, "diminishing_returns"),
+        ([5000, 1000, 3000, 8000], {}, "diverging"),
+        ([5000, 1000, 400], {"max_iterations": 2}, "max_iterations"),
+        ([5000, 1000], {"budget_seconds": 0.7}, "budget"),
+        ([5000, 1000], {"max_llm_calls": 1}, "llm_budget"),
+    ]
+    for counts, options, reason in cases:
+        controller = _controller(counts, **options)
+        assert not controller.should_continue() and controller.reason == reason, (counts, controller.reason)
+
+    # A próxima iteração (~0,4 s) não cabe na metade do prazo restante
+    token = set_deadline(0.5)
+    try:
+        controller = _controller([5000, 1000])
+        assert not controller.should_continue() and controller.reason == "deadline"
+    finally:
+        reset_deadline(token)
+    assert _controller([5000, 1000]).should_continue()
+
+
+def test_best_step_is_the_closest_in_log_scale():
+    controller = _controller([5000, 20, 1000])
+    # 20 fica a ~1,6 do alvo em escala log; 1000 a ~2,3
+    assert controller.best.count == 20 and controller.best.iteration == 1
+    summary = controller.summary()
+    assert summary["best_iteration"] == 1 and summary["iterations"] == 2 and summary["llm_calls"] == 2
+
+
+def test_pipeline_stops_on_oscillation_and_returns_the_best_query():
+    refiner = OscillatingRefiner()
+
+    async def run():
+        return [event async for event in run_search_pipeline("TTS glioma", target_results=100, max_iterations=10,
+                                                             max_returned_results=5, searcher=FakeSearcher(),
+                                                             refiner=refiner, validate=fake_validate)]
+
+    events = asyncio.run(run())
+    counts = [event["total_results"] for event in events if event["event"] == "iteration"]
+    # O teto de 10 iterações não é atingido: a oscilação encerra depois da segunda
+    assert counts == [5000, 20, 1000] and refiner.calls == 2
+    done = events[-1]
+    assert done["query"] == "(glioma) AND (ttf) AND (trial)" and done["total_results"] == 20
+    assert done["convergence"]["reason"] == "oscillation" and done["convergence"]["best_iteration"] == 1
+    logger.info("Convergência: %s", done["convergence"])
+
+
+if __name__ == "__main__":
+    test_stop_reasons()
+    test_best_step_is_the_closest_in_log_scale()
+    test_pipeline_stops_on_oscillation_and_returns_the_best_query()
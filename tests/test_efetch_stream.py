@@ -0,0 +1,53 @@
+import os
+import sys
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.pubmed_api import ArticleStreamParser, parse_abstracts
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def build_efetch_xml(total):
+    articles = "".join(
+        f"<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article><Abstract>"
+        f"<AbstractText>Abstract {pmid} sobre glioma.</AbstractText></Abstract></Article>"
+        f"</MedlineCitation></PubmedArticle>"
+        for pmid in range(1, total + 1)
+    )
+    return f'<?xml version="1.0" ?><PubmedArticleSet>{articles}</PubmedArticleSet>'.encode()
+
+
+def test_articles_are_yielded_as_soon_as_they_close():
+    payload = build_efetch_xml(3)
+    parser = ArticleStreamParser()
+    first_close = payload.index(b"</PubmedArticle>") + len(b"</PubmedArticle>")
+
+    assert parser.feed(payload[:first_close - 1]) == []
+    first = parser.feed(payload[first_close - 1:first_close])
+    assert [(article["pmid"], article["abstract"]) for article in first] == [("1", "Abstract 1 sobre glioma.")]
+    rest = parser.feed(payload[first_close:]) + parser.close()
+    assert [article["pmid"] for article in rest] == ["2", "3"]
+
+
+def test_parser_memory_stays_flat():
+    payload = build_efetch_xml(2000)
+    parser = ArticleStreamParser()
+    total = 0
+    for start in range(0, len(payload), 4096):
+        total += len(parser.feed(payload[start:start + 4096]))
+        # Artigos já emitidos são removidos da raiz; só o artigo em andamento fica na árvore
+        assert len(parser._root) <= 1
+    total += len(parser.close())
+    assert total == 2000
+    assert len(parse_abstracts(payload.decode())) == 2000
+    logger.info("Parser incremental do efetch verificado")
+
+
+if __name__ == "__main__":
+    test_articles_are_yielded_as_soon_as_they_close()
+    test_parser_memory_stays_flat()
+    logger.info("Todos os testes passaram!")
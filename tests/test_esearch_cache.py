@@ -0,0 +1,92 @@
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import threading
+
+import httpx
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.query_syntax import canonicalize_query
+from utils.async_pubmed_api import AsyncPubmedAPI
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+ESEARCH_XML = ("<eSearchResult><Count>3</Count><IdList><Id>1</Id><Id>2</Id><Id>3</Id></IdList>"
+               "<QueryKey>1</QueryKey><WebEnv>MCID_teste</WebEnv></eSearchResult>")
+
+
+def test_logically_identical_queries_share_a_key():
+    first = '("High  Grade Glioma" OR GBM OR hgg[tiab])  AND (TTF OR "Tumor treating fields")'
+    second = '((TTF OR "tumor treating fields")) AND (HGG[TIAB] OR gbm OR "high grade glioma" OR GBM)'
+    assert canonicalize_query(first) == canonicalize_query(second)
+    # Operadores em minúsculas são termos para o PubMed, então não podem ser confundidos com OR
+    assert canonicalize_query("glioma OR gbm") != canonicalize_query("glioma or gbm")
+    assert canonicalize_query("(glioma AND gbm) OR ttf") != canonicalize_query("glioma AND (gbm OR ttf)")
+
+
+def test_esearch_cache_serves_repeated_and_smaller_requests():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.params["term"])
+        return httpx.Response(200, text=ESEARCH_XML)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shared = SQLiteCache(os.path.join(tmp, "esearch.sqlite3"), table="esearch")
+        cache = TieredCache(LRUCache(maxsize=10, ttl=60), shared)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                api = AsyncPubmedAPI(email="teste@example.com", client=client, esearch_cache=cache)
+                first = await api.esearch("(GBM OR glioma)", retmax=3)
+                count = await api.count_results("(glioma OR  gbm)")
+                pmids = await api.fetch_pmids("glioma OR GBM", retmax=2)
+                return first, count, pmids
+
+        first, count, pmids = asyncio.run(run())
+        assert calls == ["(GBM OR glioma)"], f"Só a primeira query deveria ir ao eutils: {calls}"
+        assert first.webenv == "MCID_teste"
+        assert count == 3 and pmids == ["1", "2"]
+
+        # Outro worker (memória vazia) encontra a entrada no backend compartilhado
+        other_worker = TieredCache(LRUCache(maxsize=10, ttl=60), shared)
+        assert other_worker.get(canonicalize_query("(glioma OR gbm)"))["count"] == 3
+    logger.info("Cache de esearch verificado")
+
+
+def test_shared_backend_runs_off_the_event_loop():
+    threads = []
+
+    class TracingSQLiteCache(SQLiteCache):
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return super().get(key)
+
+        def set(self, key, value, ttl=None):
+            threads.append(threading.get_ident())
+            super().set(key, value, ttl)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TieredCache(LRUCache(maxsize=10, ttl=60), TracingSQLiteCache(os.path.join(tmp, "e.sqlite3"), table="esearch"))
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, text=ESEARCH_XML))) as client:
+                api = AsyncPubmedAPI(email="teste@example.com", client=client, esearch_cache=cache)
+                await api.esearch("(GBM OR glioma)", retmax=3)
+                return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+if __name__ == "__main__":
+    test_logically_identical_queries_share_a_key()
+    test_esearch_cache_serves_repeated_and_smaller_requests()
+    test_shared_backend_runs_off_the_event_loop()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import logging
+import tempfile
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ["PUBMED_ARTICLE_STORE"] = "off"
+os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+
+from anthropic import Anthropic
+
+from benchmarks.fakes import FakeEutils, ScriptedLLM
+from benchmarks import run_benchmarks
+from agents.search_refiner import SearchRefiner
+from utils.pubmed_api import PubmedAPI
+from utils.query_syntax import parse_blocks
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def api_for(eutils):
+    os.environ["PUBMED_EUTILS_URL"] = eutils.url
+    try:
+        return PubmedAPI(email="teste@example.com")
+    finally:
+        del os.environ["PUBMED_EUTILS_URL"]
+
+
+def test_fake_eutils_serves_searches_history_and_throttling():
+    with FakeEutils(throttle_first=1, abstract_words=40) as eutils:
+        api = api_for(eutils)
+        assert api.base_esearch == f"{eutils.url}/esearch.fcgi"
+        # O primeiro pedido recebe 429 e o cliente repete com backoff
+        result = api.esearch("(glioma OR GBM) AND (ttfields OR optune)", retmax=5)
+        assert eutils.requests["throttled"] == 1 and result.has_history and len(result.pmids) == 5
+        articles = api.fetch_abstracts(history=result, retmax=5)
+        assert [article.pmid for article in articles] == result.pmids
+        assert [label for label, _ in articles[0].sections] == ["BACKGROUND", "METHODS", "RESULTS", "CONCLUSIONS"]
+        # Mais sinônimos ampliam, mais blocos AND restringem
+        broad = api.count_results("(glioma OR GBM OR HGG OR astrocytoma) AND (ttfields OR optune)")
+        narrow = api.count_results("(glioma OR GBM) AND (ttfields OR optune) AND (survival)")
+        assert narrow < result.count < broad
+        assert api.esearch("(gbm OR glioma) AND (optune OR ttfields)", retmax=5).pmids == result.pmids
+
+
+def test_recorded_corpus_and_scripted_llm():
+    corpus = {"esearch": {"(glioma)": {"count": 2, "pmids": ["7", "8"]}},
+              "articles": {"7": {"pmid": "7", "title": "Gravado", "journal": "J", "year": 2020,
+                                 "sections": [[None, "Texto gravado."]], "mesh": [], "publication_types": []}}}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.json")
+        with open(path, "w") as f:
+            json.dump(corpus, f)
+        with FakeEutils(corpus=path) as eutils:
+            api = api_for(eutils)
+            result = api.esearch("(Glioma)", retmax=5)
+            assert (result.count, result.pmids) == (2, ["7", "8"])
+            assert api.fetch_abstracts(result.pmids)[0]["abstract"] == "Texto gravado."
+
+    with ScriptedLLM() as llm:
+        client = Anthropic(api_key="teste", base_url=llm.url)
+        prompt = 'Recebi a seguinte query do usuário: "TTFields glioblastoma recorrente"'
+        message = client.messages.create(model="m", max_tokens=10, messages=[{"role": "user", "content": prompt}])
+        assert len(parse_blocks(message.content[0].text)) == 2
+        refiner = SearchRefiner.__new__(SearchRefiner)
+        refiner.sample_size = 10
+        _, user_prompt = refiner._build_candidate_prompts("(glioma OR GBM) AND (ttf OR optune)", [{"abstract": "x"}],
+                                                          "TTS", 5000, 100, 3)
+        text = client.messages.create(model="m", max_tokens=10, messages=[{"role": "user", "content": user_prompt}]).content[0].text
+        candidates = refiner._parse_candidates(text, 3)
+        # Acima do alvo, todas as candidatas ganham o bloco de outcomes
+        assert len(candidates) == 3 and all(len(parse_blocks(query)) == 3 for query in candidates)
+        assert llm.calls == 2
+
+
+def test_benchmark_harness_writes_comparable_json():
+    saved = dict(os.environ)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "run.json")
+            run_benchmarks.main(["--scenarios", "esearch", "single_search", "--iterations", "3",
+                                 "--latency", "0", "--jitter", "0", "--output", output])
+            with open(output) as f:
+                report = json.load(f)
+    finally:
+        os.environ.clear()
+        os.environ.update(saved)
+    stats = report["scenarios"]["single_search"]
+    assert stats["runs"] == 3 and stats["errors"] == 0
+    assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] and stats["peak_rss_mb"] > 0
+    assert stats["eutils_requests"]["esearch"] == 3 and stats["eutils_requests"]["efetch"] == 3
+    assert report["meta"]["options"]["iterations"] == 3
+    logger.info("Fakes e harness de benchmark verificados")
+
+
+if __name__ == "__main__":
+    test_fake_eutils_serves_searches_history_and_throttling()
+    test_recorded_corpus_and_scripted_llm()
+    test_benchmark_harness_writes_comparable_json()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+
+from fastapi.testclient import TestClient
+
+import api
+from utils.job_queue import JobQueue, QueueFullError
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def test_workers_bound_concurrency_and_queue_admission():
+    async def run():
+        release = asyncio.Event()
+        running = []
+
+        async def handler(payload, emit):
+            running.append(payload["n"])
+            await emit({"event": "started", "n": payload["n"]})
+            await release.wait()
+            return {"n": payload["n"]}
+
+        queue = JobQueue(handler, workers=2, max_queued=2)
+        await queue.start()
+        jobs = [queue.submit({"n": n}) for n in range(4)]
+        await asyncio.sleep(0.01)
+        assert sorted(running) == [0, 1]
+        assert queue.stats()["running"] == 2 and queue.stats()["queued"] == 2
+        try:
+            queue.submit({"n": 4})
+            raise AssertionError("A fila cheia deveria recusar o job")
+        except QueueFullError:
+            pass
+
+        # Cancelar um job em execução e um ainda na fila
+        assert queue.cancel(jobs[1].id) and queue.cancel(jobs[3].id)
+        events = []
+
+        async def follow():
+            async for event in queue.subscribe(jobs[0].id):
+                events.append(event)
+
+        follower = asyncio.create_task(follow())
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.wait_for(follower, 1)
+        await asyncio.sleep(0.01)
+
+        assert queue.get(jobs[0].id)["result"] == {"n": 0}
+        assert queue.get(jobs[1].id)["status"] == "cancelled"
+        assert queue.get(jobs[2].id)["status"] == "done"
+        assert queue.get(jobs[3].id)["status"] == "cancelled"
+        assert [event["event"] for event in events] == ["started", "job"]
+        stats = queue.stats()
+        await queue.stop()
+        return stats
+
+    # wait_for: um worker preso faz o teste falhar em vez de travar o pytest
+    stats = asyncio.run(asyncio.wait_for(run(), 5))
+    assert stats["rejected"] == 1 and stats["done"] == 2 and stats["cancelled"] == 2
+
+
+def test_stop_with_job_in_flight():
+    async def run():
+        async def handler(payload, emit):
+            await asyncio.sleep(60)
+
+        queue = JobQueue(handler, workers=1, max_queued=1)
+        await queue.start()
+        job = queue.submit({})
+        await asyncio.sleep(0.01)
+        assert queue.get(job.id)["status"] == "running"
+        await asyncio.wait_for(queue.stop(), 2)
+        assert queue.get(job.id)["status"] == "cancelled"
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_job_endpoints():
+    async def fake_events(request):
+        yield {"event": "accepted", "query": request.picott_text}
+        await asyncio.sleep(0.01)
+        yield {"event": "result", "pmid": "1", "abstract": "Resumo"}
+        yield {"event": "done", "query": "(glioma) AND (ttf)", "total_results": 7, "returned": 1}
+
+    original = api.search_events
+    api.search_events = fake_events
+    try:
+        with TestClient(api.app) as client:
+            submitted = client.post("/api/jobs", json={"picott_text": "TTS glioma"})
+            assert submitted.status_code == 202
+            job_id = submitted.json()["job_id"]
+
+            deadline = time.time() + 5
+            while (status := client.get(f"/api/jobs/{job_id}").json())["status"] != "done":
+                assert time.time() < deadline, status
+                time.sleep(0.01)
+            assert status["result"] == {"query": "(glioma) AND (ttf)", "total_results": 7,
+                                        "results": [{"pmid": "1", "abstract": "Resumo"}]}
+
+            with client.stream("GET", f"/api/jobs/{job_id}/events") as response:
+                assert '"status": "done"' in response.read().decode()
+            assert client.get("/api/jobs/inexistente").status_code == 404
+            assert client.delete(f"/api/jobs/{job_id}").json()["cancelled"] is False
+            assert client.get("/api/jobs/stats").json()["done"] >= 1
+    finally:
+        api.search_events = original
+    logger.info("Fila de jobs verificada")
+
+
+if __name__ == "__main__":
+    test_workers_bound_concurrency_and_queue_admission()
+    test_stop_with_job_in_flight()
+    test_job_endpoints()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,139 @@
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+import threading
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ["LLM_CACHE"] = "off"
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.llm_cache import LLMResponseCache, acached_completion, cached_completion
+from agents.search_refiner import SearchRefiner
+from agents.query_validator import AsyncQueryValidator
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+class FakeMessages:
+    """Substitui client.messages do Anthropic contando as chamadas."""
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.text)])
+
+
+class AsyncFakeMessages(FakeMessages):
+    async def create(self, **kwargs):
+        return super().create(**kwargs)
+
+
+def test_key_depends_on_every_parameter():
+    params = {"model": "m", "system": "s", "messages": [{"role": "user", "content": "u"}], "temperature": 0.2}
+    same = {"temperature": 0.2, "messages": [{"role": "user", "content": "u"}], "system": "s", "model": "m"}
+    assert LLMResponseCache.key("anthropic", params) == LLMResponseCache.key("anthropic", same)
+    assert LLMResponseCache.key("anthropic", params) != LLMResponseCache.key("deepseek", params)
+    assert LLMResponseCache.key("anthropic", params) != LLMResponseCache.key("anthropic", {**params, "temperature": 0.3})
+
+
+def test_refiner_reuses_cached_response_across_processes():
+    refined = '("glioma" OR "GBM") AND ("tumor treating fields")'
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm.sqlite3")
+        args = ("(glioma)", [{"pmid": "1", "abstract": "texto"}], "TTS glioma", 5000, 100)
+
+        refiner = SearchRefiner(use_cache=False)
+        refiner.cache = LLMResponseCache(TieredCache(LRUCache(maxsize=1), SQLiteCache(path, table="llm_responses")))
+        refiner.client = SimpleNamespace(messages=FakeMessages(refined))
+        assert refiner.refine_search(*args) == refined
+        assert refiner.refine_search(*args) == refined
+        assert len(refiner.client.messages.calls) == 1
+
+        # bypass força a chamada, mas a resposta nova continua sendo gravada
+        assert refiner.refine_search(*args, bypass_cache=True) == refined
+        assert len(refiner.client.messages.calls) == 2
+        assert refiner.cache.stats()["bypassed"] == 1
+
+        # Outro "processo": memória vazia, mesma base em disco
+        other = SearchRefiner(use_cache=False)
+        other.cache = LLMResponseCache(TieredCache(LRUCache(maxsize=1), SQLiteCache(path, table="llm_responses")))
+        other.client = SimpleNamespace(messages=FakeMessages("não deveria ser chamado"))
+        assert other.refine_search(*args) == refined
+        assert other.client.messages.calls == []
+        assert other.cache.stats()["shared"]["hits"] == 1
+
+
+def test_validator_cache_is_opt_in():
+    assert AsyncQueryValidator().cache is None
+
+    validator = AsyncQueryValidator(use_cache=False)
+    validator.cache = LLMResponseCache(TieredCache(LRUCache(maxsize=8)))
+    validator.client = SimpleNamespace(messages=AsyncFakeMessages("(glioma) AND (TTFields)"))
+
+    async def run():
+        first = await validator.validate_query("TTS field for high grade glioma")
+        second = await validator.validate_query("TTS field for high grade glioma")
+        return first, second
+
+    assert asyncio.run(run()) == ("(glioma) AND (TTFields)", "(glioma) AND (TTFields)")
+    assert len(validator.client.messages.calls) == 1
+
+
+def test_async_completion_reads_disk_off_the_event_loop():
+    threads = []
+
+    class TracingSQLiteCache(SQLiteCache):
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return super().get(key)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = LLMResponseCache(TieredCache(LRUCache(maxsize=8), TracingSQLiteCache(os.path.join(tmp, "llm.sqlite3"))))
+
+        async def call():
+            return "resposta"
+
+        async def run():
+            assert await acached_completion(cache, "anthropic", {"prompt": "x"}, call) == "resposta"
+            cache.cache.memory.clear()
+            assert await acached_completion(cache, "anthropic", {"prompt": "x"}, call) == "resposta"
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(run())
+    assert len(threads) == 2 and loop_thread not in threads
+
+
+def test_errors_are_not_cached():
+    cache = LLMResponseCache(TieredCache(LRUCache(maxsize=8)))
+    attempts = []
+
+    def failing():
+        attempts.append(1)
+        raise RuntimeError("falha temporária")
+
+    for _ in range(2):
+        try:
+            cached_completion(cache, "deepseek", {"prompt": "x"}, failing)
+        except RuntimeError:
+            pass
+    assert len(attempts) == 2
+    assert cache.stats()["memory"]["size"] == 0
+    logger.info("Cache de respostas de LLM verificado")
+
+
+if __name__ == "__main__":
+    test_key_depends_on_every_parameter()
+    test_refiner_reuses_cached_response_across_processes()
+    test_validator_cache_is_opt_in()
+    test_async_completion_reads_disk_off_the_event_loop()
+    test_errors_are_not_cached()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,123 @@
+import os
+import re
+import sys
+import asyncio
+import logging
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+
+from fastapi.testclient import TestClient
+
+import api
+from benchmarks.fakes import FakeEutils, ScriptedLLM
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.query_validator import AsyncQueryValidator, validate_and_raise_async
+from agents.search_pipeline import collect_search, run_search_pipeline
+from agents.search_refiner import AsyncSearchRefiner
+from utils.metrics import Counter, Histogram, render_prometheus
+from utils.tracing import STAGE_BYTES, STAGE_LATENCY, span
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+class ScriptedMessages:
+    """Substitui client.messages do AsyncAnthropic com as respostas do ScriptedLLM."""
+
+    def __init__(self):
+        self.script = ScriptedLLM.__new__(ScriptedLLM)
+
+    async def create(self, **params):
+        prompt = "\n".join(message["content"] for message in params["messages"])
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.script.reply(prompt))])
+
+
+def _samples(text):
+    """Linhas de amostra do formato de exposição: {(nome, labels): valor}."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            match = re.fullmatch(r'(\w+)(\{.*\})? (\S+)', line)
+            assert match, line
+            samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def test_render_prometheus_exposition_format():
+    latency = Histogram("teste_seconds", "Latência de teste", buckets=(0.1, 1.0))
+    latency.observe(0.05, endpoint="esearch")
+    latency.observe(0.5, endpoint="esearch")
+    total = Counter("teste_total", "Contador de teste")
+    total.inc(3, query='com "aspas"')
+    text = render_prometheus({"teste_seconds": latency, "teste_total": total})
+    assert "# TYPE teste_seconds histogram" in text and "# TYPE teste_total counter" in text
+    samples = _samples(text)
+    assert samples[("teste_seconds_bucket", '{endpoint="esearch",le="0.1"}')] == 1
+    assert samples[("teste_seconds_bucket", '{endpoint="esearch",le="+Inf"}')] == 2
+    assert samples[("teste_seconds_count", '{endpoint="esearch"}')] == 2
+    assert samples[("teste_total", '{query="com \\"aspas\\""}')] == 3
+    logger.info("Formato de exposição do Prometheus verificado")
+
+
+def test_search_stages_are_exported_on_metrics():
+    STAGE_LATENCY.reset()
+    STAGE_BYTES.reset()
+    messages = ScriptedMessages()
+    with FakeEutils(abstract_words=40) as eutils:
+        os.environ["PUBMED_EUTILS_URL"] = eutils.url
+        os.environ["PUBMED_RATE_LIMIT"] = "1000"  # O fake não limita; o limiter do processo só atrasaria o teste
+        previous_store = os.environ.get("PUBMED_ARTICLE_STORE")
+        os.environ["PUBMED_ARTICLE_STORE"] = "off"  # Artigos de execuções anteriores pulariam o efetch
+        try:
+            async def search():
+                searcher, refiner, validator = AsyncPubmedSearcher(), AsyncSearchRefiner(use_cache=False), AsyncQueryValidator(use_cache=False)
+                refiner.client.messages = validator.client.messages = messages
+                try:
+                    return await collect_search(run_search_pipeline(
+                        "TTFields glioblastoma recorrente", target_results=100, max_iterations=2, max_returned_results=5,
+                        searcher=searcher, refiner=refiner, validate=lambda query: validate_and_raise_async(query, validator)))
+                finally:
+                    await refiner.aclose()
+                    await validator.aclose()
+
+            response = asyncio.run(search())
+        finally:
+            del os.environ["PUBMED_EUTILS_URL"]
+            del os.environ["PUBMED_RATE_LIMIT"]
+            if previous_store is None:
+                del os.environ["PUBMED_ARTICLE_STORE"]
+            else:
+                os.environ["PUBMED_ARTICLE_STORE"] = previous_store
+    assert response["results"]
+
+    scraped = TestClient(api.app).get("/metrics")
+    assert scraped.status_code == 200 and scraped.headers["content-type"].startswith("text/plain")
+    samples = _samples(scraped.text)
+    counts = {labels: value for (name, labels), value in samples.items() if name == "pubmed_stage_seconds_count"}
+    stages = {re.search(r'stage="(\w+)"', labels).group(1) for labels in counts}
+    assert {"validate", "refine", "llm", "esearch", "efetch", "parse", "summarize"} <= stages, stages
+    # Cache do LLM desligado: toda chamada foi ao provedor
+    assert counts['{cache_hit="false",stage="llm"}'] >= 2
+    assert samples[("pubmed_stage_bytes_total", '{stage="efetch"}')] > 0
+    logger.info("Etapas exportadas: %s", sorted(stages))
+
+
+def test_span_records_failures():
+    STAGE_LATENCY.reset()
+    try:
+        with span("validate"):
+            raise ValueError("falhou")
+    except ValueError:
+        pass
+    [series] = STAGE_LATENCY.snapshot()
+    assert series["labels"] == {"stage": "validate"} and series["count"] == 1
+
+
+if __name__ == "__main__":
+    test_render_prometheus_exposition_format()
+    test_search_stages_are_exported_on_metrics()
+    test_span_records_failures()
@@ -0,0 +1,76 @@
+import os
+import sys
+import logging
+import requests
+from requests.adapters import BaseAdapter
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# Estes testes verificam as requisições ao eutils, então os caches ficam desligados
+os.environ["PUBMED_ARTICLE_STORE"] = "off"
+os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+
+from utils.pubmed_api import PubmedAPI, REQUEST_LATENCY, build_session
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+ESEARCH_XML = "<eSearchResult><Count>243</Count><IdList><Id>1</Id><Id>2</Id></IdList></eSearchResult>"
+
+
+class StaticAdapter(BaseAdapter):
+    """Adapter que responde sempre o mesmo XML, sem tocar a rede."""
+
+    def __init__(self, body):
+        super().__init__()
+        self.body = body
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append((request, kwargs))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.body.encode()
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_instances_share_pooled_session():
+    first = PubmedAPI(email="teste@example.com")
+    second = PubmedAPI(email="teste@example.com", api_key="chave")
+    assert first.session is second.session, "As instâncias deveriam compartilhar a mesma sessão"
+
+    session = build_session(pool_size=4)
+    adapter = session.get_adapter("https://eutils.ncbi.nlm.nih.gov")
+    assert adapter._pool_maxsize == 4
+    assert session.headers["Connection"] == "keep-alive"
+
+
+def test_request_uses_timeouts_and_records_latency():
+    session = requests.Session()
+    adapter = StaticAdapter(ESEARCH_XML)
+    session.mount("https://", adapter)
+    api = PubmedAPI(email="teste@example.com", session=session, connect_timeout=1, read_timeout=2)
+
+    REQUEST_LATENCY.reset()
+    assert api.count_results('("high grade glioma" OR GBM)') == 243
+    assert api.fetch_pmids("glioma", retmax=2) == ["1", "2"]
+
+    request, kwargs = adapter.requests[0]
+    assert kwargs["timeout"] == (1, 2)
+    assert "api_key" not in request.url, "api_key ausente não deveria ir na URL"
+
+    series = REQUEST_LATENCY.snapshot()
+    assert series[0]["labels"] == {"endpoint": "esearch", "status": "200"}
+    assert series[0]["count"] == 2
+    logger.info("Sessão compartilhada e histograma de latência verificados")
+
+
+if __name__ == "__main__":
+    test_instances_share_pooled_session()
+    test_request_uses_timeouts_and_records_latency()
+    logger.info("Todos os testes passaram!")
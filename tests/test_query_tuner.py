@@ -0,0 +1,102 @@
+import os
+import sys
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.query_tuner import QueryTuner
+from utils.query_syntax import parse_blocks, render_blocks
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+# Corpus sintético: PMIDs de cada termo; a contagem de uma query é a interseção das uniões dos blocos
+POSTINGS = {
+    '"high grade glioma"': set(range(0, 4000)),
+    "GBM": set(range(2000, 9000)),
+    '"brain tumor"': set(range(8000, 20000)),
+    "TTF": set(range(0, 20000, 10)),
+    "Optune": set(range(5, 20000, 20)),
+    '"electric fields"': set(range(7, 20000, 40)),
+    "survival": set(range(0, 20000, 3)),
+}
+
+
+class CorpusAPI:
+    def __init__(self):
+        self.counted = []
+
+    async def count_results(self, query):
+        self.counted.append(query)
+        await asyncio.sleep(0)
+        pmids = None
+        for terms in parse_blocks(query):
+            union = set().union(*(POSTINGS[term] for term in terms))
+            pmids = union if pmids is None else pmids & union
+        return len(pmids)
+
+
+def count(query):
+    return asyncio.run(CorpusAPI().count_results(query))
+
+
+def test_parse_and_render_blocks():
+    query = '("high grade glioma" OR GBM) AND (TTF OR Optune)'
+    assert parse_blocks(query) == [['"high grade glioma"', "GBM"], ["TTF", "Optune"]]
+    assert render_blocks(parse_blocks(query)) == query
+    # Estruturas que o ajuste local não entende ficam para o LLM
+    assert parse_blocks('(glioma NOT GBM) AND (TTF)') is None
+    assert parse_blocks('(glioma OR (GBM AND adult)) AND (TTF)') is None
+
+
+def test_narrowing_keeps_the_most_productive_synonyms():
+    query = '("high grade glioma" OR GBM OR "brain tumor") AND (TTF OR Optune OR "electric fields")'
+    total = count(query)
+    api = CorpusAPI()
+    tuned = asyncio.run(QueryTuner(api, matrix_cap=0).tune(query, total, target_results=1000))
+    assert tuned is not None
+    assert 500 <= tuned.count <= 1500
+    assert tuned.count == count(tuned.query)
+    assert tuned.probes == len(api.counted) <= 16
+
+
+def test_broadening_drops_outcomes_or_restores_synonyms():
+    narrow = '("high grade glioma") AND (TTF OR Optune) AND (survival)'
+    tuned = asyncio.run(QueryTuner(CorpusAPI(), matrix_cap=0).tune(narrow, count(narrow), target_results=600))
+    assert tuned.query == '("high grade glioma") AND (TTF OR Optune)'
+
+    previous = '("high grade glioma" OR GBM OR "brain tumor") AND (TTF OR Optune)'
+    tuned = asyncio.run(QueryTuner(CorpusAPI(), matrix_cap=0).tune(narrow, count(narrow), target_results=1600, previous_queries=[previous]))
+    assert tuned is not None and 800 <= tuned.count <= 2400
+
+
+def test_returns_none_when_the_vocabulary_must_change():
+    query = '(GBM) AND (TTF)'
+    api = CorpusAPI()
+    assert asyncio.run(QueryTuner(api, matrix_cap=0).tune(query, count(query), target_results=10)) is None
+    assert api.counted == []
+    logger.info("Ajuste local de queries verificado")
+
+
+def test_failed_vocabulary_and_request_budget_stop_probing():
+    query = '("high grade glioma" OR GBM OR "brain tumor") AND (TTF OR Optune OR "electric fields")'
+    api = CorpusAPI()
+    tuner = QueryTuner(api, matrix_cap=0, budget=10)
+    # Alvo inalcançável: gasta no máximo o orçamento da requisição
+    assert asyncio.run(tuner.tune(query, count(query), target_results=3)) is None
+    assert len(api.counted) == tuner.spent <= 10
+    # Mesmos termos: o tuner não volta ao eutils
+    spent = len(api.counted)
+    assert asyncio.run(tuner.tune(query, count(query), target_results=3)) is None
+    assert len(api.counted) == spent
+
+
+if __name__ == "__main__":
+    test_parse_and_render_blocks()
+    test_narrowing_keeps_the_most_productive_synonyms()
+    test_broadening_drops_outcomes_or_restores_synonyms()
+    test_returns_none_when_the_vocabulary_must_change()
+    test_failed_vocabulary_and_request_budget_stop_probing()
+    logger.info("Todos os testes passaram!")
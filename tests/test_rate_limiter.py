@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.rate_limiter import TokenBucket, FileTokenBucket, WAIT_TIME, get_rate_limiter, fcntl
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+
+def test_budget_follows_api_key():
+    assert get_rate_limiter(None).rate == 3.0
+    assert get_rate_limiter("chave").rate == 10.0
+    assert get_rate_limiter(None) is get_rate_limiter(None), "O limiter deveria ser único por processo"
+
+
+def test_threads_and_tasks_share_the_budget():
+    limiter = TokenBucket(rate=50.0, capacity=1.0, name="teste")
+    start = time.monotonic()
+
+    threads = [threading.Thread(target=limiter.acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+
+    async def tasks():
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(5)))
+
+    asyncio.run(tasks())
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.monotonic() - start
+    # 10 requisições a 50 req/s com rajada 1 precisam de pelo menos 9 intervalos de 20ms
+    assert elapsed >= 0.17, f"Limiter liberou rápido demais: {elapsed:.3f}s"
+    series = [s for s in WAIT_TIME.snapshot() if s["labels"] == {"limiter": "teste"}]
+    assert series[0]["count"] == 10
+
+
+def test_file_bucket_is_shared_between_instances():
+    if fcntl is None:
+        logger.info("flock indisponível, teste ignorado")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "eutils.bucket")
+        # Duas instâncias simulam dois workers apontando para o mesmo arquivo
+        first = FileTokenBucket(path, rate=20.0)
+        second = FileTokenBucket(path, rate=20.0)
+        assert first.acquire() == 0
+        wait = second.acquire()
+        assert wait > 0.03, f"O segundo worker deveria esperar pelo orçamento do primeiro ({wait:.3f}s)"
+
+
+if __name__ == "__main__":
+    test_budget_follows_api_key()
+    test_threads_and_tasks_share_the_budget()
+    test_file_bucket_is_shared_between_instances()
+    logger.info("Todos os testes passaram!")
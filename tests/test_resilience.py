@@ -0,0 +1,167 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+
+import httpx
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_pipeline import run_search_pipeline
+from utils.async_pubmed_api import HEDGED_REQUESTS, AsyncPubmedAPI
+from utils.rate_limiter import TokenBucket
+from utils.resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceeded, remaining, reset_deadline,
+                              set_deadline)
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+ESEARCH_XML = "<eSearchResult><Count>7</Count><IdList><Id>1</Id></IdList></eSearchResult>"
+
+
+def _api(client, breaker=None):
+    return AsyncPubmedAPI(email="teste@example.com", client=client, rate_limiter=TokenBucket(1000, capacity=10),
+                          circuit_breaker=breaker or CircuitBreaker("teste"))
+
+
+def test_transient_errors_are_retried_and_trip_the_breaker():
+    replies = iter(["reset", 503, 200])
+    seen = []
+
+    async def handler(request):
+        seen.append(request.url.path)
+        reply = next(replies, 500)
+        if reply == "reset":
+            raise httpx.ConnectError("Connection reset by peer")
+        return httpx.Response(reply, text=ESEARCH_XML)
+
+    breaker = CircuitBreaker("teste", failure_threshold=3, reset_timeout=0.2)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = _api(client, breaker)
+            # Conexão resetada e 503 são repetidos; o 200 fecha o circuito de novo
+            assert await api._make_request(api.base_esearch, {"term": "a"}, backoff=0.01) == ESEARCH_XML
+            assert breaker.state == "closed" and len(seen) == 3
+            # Agora só 500: três falhas seguidas abrem o circuito e a quarta tentativa nem vai à rede
+            try:
+                await api._make_request(api.base_esearch, {"term": "b"}, retries=4, backoff=0.01)
+                raise AssertionError("o circuito deveria abrir")
+            except CircuitOpenError as e:
+                assert e.retry_after > 0
+            assert breaker.state == "open" and len(seen) == 6
+            # Passado o reset_timeout, uma requisição de teste passa; falhando, o circuito reabre
+            await asyncio.sleep(0.25)
+            try:
+                await api._make_request(api.base_esearch, {"term": "c"}, retries=1)
+            except Exception:
+                pass
+            assert breaker.state == "open" and len(seen) == 7
+
+    asyncio.run(run())
+    logger.info("Novas tentativas e circuit breaker verificados")
+
+
+def test_4xx_is_not_retried():
+    seen = []
+
+    async def handler(request):
+        seen.append(1)
+        return httpx.Response(400, text="bad request")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = _api(client)
+            try:
+                await api._make_request(api.base_esearch, {"term": "a"}, backoff=0.01)
+                raise AssertionError("400 deveria ser propagado")
+            except httpx.HTTPStatusError:
+                pass
+            assert api.circuit_breaker.state == "closed"
+
+    asyncio.run(run())
+    assert len(seen) == 1
+
+
+def test_deadline_stops_retries_and_the_pipeline():
+    async def handler(request):
+        await asyncio.sleep(0.15)
+        return httpx.Response(503, text="indisponível")
+
+    async def slow_request():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = _api(client)
+            token = set_deadline(0.2)
+            try:
+                await api._make_request(api.base_esearch, {"term": "a"}, backoff=0.01)
+            finally:
+                reset_deadline(token)
+
+    started = time.perf_counter()
+    try:
+        asyncio.run(slow_request())
+        raise AssertionError("o prazo deveria esgotar")
+    except DeadlineExceeded:
+        pass
+    # A terceira tentativa não começa: o prazo acabou durante a segunda
+    assert time.perf_counter() - started < 0.45
+
+    async def slow_validate(query):
+        await asyncio.sleep(0.1)
+        return query
+
+    async def pipeline():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            searcher = AsyncPubmedSearcher(client=client)
+            events = []
+            try:
+                async for event in run_search_pipeline("(glioma) AND (TTFields)", searcher=searcher, refiner=object(),
+                                                       validate=slow_validate, deadline_seconds=0.05):
+                    events.append(event["event"])
+            except DeadlineExceeded:
+                return events
+            raise AssertionError("a busca deveria terminar por prazo")
+
+    # A validação gasta o prazo; o esearch seguinte falha antes de ir à rede
+    assert asyncio.run(pipeline()) == ["accepted", "validated"]
+    assert remaining() is None
+
+
+def test_slow_esearch_is_hedged_within_the_rate_budget():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.params["term"])
+        if len(calls) == 1:
+            await asyncio.sleep(1.0)  # Cauda lenta só na primeira requisição
+        return httpx.Response(200, text=ESEARCH_XML)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = _api(client)
+            api.hedge_after = 0.05
+            return await api.esearch("(hedge) AND (teste unico)", retmax=5)
+
+    HEDGED_REQUESTS.reset()
+    started = time.perf_counter()
+    result = asyncio.run(run())
+    assert result.count == 7 and len(calls) == 2
+    assert time.perf_counter() - started < 0.5
+    outcomes = {series["labels"]["outcome"]: series["value"] for series in HEDGED_REQUESTS.snapshot()}
+    assert outcomes == {"fired": 1, "won": 1}
+
+    # try_acquire não entra na fila: sem token livre agora, a cópia hedge não é disparada
+    bucket = TokenBucket(1000, capacity=1)
+    bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+if __name__ == "__main__":
+    test_transient_errors_are_retried_and_trip_the_breaker()
+    test_4xx_is_not_retried()
+    test_deadline_stops_retries_and_the_pipeline()
+    test_slow_esearch_is_hedged_within_the_rate_budget()
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ.setdefault("PUBMED_EMAIL", "teste@example.com")
+os.environ["LLM_CACHE"] = "off"
+
+from fastapi.testclient import TestClient
+
+import api
+from agents.pubmed_searcher import AsyncPubmedSearcher, SearchResult
+from agents.search_pipeline import run_search_pipeline
+from utils.pubmed_api import ESearchResult
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+COUNTS = {"(glioma) AND (ttf)": 5000, "(glioma) AND (ttf) AND (trial)": 120}
+
+
+class FakeEutils:
+    def __init__(self):
+        self.calls = []
+
+    async def esearch(self, query, retmax=20, usehistory=True):
+        self.calls.append("esearch")
+        pmids = [str(pmid) for pmid in range(1, min(retmax, 5) + 1)]
+        return ESearchResult(query, COUNTS[query], pmids, "MCID", "1")
+
+    async def aiter_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        self.calls.append("efetch")
+        for pmid in (pmids or history.pmids[:retmax]):
+            await asyncio.sleep(0)
+            yield {"pmid": pmid, "abstract": f"Resumo do artigo {pmid}"}
+
+    async def fetch_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        return [article async for article in self.aiter_abstracts(pmids, history, retstart, retmax)]
+
+
+class FakeSearcher(AsyncPubmedSearcher):
+    def __init__(self):
+        self.api = FakeEutils()
+        self.retmax = 500
+
+
+class FakeRefiner:
+    sample_size = 2
+
+    async def refine_search(self, current_query, abstracts, original_query, total_results, target_results):
+        return "(glioma) AND (ttf) AND (trial)"
+
+
+async def fake_validate(user_query):
+    return "(glioma) AND (ttf)"
+
+
+def fake_events(request):
+    return run_search_pipeline(request.picott_text, request.target_results, request.max_iterations,
+                               request.max_returned_results, searcher=FakeSearcher(), refiner=FakeRefiner(),
+                               validate=fake_validate, probe=request.probe)
+
+
+def test_pipeline_emits_each_stage():
+    async def run():
+        return [event async for event in fake_events(api.SearchRequest(picott_text="TTS glioma"))]
+
+    events = asyncio.run(run())
+    assert [event["event"] for event in events] == ["accepted", "validated", "iteration", "iteration"] + \
+        ["result"] * 5 + ["done"]
+    assert events[2]["total_results"] == 5000 and events[3]["total_results"] == 120
+    assert events[-1]["query"] == "(glioma) AND (ttf) AND (trial)"
+    assert events[-1]["total_results"] == 120 and events[-1]["returned"] == 5
+    assert events[-1]["provenance"]["iteration"] == 1 and events[-1]["provenance"]["probe"]
+
+
+def test_final_step_reuses_the_loop_result():
+    searcher = FakeSearcher()
+
+    async def run():
+        return [event async for event in run_search_pipeline(
+            "TTS glioma", searcher=searcher, refiner=FakeRefiner(), validate=fake_validate, probe=False)]
+
+    asyncio.run(run())
+    # esearch+efetch da busca inicial e da refinada; a resposta final não faz nenhuma chamada nova
+    assert searcher.api.calls == ["esearch", "efetch", "esearch", "efetch"]
+
+    # Só os PMIDs ainda não lidos vão ao efetch, e a ordem do esearch é mantida
+    partial = SearchResult("q", 3, ["1", "2", "3"])
+    partial.add_articles([{"pmid": "2", "abstract": "b"}], ["2"])
+
+    async def complete():
+        return [article["pmid"] async for article in searcher.aiter_articles(partial)]
+
+    searcher.api.calls = []
+    assert asyncio.run(complete()) == ["1", "2", "3"]
+    assert searcher.api.calls == ["efetch"] and partial.missing() == []
+
+
+def test_probe_mode_downloads_abstracts_only_for_the_final_query():
+    searcher = FakeSearcher()
+
+    async def run():
+        return [event async for event in run_search_pipeline(
+            "TTS glioma", searcher=searcher, refiner=FakeRefiner(), validate=fake_validate)]
+
+    events = asyncio.run(run())
+    # Busca inicial: contagem + amostra lida para o refinador; refinada: só contagem;
+    # final: lista completa de PMIDs e um único efetch
+    assert searcher.api.calls == ["esearch", "efetch", "esearch", "esearch", "efetch"]
+    assert [event["pmid"] for event in events if event["event"] == "result"] == ["1", "2", "3", "4", "5"]
+
+
+def test_sse_and_json_endpoints_share_the_pipeline():
+    original = api.search_events
+    api.search_events = fake_events
+    try:
+        client = TestClient(api.app)
+        payload = {"picott_text": "TTS glioma", "target_results": 100}
+        body = client.post("/api/search", json=payload).json()
+        assert body["total_results"] == 120
+        assert [result["pmid"] for result in body["results"]] == ["1", "2", "3", "4", "5"]
+
+        with client.stream("POST", "/api/search/stream", json=payload) as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            frames = [line for line in response.iter_lines() if line.startswith("data: ")]
+        events = [json.loads(frame[len("data: "):]) for frame in frames]
+        assert events[0]["event"] == "accepted"
+        assert events[-1]["event"] == "done" and events[-1]["returned"] == 5
+
+        assert client.post("/api/search/stream", json={"picott_text": " "}).status_code == 400
+    finally:
+        api.search_events = original
+
+
+def test_websocket_streams_events_and_reports_errors():
+    async def failing_validate(user_query):
+        raise api.QueryValidationError("sem termos clínicos")
+
+    original = api.search_events
+    client = TestClient(api.app)
+    try:
+        api.search_events = fake_events
+        with client.websocket_connect("/ws/search") as ws:
+            ws.send_json({"picott_text": "TTS glioma"})
+            kinds = []
+            while not kinds or kinds[-1] != "done":
+                kinds.append(ws.receive_json()["event"])
+        assert kinds.count("result") == 5
+
+        api.search_events = lambda request: run_search_pipeline(
+            request.picott_text, searcher=FakeSearcher(), refiner=FakeRefiner(), validate=failing_validate)
+        with client.websocket_connect("/ws/search") as ws:
+            ws.send_json({"picott_text": "TTS glioma"})
+            assert ws.receive_json()["event"] == "accepted"
+            error = ws.receive_json()
+        assert error["event"] == "error" and error["status"] == 400
+    finally:
+        api.search_events = original
+    logger.info("Streaming SSE/WebSocket verificado")
+
+
+if __name__ == "__main__":
+    test_pipeline_emits_each_stage()
+    test_final_step_reuses_the_loop_result()
+    test_probe_mode_downloads_abstracts_only_for_the_final_query()
+    test_sse_and_json_endpoints_share_the_pipeline()
+    test_websocket_streams_events_and_reports_errors()
+    logger.info("Todos os testes passaram!")
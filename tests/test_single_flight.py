@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# O esearch precisa chegar ao transporte para contarmos as requisições
+os.environ["PUBMED_ARTICLE_STORE"] = "off"
+os.environ["PUBMED_ESEARCH_CACHE"] = "off"
+
+from utils.async_pubmed_api import AsyncPubmedAPI
+from utils.llm_cache import acached_completion
+from utils.single_flight import AsyncSingleFlight, SingleFlight
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+ESEARCH_XML = "<eSearchResult><Count>42</Count><IdList><Id>1</Id></IdList></eSearchResult>"
+
+
+def test_threads_share_one_call_and_its_error():
+    flight = SingleFlight("teste")
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(flight.do, "k", slow)
+        started.wait()
+        others = [executor.submit(flight.do, "k", slow) for _ in range(3)]
+        assert first.result() == "ok" and [other.result() for other in others] == ["ok"] * 3
+    assert len(calls) == 1 and flight.stats() == {"leaders": 1, "joined": 3, "in_flight": 0}
+
+    def failing():
+        raise RuntimeError("falha")
+
+    try:
+        flight.do("k", failing)
+        raise AssertionError("a exceção deveria ser propagada")
+    except RuntimeError:
+        pass
+    # Terminada a chamada, nada fica guardado: a próxima vai ao upstream de novo
+    assert flight.do("k", lambda: "novo") == "novo"
+
+
+def test_concurrent_equivalent_esearches_hit_eutils_once():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request.url.params["term"])
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, text=ESEARCH_XML)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            api = AsyncPubmedAPI(email="teste@example.com", client=client)
+            return await asyncio.gather(api.esearch("(glioma OR GBM)", retmax=5),
+                                        api.esearch("(gbm OR  glioma)", retmax=5),
+                                        api.esearch("(glioma OR GBM)", retmax=5))
+
+    results = asyncio.run(run())
+    assert len(requests_seen) == 1
+    assert [result.count for result in results] == [42, 42, 42]
+    # Cada chamador recebe o resultado com a própria grafia da query
+    assert results[1].query == "(gbm OR  glioma)" and results[0].query == "(glioma OR GBM)"
+
+
+def test_llm_calls_coalesce_and_survive_a_cancelled_caller():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "(glioma) AND (ttf)"
+
+    async def run():
+        params = {"model": "m", "messages": [{"role": "user", "content": "TTS glioma"}]}
+        first = asyncio.create_task(acached_completion(None, "anthropic", params, call))
+        second = asyncio.create_task(acached_completion(None, "anthropic", params, call))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(run()) == ("(glioma) AND (ttf)", True)
+    assert len(calls) == 1
+
+    flight = AsyncSingleFlight("teste")
+
+    async def sequential():
+        return [await flight.do("k", call), await flight.do("k", call)]
+
+    asyncio.run(sequential())
+    assert flight.stats()["leaders"] == 2 and flight.stats()["joined"] == 0
+    logger.info("Single-flight verificado")
+
+
+if __name__ == "__main__":
+    test_threads_share_one_call_and_its_error()
+    test_concurrent_equivalent_esearches_hit_eutils_once()
+    test_llm_calls_coalesce_and_survive_a_cancelled_caller()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,119 @@
+import os
+import sys
+import asyncio
+import logging
+from types import SimpleNamespace
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("ANTHROPIC_API_KEY", "chave-de-teste")
+os.environ["LLM_CACHE"] = "off"
+
+from agents.pubmed_searcher import AsyncPubmedSearcher
+from agents.search_refiner import AsyncSearchRefiner
+from agents.search_pipeline import run_search_pipeline
+from utils.pubmed_api import ESearchResult
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+BROAD = '(glioma OR GBM OR "brain tumor") AND (TTF OR Optune)'
+BALANCED = '(glioma OR GBM) AND (TTF OR Optune)'
+NARROW = '(glioma) AND (TTF) AND (survival)'
+COUNTS = {"(glioma) AND (ttf)": 5000, BROAD: 900, BALANCED: 130, NARROW: 20}
+
+
+class FakeMessages:
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(content=[SimpleNamespace(type="text", text=self.text)])
+
+
+class CountingEutils:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fetched = []
+
+    async def esearch(self, query, retmax=20, usehistory=True):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        pmids = [str(pmid) for pmid in range(1, min(retmax, 3) + 1)]
+        return ESearchResult(query, COUNTS[query], pmids, "MCID", "1")
+
+    async def aiter_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        self.fetched.append(history.query if history is not None else pmids)
+        for pmid in (pmids or history.pmids[:retmax]):
+            yield {"pmid": pmid, "abstract": f"Resumo {pmid}"}
+
+    async def fetch_abstracts(self, pmids=None, history=None, retstart=0, retmax=None):
+        return [article async for article in self.aiter_abstracts(pmids, history, retstart, retmax)]
+
+
+class FakeSearcher(AsyncPubmedSearcher):
+    def __init__(self):
+        self.api = CountingEutils()
+        self.retmax = 500
+
+
+async def fake_validate(user_query):
+    return "(glioma) AND (ttf)"
+
+
+def test_candidates_are_parsed_one_per_line():
+    refiner = AsyncSearchRefiner(use_cache=False)
+    text = f'{BROAD}\n\n2. invalid\n{BALANCED}\n{BALANCED}\n(a) AND ("four words in quote")\n{NARROW}'
+    assert refiner._parse_candidates(text, 3) == [BROAD, BALANCED, NARROW]
+    # Sem nenhuma linha válida, cai no parse de query única (com fallback)
+    assert len(refiner._parse_candidates("sem query", 3)) == 1
+
+
+def test_speculative_strategy_counts_candidates_in_parallel():
+    refiner = AsyncSearchRefiner(use_cache=False)
+    refiner.client = SimpleNamespace(messages=FakeMessages(f"{BROAD}\n{BALANCED}\n{NARROW}"))
+    searcher = FakeSearcher()
+
+    async def run():
+        return [event async for event in run_search_pipeline(
+            "TTS glioma", target_results=100, searcher=searcher, refiner=refiner,
+            validate=fake_validate, strategy="speculative")]
+
+    events = asyncio.run(run())
+    iterations = [event for event in events if event["event"] == "iteration"]
+    # Uma única chamada ao LLM: a candidata equilibrada (130) já cai na janela do alvo
+    assert refiner.client.messages.calls == 1
+    assert len(iterations) == 2
+    assert iterations[1]["query"] == BALANCED
+    assert [candidate["total_results"] for candidate in iterations[1]["candidates"]] == [900, 130, 20]
+    assert searcher.api.max_in_flight == 3
+    assert events[-1]["query"] == BALANCED and events[-1]["total_results"] == 130
+    logger.info("Refinamento especulativo verificado")
+
+
+def test_only_the_chosen_candidate_is_fetched_without_probe():
+    refiner = AsyncSearchRefiner(use_cache=False)
+    refiner.client = SimpleNamespace(messages=FakeMessages(f"{BROAD}\n{BALANCED}\n{NARROW}"))
+    searcher = FakeSearcher()
+
+    async def run():
+        return [event async for event in run_search_pipeline(
+            "TTS glioma", target_results=100, searcher=searcher, refiner=refiner,
+            validate=fake_validate, strategy="speculative", probe=False)]
+
+    events = asyncio.run(run())
+    assert events[-1]["query"] == BALANCED
+    # Busca inicial (completa) e a candidata escolhida; as outras duas só foram contadas
+    assert searcher.api.fetched == ["(glioma) AND (ttf)", BALANCED]
+
+
+if __name__ == "__main__":
+    test_candidates_are_parsed_one_per_line()
+    test_speculative_strategy_counts_candidates_in_parallel()
+    test_only_the_chosen_candidate_is_fetched_without_probe()
+    logger.info("Todos os testes passaram!")
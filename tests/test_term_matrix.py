@@ -0,0 +1,101 @@
+import os
+import sys
+import random
+import asyncio
+import logging
+
+# Adicionar o diretório raiz do projeto ao sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.query_tuner import QueryTuner
+from utils.pubmed_api import ESearchResult
+from utils.query_syntax import parse_blocks
+from utils.term_matrix import TermMatrix
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+logger = logging.getLogger(__name__)
+
+rng = random.Random(7)
+POSTINGS = {
+    "glioma": set(rng.sample(range(50_000), 6000)),
+    "GBM": set(rng.sample(range(50_000), 4000)),
+    '"brain tumor"': set(rng.sample(range(50_000), 9000)),
+    "TTF": set(rng.sample(range(50_000), 5000)),
+    "Optune": set(rng.sample(range(50_000), 800)),
+}
+
+
+class CorpusAPI:
+    """esearch/count_results sobre o corpus; como no PubMed, a página traz os PMIDs mais recentes primeiro."""
+
+    def __init__(self):
+        self.counted = []
+        self.searched = []
+
+    async def esearch(self, query, retmax, usehistory=True):
+        self.searched.append(query)
+        pmids = sorted(POSTINGS[query], reverse=True)
+        return ESearchResult(query, len(pmids), [str(pmid) for pmid in pmids[:retmax]])
+
+    async def count_results(self, query):
+        self.counted.append(query)
+        return exact(query)
+
+
+def exact(query):
+    pmids = None
+    for terms in parse_blocks(query):
+        union = set().union(*(POSTINGS[term] for term in terms))
+        pmids = union if pmids is None else pmids & union
+    return len(pmids)
+
+
+def test_uncapped_matrix_counts_are_exact():
+    matrix = asyncio.run(TermMatrix.build(CorpusAPI(), POSTINGS, cap=10_000))
+    assert matrix.exact
+    for query in ['(glioma OR GBM) AND (TTF)', '(glioma OR GBM OR "brain tumor") AND (TTF OR Optune)',
+                  '(GBM) AND (Optune)', '(glioma) AND (GBM) AND (TTF OR Optune)']:
+        assert matrix.count_query(query) == exact(query), query
+    assert matrix.count_query('(glioma) AND (desconhecido)') is None
+
+
+def test_capped_matrix_estimates_counts():
+    matrix = asyncio.run(TermMatrix.build(CorpusAPI(), POSTINGS, cap=3000))
+    assert not matrix.exact
+    for query in ['(glioma OR GBM) AND (TTF)', '(glioma OR GBM OR "brain tumor") AND (TTF OR Optune)']:
+        estimate, real = matrix.count_query(query), exact(query)
+        assert abs(estimate - real) <= 0.25 * real, (query, estimate, real)
+
+
+def test_tuner_counts_variants_locally():
+    query = '(glioma OR GBM OR "brain tumor") AND (TTF OR Optune)'
+    api = CorpusAPI()
+    tuned = asyncio.run(QueryTuner(api, matrix_cap=10_000).tune(query, exact(query), target_results=600))
+    assert tuned is not None and 300 <= tuned.count <= 900
+    # Uma esearch por termo para a matriz; no eutils, só a conferência da query escolhida
+    assert sorted(api.searched) == sorted(POSTINGS)
+    assert api.counted == [tuned.query]
+    logger.info("Matriz de termos verificada")
+
+
+def test_matrix_miss_does_not_fall_back_to_live_counts():
+    query = '(glioma OR GBM) AND (TTF)'
+    api = CorpusAPI()
+    tuner = QueryTuner(api, matrix_cap=10_000)
+    assert asyncio.run(tuner.tune(query, exact(query), target_results=5)) is None
+    assert api.counted == []
+    assert sorted(api.searched) == sorted(["glioma", "GBM", "TTF"])
+
+    # Mesma busca, vocabulário maior: a matriz é reaproveitada e só os termos novos vão ao esearch
+    api.searched.clear()
+    broader = '(glioma OR GBM OR "brain tumor") AND (TTF OR Optune)'
+    asyncio.run(tuner.tune(broader, exact(broader), target_results=600))
+    assert sorted(api.searched) == sorted(['"brain tumor"', "Optune"])
+
+
+if __name__ == "__main__":
+    test_uncapped_matrix_counts_are_exact()
+    test_capped_matrix_estimates_counts()
+    test_tuner_counts_variants_locally()
+    test_matrix_miss_does_not_fall_back_to_live_counts()
+    logger.info("Todos os testes passaram!")
@@ -0,0 +1,126 @@
+import re
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+_YEAR = re.compile(r"\d{4}")
+
+
+class Article:
+    """
+    Artigo do efetch em memória compacta (__slots__, sem __dict__ por instância).
+
+    sections guarda todas as seções do abstract como (label, texto); label é None nos abstracts
+    sem estrutura. Strings que se repetem entre artigos (journal, labels, MeSH, tipos de
+    publicação) são internadas. Aceita acesso de dict (article["pmid"], article.get("abstract"))
+    para o código que trata artigos como dicts.
+    """
+
+    __slots__ = ("pmid", "title", "journal", "year", "sections", "mesh", "publication_types")
+
+    _keys = ("pmid", "title", "journal", "year", "abstract", "sections", "mesh", "publication_types")
+
+    def __init__(self, pmid: str, title: str = "", journal: str = "", year: Optional[int] = None,
+                 sections: Tuple[Tuple[Optional[str], str], ...] = (), mesh: Tuple[str, ...] = (),
+                 publication_types: Tuple[str, ...] = ()):
+        self.pmid = pmid
+        self.title = title
+        self.journal = journal
+        self.year = year
+        self.sections = sections
+        self.mesh = mesh
+        self.publication_types = publication_types
+
+    @property
+    def abstract(self) -> str:
+        """Texto completo do abstract, com o label de cada seção quando houver."""
+        return "\n".join(f"{label}: {text}" if label else text for label, text in self.sections)
+
+    def __getitem__(self, key: str):
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self._keys else default
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
+
+    def keys(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Article):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f"Article(pmid={self.pmid!r}, title={self.title[:40]!r}, sections={len(self.sections)})"
+
+    def to_dict(self) -> Dict:
+        """Forma serializável em JSON (usada pelo article store)."""
+        return {
+            "pmid": self.pmid,
+            "title": self.title,
+            "journal": self.journal,
+            "year": self.year,
+            "sections": [list(section) for section in self.sections],
+            "mesh": list(self.mesh),
+            "publication_types": list(self.publication_types),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Article":
+        if "sections" in data:
+            sections = tuple((_intern(label), text) for label, text in data["sections"])
+        else:
+            # Formato antigo / fakes: só pmid e abstract
+            sections = ((None, data["abstract"]),) if data.get("abstract") else ()
+        return cls(
+            data["pmid"],
+            data.get("title") or "",
+            _intern(data.get("journal") or ""),
+            data.get("year"),
+            sections,
+            tuple(map(_intern, data.get("mesh") or ())),
+            tuple(map(_intern, data.get("publication_types") or ())),
+        )
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def _text(elem) -> str:
+    # itertext inclui o texto de marcação inline (<i>, <sup>...) que .text cortaria
+    return "".join(elem.itertext()).strip() if elem is not None else ""
+
+
+def _year(citation) -> Optional[int]:
+    date = citation.find("Article/Journal/JournalIssue/PubDate")
+    if date is None:
+        return None
+    year = date.findtext("Year") or date.findtext("MedlineDate") or ""
+    match = _YEAR.search(year)
+    return int(match.group()) if match else None
+
+
+def parse_article(article) -> Article:
+    """Monta o Article a partir de um elemento PubmedArticle, numa passada só."""
+    citation = article.find("MedlineCitation")
+    if citation is None:
+        citation = article
+    pmid = citation.findtext("PMID") or article.findtext(".//PMID")
+    sections = tuple(
+        (_intern(elem.get("Label") or elem.get("NlmCategory")), _text(elem))
+        for elem in citation.iterfind("Article/Abstract/AbstractText")
+    )
+    return Article(
+        pmid,
+        _text(citation.find("Article/ArticleTitle")),
+        _intern(citation.findtext("Article/Journal/Title") or citation.findtext("Article/Journal/ISOAbbreviation") or ""),
+        _year(citation),
+        tuple(section for section in sections if section[1]),
+        tuple(_intern(_text(elem)) for elem in citation.iterfind("MeshHeadingList/MeshHeading/DescriptorName")),
+        tuple(_intern(_text(elem)) for elem in citation.iterfind("Article/PublicationTypeList/PublicationType")),
+    )
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from utils.article import Article
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o formato do artigo salvo mudar: entradas antigas passam a ser ignoradas
+STORE_SCHEMA = 2  # 2: Article completo (seções, título, journal, ano, MeSH, tipos de publicação)
+
+_SQLITE_MAX_PARAMS = 500
+
+# Relativo à raiz do projeto, não ao diretório de onde o processo foi iniciado
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                            "pubmed_articles.sqlite3")
+
+
+class ArticleStore:
+    """
+    Armazena artigos já baixados do efetch em SQLite (modo WAL), indexados por PMID.
+
+    Entradas mais velhas que ttl_seconds contam como miss; acima de max_entries os artigos
+    acessados há mais tempo são removidos. Uma única conexão protegida por lock atende
+    todas as threads do processo; vários processos podem abrir o mesmo arquivo.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 200_000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            "pmid TEXT PRIMARY KEY, schema INTEGER NOT NULL, data TEXT NOT NULL, "
+            "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_accessed ON articles(accessed_at)")
+        # Contagem aproximada (INSERT OR REPLACE conta substituições): o COUNT(*) só roda quando ela passa do limite
+        self._size = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def get_many(self, pmids: List[str]) -> Dict[str, Article]:
+        """Retorna {pmid: artigo} para os PMIDs presentes e válidos; os demais contam como miss."""
+        now = time.time()
+        found: Dict[str, Dict] = {}
+        stale: List[str] = []
+        with self._lock:
+            for start in range(0, len(pmids), _SQLITE_MAX_PARAMS):
+                batch = pmids[start:start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT pmid, schema, data, fetched_at FROM articles WHERE pmid IN ({placeholders})", batch
+                ).fetchall()
+                for pmid, schema, data, fetched_at in rows:
+                    if schema != STORE_SCHEMA or now - fetched_at > self.ttl_seconds:
+                        stale.append(pmid)
+                    else:
+                        found[pmid] = Article.from_dict(json.loads(data))
+            if found:
+                self._execute_in("UPDATE articles SET accessed_at = ? WHERE pmid IN ({})", list(found), now)
+            if stale:
+                self._execute_in("DELETE FROM articles WHERE pmid IN ({})", stale)
+                self._size -= len(stale)
+            self.hits += len(found)
+            self.misses += len(set(pmids)) - len(found)
+            self.expired += len(stale)
+        return found
+
+    def put_many(self, articles: Iterable) -> None:
+        """Grava Articles (ou dicts com pmid e abstract, convertidos para Article)."""
+        now = time.time()
+        rows = [(article["pmid"], STORE_SCHEMA, json.dumps(_as_article(article).to_dict()), now, now)
+                for article in articles if article.get("pmid")]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._size += len(rows)
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _execute_in(self, sql: str, pmids: List[str], *leading) -> None:
+        for start in range(0, len(pmids), _SQLITE_MAX_PARAMS):
+            batch = pmids[start:start + _SQLITE_MAX_PARAMS]
+            self._conn.execute(sql.format(",".join("?" * len(batch))), (*leading, *batch))
+
+    def _evict(self) -> None:
+        self._size = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+        excess = self._size - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM articles WHERE pmid IN (SELECT pmid FROM articles ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+            self.evictions += excess
+            self._size -= excess
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            return {
+                "path": self.path,
+                "size": size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _as_article(article) -> Article:
+    return article if isinstance(article, Article) else Article.from_dict(article)
+
+
+_stores: Dict[str, ArticleStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_article_store() -> Optional[ArticleStore]:
+    """
+    Retorna o store do processo configurado pelo ambiente, ou None se desativado.
+
+    Variáveis de ambiente:
+        PUBMED_ARTICLE_STORE: caminho do arquivo SQLite (padrão .cache/pubmed_articles.sqlite3 na
+            raiz do projeto; "off" desativa).
+        PUBMED_ARTICLE_STORE_TTL: validade de cada artigo em segundos (padrão 7 dias).
+        PUBMED_ARTICLE_STORE_MAX: número máximo de artigos mantidos (padrão 200000).
+    """
+    path = os.getenv("PUBMED_ARTICLE_STORE", DEFAULT_PATH)
+    if not path or path.lower() == "off":
+        return None
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            try:
+                store = ArticleStore(
+                    path,
+                    ttl_seconds=float(os.getenv("PUBMED_ARTICLE_STORE_TTL", 7 * 24 * 3600)),
+                    max_entries=int(os.getenv("PUBMED_ARTICLE_STORE_MAX", 200_000)),
+                )
+            except sqlite3.Error as e:
+                logger.error("Não foi possível abrir o article store em %s: %s", path, e)
+                return None
+            _stores[path] = store
+        return store
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from typing import AsyncIterator, List, Dict, Optional
+
+import httpx
+
+from utils.article import Article
+from utils.pubmed_api import (ArticleStreamParser, BasePubmedAPI, ESearchResult, REQUEST_LATENCY, in_request_order,
+                              parse_esearch)
+from utils.query_syntax import canonicalize_query
+from utils.article_store import ArticleStore
+from utils.cache import TieredCache
+from utils.cassette import current_cassette
+from utils.rate_limiter import TokenBucket
+from utils.resilience import TRANSIENT_STATUS, CircuitBreaker, DeadlineExceeded, bounded_timeout, wait_allowed
+from utils.metrics import counter
+from utils.single_flight import get_single_flight
+from utils.tracing import record_cache, span
+
+HEDGED_REQUESTS = counter("pubmed_hedged_requests_total", "Esearches com cópia hedge: disparadas, vencedoras e puladas")
+
+# Um AsyncClient fica preso ao event loop em que abriu as conexões, então mantemos um por loop
+_shared_clients = weakref.WeakKeyDictionary()
+_shared_clients_lock = threading.Lock()
+
+
+def build_async_client(pool_size: int = None, connect_timeout: float = None, read_timeout: float = None) -> httpx.AsyncClient:
+    """
+    Cria um httpx.AsyncClient com pool de conexões keep-alive para o eutils.
+
+    Args:
+        pool_size (int): Número máximo de conexões abertas (padrão: PUBMED_POOL_SIZE ou 10).
+        connect_timeout (float): Timeout de conexão em segundos (padrão: PUBMED_CONNECT_TIMEOUT ou 3.05).
+        read_timeout (float): Timeout de leitura em segundos (padrão: PUBMED_READ_TIMEOUT ou 10).
+    """
+    if pool_size is None:
+        pool_size = int(os.getenv("PUBMED_POOL_SIZE", 10))
+    if connect_timeout is None:
+        connect_timeout = float(os.getenv("PUBMED_CONNECT_TIMEOUT", 3.05))
+    if read_timeout is None:
+        read_timeout = float(os.getenv("PUBMED_READ_TIMEOUT", 10))
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+    )
+
+
+def get_shared_async_client() -> httpx.AsyncClient:
+    """Retorna o cliente compartilhado do event loop atual, criando-o na primeira chamada."""
+    loop = asyncio.get_running_loop()
+    with _shared_clients_lock:
+        client = _shared_clients.get(loop)
+        if client is None or client.is_closed:
+            client = build_async_client()
+            _shared_clients[loop] = client
+        return client
+
+
+async def close_shared_async_client() -> None:
+    """Fecha o cliente compartilhado do event loop atual (usado no shutdown da API)."""
+    loop = asyncio.get_running_loop()
+    with _shared_clients_lock:
+        client = _shared_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+class AsyncPubmedAPI(BasePubmedAPI):
+    """Versão asyncio do PubmedAPI: mesmas consultas, sem bloquear o event loop."""
+
+    def __init__(self, email: str, api_key: str = None, client: Optional[httpx.AsyncClient] = None,
+                 connect_timeout: float = None, read_timeout: float = None, rate_limiter: Optional[TokenBucket] = None,
+                 article_store: Optional[ArticleStore] = None, esearch_cache: Optional[TieredCache] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        super().__init__(email, api_key, connect_timeout, read_timeout, rate_limiter, article_store, esearch_cache,
+                         circuit_breaker)
+        self._client = client
+        self.timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else get_shared_async_client()
+
+    async def _send(self, url: str, params: Dict = None, stream: bool = False, method: str = "GET",
+                    retries: int = 3, backoff: float = 1.0, reserved: bool = False) -> httpx.Response:
+        """
+        Mesma política do PubmedAPI._send (jitter, circuit breaker, prazo da busca).
+        reserved: o token do rate limiter da primeira tentativa já foi reservado (requisição hedge).
+        """
+        endpoint = self._endpoint(url)
+        cassette = current_cassette()
+        if cassette is not None and cassette.replaying:
+            return cassette.replay_eutils(endpoint, method, params)
+        began = time.perf_counter()
+        error = None
+        for attempt in range(retries):
+            self._before_attempt(endpoint)
+            if not (reserved and attempt == 0):
+                await self.rate_limiter.acquire_async()
+            timeout = httpx.Timeout(bounded_timeout(self.read_timeout, endpoint),
+                                    connect=bounded_timeout(self.connect_timeout, endpoint))
+            start = time.perf_counter()
+            response = None
+            try:
+                # POST leva os parâmetros no corpo: listas longas de IDs não estouram o limite de URL
+                query, body = (None, params) if method == "POST" else (params, None)
+                request = self.client.build_request(method, url, params=query, data=body, timeout=timeout)
+                response = await self.client.send(request, stream=stream)
+                self._record_outcome(response.status_code >= 500)
+                response.raise_for_status()
+                if cassette is not None:
+                    # Gravando: o corpo é lido inteiro (aiter_bytes continua funcionando a partir dele)
+                    await response.aread()
+                    cassette.record_eutils(endpoint, method, params, response.status_code, response.text,
+                                           time.perf_counter() - began)
+                return response
+            except httpx.HTTPStatusError as e:
+                await response.aclose()
+                if response.status_code not in TRANSIENT_STATUS:
+                    raise e
+                error, reason, headers = e, response.status_code, response.headers
+            except httpx.TransportError as e:
+                # Conexão recusada/resetada, timeout, resposta truncada
+                if isinstance(e, httpx.TimeoutException) and not wait_allowed(0):
+                    raise DeadlineExceeded(f"Prazo da busca esgotado durante o {endpoint}") from e
+                self._record_outcome(True)
+                error, reason, headers = e, type(e).__name__, None
+            finally:
+                status = response.status_code if response is not None else "error"
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+            if attempt + 1 < retries:
+                await asyncio.sleep(self._retry_wait(endpoint, attempt, backoff, reason, headers, error))
+        raise Exception(f"Max retries exceeded ({endpoint}): {error}") from error
+
+    async def _make_request(self, url: str, params: Dict = None, retries: int = 3, backoff: float = 1.0,
+                            reserved: bool = False) -> str:
+        response = await self._send(url, params, retries=retries, backoff=backoff, reserved=reserved)
+        return response.text
+
+    def _can_hedge(self) -> bool:
+        """Hedge só com o circuito fechado e um token livre agora no rate limiter (sem fila)."""
+        if self.circuit_breaker is not None and self.circuit_breaker.state != "closed":
+            return False
+        return self.rate_limiter.try_acquire()
+
+    async def _hedged_request(self, url: str, params: Dict) -> str:
+        """
+        Requisição com hedge: se a resposta não chega em hedge_after segundos, dispara uma cópia
+        (dentro do orçamento do rate limiter) e fica com a primeira que responder; a outra é cancelada.
+        """
+        primary = asyncio.ensure_future(self._make_request(url, params))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+            if not self._can_hedge():
+                HEDGED_REQUESTS.inc(outcome="skipped")
+                return await primary
+            HEDGED_REQUESTS.inc(outcome="fired")
+            hedge = asyncio.ensure_future(self._make_request(url, params, retries=1, reserved=True))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGED_REQUESTS.inc(outcome="won")
+                        return task.result()
+            # As duas falharam: vale o erro da original, que já passou pelas novas tentativas
+            return primary.result()
+        finally:
+            tasks = [task for task in (primary, hedge) if task is not None and not task.done()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def count_results(self, query: str) -> int:
+        result = await self.esearch(query, retmax=0, usehistory=False)  # Só contar, sem retornar PMIDs
+        return result.count
+
+    async def fetch_pmids(self, query: str, retmax: int) -> List[str]:
+        result = await self.esearch(query, retmax, usehistory=False)
+        return result.pmids
+
+    async def esearch(self, query: str, retmax: int, usehistory: bool = True) -> ESearchResult:
+        with span("esearch", retmax=retmax, cache_hit=False) as current:
+            # Com PUBMED_ESEARCH_CACHE_PATH, leitura e gravação no SQLite rodam fora do event loop
+            if self.esearch_cache is not None and current_cassette() is None:
+                cached = self._esearch_from_entry(query, retmax, await self.esearch_cache.aget(canonicalize_query(query)))
+                if cached is not None:
+                    current.set(cache_hit=True)
+                    return cached
+
+            async def call():
+                params = self._esearch_params(query, retmax, usehistory)
+                if self.hedge_after and current_cassette() is None:
+                    xml_data = await self._hedged_request(self.base_esearch, params)
+                else:
+                    xml_data = await self._make_request(self.base_esearch, params)
+                current.set(bytes=len(xml_data))
+                with span("parse", kind="esearch"):
+                    result = parse_esearch(xml_data, query)
+                item = self._esearch_entry(result)
+                if item is not None:
+                    await self.esearch_cache.aset(*item)
+                return result
+
+            # Buscas concorrentes com a mesma query (normalizada) esperam uma única requisição
+            result = await get_single_flight("esearch", asynchronous=True).do(self._esearch_key(query, retmax, usehistory), call)
+            return self._for_query(result, query)
+
+    async def _aiter_batch(self, params: Dict) -> AsyncIterator[Article]:
+        start = time.perf_counter()
+        response = await self._send(self.base_efetch, params, stream=True, method="POST")
+        parser = ArticleStreamParser()
+        try:
+            async for chunk in response.aiter_bytes():
+                for article in parser.feed(chunk):
+                    yield article
+            for article in parser.close():
+                yield article
+        finally:
+            await response.aclose()
+            parser.record(time.perf_counter() - start)
+
+    async def _fetch_batch(self, params: Dict, pmids: Optional[List[str]]) -> List[Article]:
+        async def call():
+            return in_request_order([article async for article in self._aiter_batch(params)], pmids)
+
+        # Lotes iguais de buscas concorrentes (ex.: o mesmo tema popular) saem numa requisição só
+        key = (self.base_efetch, self.api_key, tuple(sorted((name, str(value)) for name, value in params.items())))
+        return list(await get_single_flight("efetch_batch", asynchronous=True).do(key, call))
+
+    async def aiter_abstracts(self, pmids: List[str] = None, history: ESearchResult = None,
+                              retstart: int = 0, retmax: int = None) -> AsyncIterator[Article]:
+        """Gera os artigos na ordem do esearch; só os PMIDs ausentes do article store vão ao efetch."""
+        wanted = self._known_pmids(pmids, history, retstart, retmax) if self.article_store is not None else None
+        cached = await asyncio.to_thread(self.article_store.get_many, wanted) if wanted else {}
+        if wanted:
+            record_cache("article_store", hits=len(cached), misses=len(wanted) - len(cached))
+        if not cached:
+            async for article in self._store_through(self._aiter_efetch(pmids, history, retstart, retmax)):
+                yield article
+            return
+        missing = [pmid for pmid in wanted if pmid not in cached]
+        fetched = {}
+        if missing:
+            fetched = {article["pmid"]: article async for article in self._store_through(self._aiter_efetch(missing))}
+        for pmid in wanted:
+            article = cached.get(pmid) or fetched.get(pmid)
+            if article is not None:
+                yield article
+
+    async def _store_through(self, articles: AsyncIterator[Article], flush_every: int = 100) -> AsyncIterator[Article]:
+        if self.article_store is None:
+            async for article in articles:
+                yield article
+            return
+        pending = []
+        async for article in articles:
+            pending.append(article)
+            if len(pending) >= flush_every:
+                await asyncio.to_thread(self.article_store.put_many, pending)
+                pending = []
+            yield article
+        await asyncio.to_thread(self.article_store.put_many, pending)
+
+    async def _aiter_efetch(self, pmids: List[str] = None, history: ESearchResult = None,
+                            retstart: int = 0, retmax: int = None) -> AsyncIterator[Article]:
+        """Efetch em streaming, com lotes concorrentes para listas grandes, na ordem do esearch."""
+        batches = self._efetch_batches(pmids, history, retstart, retmax)
+        if len(batches) == 1 and batches[0][1] is None:
+            async for article in self._aiter_batch(batches[0][0]):
+                yield article
+            return
+        semaphore = asyncio.Semaphore(self.efetch_concurrency)
+
+        async def fetch(params, batch_pmids):
+            async with semaphore:
+                return await self._fetch_batch(params, batch_pmids)
+
+        tasks = [asyncio.ensure_future(fetch(params, batch_pmids)) for params, batch_pmids in batches]
+        try:
+            for task in tasks:
+                for article in await task:
+                    yield article
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def fetch_abstracts(self, pmids: List[str] = None, history: ESearchResult = None,
+                              retstart: int = 0, retmax: int = None) -> List[Article]:
+        async def call():
+            return [article async for article in self.aiter_abstracts(pmids, history, retstart, retmax)]
+
+        articles = await get_single_flight("efetch", asynchronous=True).do(
+            self._efetch_key(pmids, history, retstart, retmax), call)
+        return list(articles)
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Cache em memória com limite de entradas (LRU) e TTL opcional, thread-safe."""
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Lê sem contar hit/miss nem mudar a ordem do LRU."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (item[1] is None or item[1] > time.monotonic()):
+                return item[0]
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class SQLiteCache:
+    """
+    Backend chave/valor em SQLite (WAL) para compartilhar um cache entre processos.
+
+    Os valores são gravados como JSON; entradas vencidas são ignoradas na leitura e
+    apagadas quando o arquivo passa de max_entries.
+    """
+
+    def __init__(self, path: str, table: str = "cache", max_entries: int = 100_000):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)", (key, json.dumps(value), expires_at)
+            )
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if size > self.max_entries:
+                deleted = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+                ).rowcount
+                excess = size - deleted - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY expires_at LIMIT ?)", (excess,)
+                    )
+                self.evictions += deleted + max(excess, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"path": self.path, "size": size, "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class TieredCache:
+    """LRU em memória na frente de um backend opcional (SQLiteCache) compartilhado."""
+
+    def __init__(self, memory: LRUCache, backend: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.backend = backend
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is None and self.backend is not None:
+            try:
+                value = self.backend.get(key)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao ler o cache compartilhado: %s", e)
+                value = None
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, value, ttl if ttl is not None else self.memory.ttl)
+            except sqlite3.Error as e:
+                logger.warning("Falha ao gravar no cache compartilhado: %s", e)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get sem bloquear o event loop: só a leitura no SQLite vai para uma thread."""
+        if self.backend is None or self.memory.peek(key) is not None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self.backend is None:
+            self.set(key, value, ttl)
+        else:
+            await asyncio.to_thread(self.set, key, value, ttl)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "memory": self.memory.stats(),
+            "shared": self.backend.stats() if self.backend is not None else None,
+        }
@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import gzip
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+
+# Parâmetros que identificam quem chamou, não a consulta: ficam fora da cassete e da chave de replay
+_PRIVATE_PARAMS = {"email", "api_key", "tool"}
+
+_current: contextvars.ContextVar[Optional["Cassette"]] = contextvars.ContextVar("cassette", default=None)
+
+
+class CassetteMiss(Exception):
+    """O replay pediu uma interação que não está na cassete (o pipeline divergiu da gravação)."""
+
+
+def current_cassette() -> Optional["Cassette"]:
+    return _current.get()
+
+
+def _eutils_key(endpoint: str, method: str, params: Optional[Dict]) -> str:
+    public = {name: str(value) for name, value in (params or {}).items() if name not in _PRIVATE_PARAMS}
+    return json.dumps([endpoint, method, public], sort_keys=True)
+
+
+class Cassette:
+    """
+    Gravação do tráfego externo de uma busca: respostas do eutils (corpo e status), textos do LLM
+    e o instante de cada evento do pipeline, com a duração de cada chamada.
+
+    Ativa no contexto atual (contextvar), ela é preenchida por PubmedAPI/AsyncPubmedAPI._send e por
+    cached_completion/acached_completion. Em modo replay, as mesmas chamadas são respondidas a
+    partir da cassete, na ordem gravada, sem rede, rate limiter ou caches.
+
+    Enquanto há cassete ativa, o esearch cache, o article store e o single-flight não são usados
+    por essa busca: cada resposta que ela consome sai de uma chamada sua, então a gravação fica completa.
+    """
+
+    def __init__(self, request: Optional[Dict] = None, replaying: bool = False):
+        self.request = request or {}
+        self.replaying = replaying
+        self.interactions: List[Dict] = []
+        self.events: List[Dict] = []
+        self.recorded_events: List[Dict] = []  # Eventos da gravação original, quando carregada para replay
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._queues: Dict = defaultdict(deque)
+
+    def offset(self) -> float:
+        return round(time.perf_counter() - self._start, 6)
+
+    # --- gravação ---
+
+    def record_eutils(self, endpoint: str, method: str, params: Optional[Dict], status: int, body: str,
+                      elapsed: float) -> None:
+        self.interactions.append({
+            "kind": "eutils", "key": _eutils_key(endpoint, method, params), "endpoint": endpoint, "status": status,
+            "body": body, "elapsed": round(elapsed, 6), "offset": self.offset(),
+        })
+
+    def record_llm(self, provider: str, key: str, text: str, elapsed: float, source: str) -> None:
+        self.interactions.append({
+            "kind": "llm", "key": key, "provider": provider, "text": text, "source": source,
+            "elapsed": round(elapsed, 6), "offset": self.offset(),
+        })
+
+    def record_event(self, event: Dict) -> None:
+        self.events.append({"event": event["event"], "offset": self.offset(),
+                            **{name: event[name] for name in ("iteration", "query", "total_results") if name in event}})
+
+    # --- replay ---
+
+    def _next(self, kind: str, key: str) -> Dict:
+        if not self._queues:
+            for interaction in self.interactions:
+                self._queues[(interaction["kind"], interaction["key"])].append(interaction)
+        queue = self._queues.get((kind, key))
+        if not queue:
+            raise CassetteMiss(f"Interação {kind} não gravada: {key[:200]}")
+        return queue.popleft()
+
+    def replay_eutils(self, endpoint: str, method: str, params: Optional[Dict]) -> "ReplayResponse":
+        interaction = self._next("eutils", _eutils_key(endpoint, method, params))
+        return ReplayResponse(interaction["status"], interaction["body"])
+
+    def replay_llm(self, key: str) -> str:
+        return self._next("llm", key)["text"]
+
+    # --- arquivo ---
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": CASSETTE_VERSION,
+            "recorded_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "request": self.request,
+            "events": self.events,
+            "interactions": self.interactions,
+        }
+
+    def save(self, directory: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        name = f"{datetime.fromtimestamp(self.started_at):%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.json.gz"
+        path = os.path.join(directory, name)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        return path
+
+    @classmethod
+    def load(cls, path: str, replaying: bool = True) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Versão de cassete não suportada: {data.get('version')}")
+        cassette = cls(data["request"], replaying=replaying)
+        cassette.interactions = data["interactions"]
+        cassette.recorded_events = data["events"]
+        return cassette
+
+    def timings(self) -> Dict:
+        """Tempo total e quanto dele foi gasto esperando eutils e LLM (somas das chamadas)."""
+        spent = defaultdict(float)
+        calls = defaultdict(int)
+        for interaction in self.interactions:
+            name = interaction["kind"] if interaction["kind"] == "llm" else interaction["endpoint"]
+            spent[name] += interaction["elapsed"]
+            calls[name] += 1
+        events = self.events or self.recorded_events
+        total = events[-1]["offset"] if events else self.offset()
+        return {"total": round(total, 6), "calls": dict(calls), "upstream": {name: round(value, 6) for name, value in spent.items()}}
+
+
+class ReplayResponse:
+    """Resposta gravada com a interface usada de requests.Response e httpx.Response."""
+
+    def __init__(self, status_code: int, body: str):
+        self.status_code = status_code
+        self.text = body
+        self.content = body.encode()
+
+    def iter_content(self, chunk_size: int = 64 * 1024):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    async def aiter_bytes(self, chunk_size: int = 64 * 1024):
+        for chunk in self.iter_content(chunk_size):
+            yield chunk
+
+    def close(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+
+def recording_dir() -> Optional[str]:
+    """
+    Diretório das cassetes gravadas pela API, ou None se a gravação estiver desligada.
+
+    Variáveis de ambiente:
+        CASSETTE_DIR: liga a gravação, uma cassete .json.gz por busca nesse diretório.
+        CASSETTE_SAMPLE_RATE: fração das buscas gravadas (padrão 1.0).
+    """
+    directory = os.getenv("CASSETTE_DIR")
+    if not directory or random.random() >= float(os.getenv("CASSETTE_SAMPLE_RATE", 1.0)):
+        return None
+    return directory
+
+
+async def record_events(events: AsyncIterator[Dict], request: Dict, directory: str) -> AsyncIterator[Dict]:
+    """Repassa os eventos do pipeline gravando o tráfego externo da busca numa cassete."""
+    cassette = Cassette(request)
+    token = _current.set(cassette)
+    try:
+        async for event in events:
+            cassette.record_event(event)
+            yield event
+    finally:
+        await events.aclose()
+        try:
+            _current.reset(token)
+        except ValueError:
+            pass  # Gerador finalizado em outro contexto: a cassete daquele contexto já não importa
+        path = await asyncio.to_thread(cassette.save, directory)
+        logger.info("Cassete gravada: %s (%s interações)", path, len(cassette.interactions))
+
+
+def activate(cassette: Optional[Cassette]) -> contextvars.Token:
+    """Ativa a cassete no contexto atual (ex.: replay); devolve o token para _current.reset."""
+    return _current.set(cassette)
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """A fila atingiu max_queued: a requisição deve ser recusada (HTTP 429)."""
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    payload: Dict
+    status: str = QUEUED
+    events: List[Dict] = field(default_factory=list)
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    task: Optional[asyncio.Task] = None
+    cancel_requested: bool = False
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition)
+
+    def snapshot(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": self.events[-1] if self.events else None,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Fila de jobs assíncrona com um número fixo de workers no event loop.
+
+    handler(payload, emit) executa o job e retorna o resultado; emit(evento) publica progresso
+    para quem consulta ou assina o job. Jobs terminados saem da memória ativa e ficam no store
+    (memória + SQLite opcional) até vencer result_ttl.
+    """
+
+    def __init__(self, handler: Callable[[Dict, Callable[[Dict], Awaitable[None]]], Awaitable[Any]],
+                 workers: int = 4, max_queued: int = 32, result_ttl: float = 3600,
+                 store: Optional[TieredCache] = None):
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.store = store or TieredCache(LRUCache(maxsize=1024, ttl=result_ttl))
+        self.jobs: Dict[str, Job] = {}
+        self.counters = {"submitted": 0, "rejected": 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._idle = 0  # Workers sem job (ainda que não tenham chegado a _queue.get()): cada um pega um da fila
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._idle = self.workers
+        self._workers = [asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)]
+        logger.info("Fila de jobs iniciada com %s workers (máx. %s na fila)", self.workers, self.max_queued)
+
+    async def stop(self) -> None:
+        for job in list(self.jobs.values()):
+            self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def queued(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == QUEUED)
+
+    def waiting(self) -> int:
+        """Jobs que de fato esperam worker (os enfileirados que workers ociosos ainda não pegaram não contam)."""
+        return max(0, self.queued() - self._idle)
+
+    def running(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == RUNNING)
+
+    def submit(self, payload: Dict) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() não foi chamado")
+        if self.waiting() >= self.max_queued:
+            self.counters["rejected"] += 1
+            raise QueueFullError(f"Fila cheia ({self.max_queued} jobs aguardando)")
+        job = Job(id=uuid.uuid4().hex, payload=payload)
+        self.jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self.counters["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self.store.get(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Posição na fila (0 = próximo a rodar), ou None se o job não está aguardando."""
+        waiting = [job.id for job in self.jobs.values() if job.status == QUEUED]
+        return waiting.index(job_id) if job_id in waiting else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return False
+        job.cancel_requested = True
+        if job.task is not None:
+            job.task.cancel()  # O worker registra o cancelamento quando a task terminar
+        else:
+            # Ainda na fila: o worker descarta o job quando o tirar da fila
+            self._finish(job, CANCELLED)
+        return True
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict]:
+        """Eventos de progresso do job desde o início, terminando com o snapshot final."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            snapshot = self.store.get(job_id)
+            if snapshot is not None:
+                yield {"event": "job", **snapshot}
+            return
+        sent = 0
+        while True:
+            async with job.changed:
+                await job.changed.wait_for(lambda: len(job.events) > sent or job.status in FINISHED)
+                events, finished = job.events[sent:], job.status in FINISHED
+            for event in events:
+                yield event
+            sent += len(events)
+            if finished:
+                yield {"event": "job", **job.snapshot()}
+                return
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "running": self.running(),
+            "queued": self.waiting(),
+            "max_queued": self.max_queued,
+            **self.counters,
+        }
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._idle -= 1
+            try:
+                if job.status == QUEUED:
+                    await self._run(job)
+            finally:
+                self._idle += 1
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        job.status, job.started_at = RUNNING, time.time()
+        await self._notify(job)
+
+        async def emit(event: Dict) -> None:
+            job.events.append(event)
+            await self._notify(job)
+
+        job.task = asyncio.create_task(self.handler(job.payload, emit))
+        try:
+            job.result = await job.task
+            self._finish(job, DONE)
+        except asyncio.CancelledError:
+            # Cancelar o worker (stop) também cancela a task do job; só cancel() marca cancel_requested
+            job.task.cancel()
+            self._finish(job, CANCELLED)
+            if asyncio.current_task().cancelling():
+                raise  # O próprio worker foi cancelado: não pode voltar a _queue.get()
+            if not job.cancel_requested:
+                logger.warning("Job %s cancelado pelo próprio handler", job.id)
+        except Exception as e:
+            logger.error("Job %s falhou: %s", job.id, e)
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status, job.finished_at = status, time.time()
+        self.counters[status] += 1
+        snapshot = job.snapshot()
+        self.store.set(job.id, snapshot, self.result_ttl)
+        self.jobs.pop(job.id, None)
+        # Assinantes esperando na Condition precisam acordar mesmo sem passar pelo worker
+        asyncio.get_running_loop().create_task(self._notify(job))
+
+    @staticmethod
+    async def _notify(job: Job) -> None:
+        async with job.changed:
+            job.changed.notify_all()
+
+
+def build_job_store(path: Optional[str], result_ttl: float) -> TieredCache:
+    """Store de jobs terminados: memória e, com path, SQLite compartilhado entre processos."""
+    backend = None
+    if path:
+        try:
+            backend = SQLiteCache(path, table="jobs")
+        except Exception as e:
+            logger.warning("Store de jobs em disco indisponível (%s): %s; usando só memória", path, e)
+    return TieredCache(LRUCache(maxsize=1024, ttl=result_ttl), backend)
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.cassette import current_cassette
+from utils.single_flight import get_single_flight
+from utils.resilience import DeadlineExceeded, check_deadline, remaining
+from utils.tracing import record_cache, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache",
+                            "llm_responses.sqlite3")
+
+
+class LLMResponseCache:
+    """
+    Cache de respostas de LLM endereçado pelo conteúdo da chamada.
+
+    A chave é o SHA-256 de provedor + parâmetros da requisição (modelo, system prompt,
+    mensagens, max_tokens, temperature...), então qualquer mudança de prompt gera outra entrada.
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+        self.bypassed = 0
+
+    @staticmethod
+    def key(provider: str, params: Dict) -> str:
+        payload = json.dumps({"provider": provider, "params": params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        return self.cache.get(key)
+
+    def set(self, key: str, text: str) -> None:
+        self.cache.set(key, text)
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await self.cache.aget(key)
+
+    async def aset(self, key: str, text: str) -> None:
+        await self.cache.aset(key, text)
+
+    def stats(self) -> Dict:
+        stats = self.cache.stats()
+        stats["bypassed"] = self.bypassed
+        return stats
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Cache de respostas de LLM do processo (memória + SQLite em disco).
+
+    Variáveis de ambiente:
+        LLM_CACHE: "off" desativa o cache.
+        LLM_CACHE_PATH: arquivo SQLite (padrão .cache/llm_responses.sqlite3 na raiz do projeto).
+        LLM_CACHE_TTL: validade em segundos (padrão 7 dias).
+        LLM_CACHE_SIZE: entradas mantidas em memória (padrão 512).
+    """
+    global _llm_cache
+    if os.getenv("LLM_CACHE", "").lower() == "off":
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            memory = LRUCache(
+                maxsize=int(os.getenv("LLM_CACHE_SIZE", 512)),
+                ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+            )
+            path = os.getenv("LLM_CACHE_PATH", DEFAULT_PATH)
+            backend = None
+            try:
+                backend = SQLiteCache(path, table="llm_responses")
+            except Exception as e:
+                logger.warning("Cache de LLM em disco indisponível (%s): %s; usando só memória", path, e)
+            _llm_cache = LLMResponseCache(TieredCache(memory, backend))
+        return _llm_cache
+
+
+def cached_completion(cache: Optional[LLMResponseCache], provider: str, params: Dict,
+                      call: Callable[[], str], bypass: bool = False) -> str:
+    """
+    Retorna a resposta em cache para (provider, params) ou executa call() e guarda o texto.
+
+    Args:
+        cache: cache a usar; None desativa.
+        provider: nome do provedor, entra na chave ("anthropic", "deepseek").
+        params: parâmetros exatos enviados ao SDK.
+        call: função que faz a chamada real e retorna o texto da resposta.
+        bypass: ignora o cache na leitura (a resposta nova ainda é gravada).
+
+    Chamadas idênticas simultâneas (mesma chave) esperam uma única requisição ao provedor,
+    mesmo com o cache desativado. Com cassete ativa (utils.cassette), a resposta é gravada nela,
+    ou, em replay, lida dela sem chamar o provedor. Com o prazo da busca esgotado
+    (utils.resilience), levanta DeadlineExceeded sem chamar o provedor.
+    """
+    key = LLMResponseCache.key(provider, params)
+    cassette = current_cassette()
+    if cassette is not None and cassette.replaying:
+        return cassette.replay_llm(key)
+    began = time.perf_counter()
+    check_deadline("a chamada ao LLM")
+    with span("llm", provider=provider, cache_hit=False) as current:
+        if cache is not None:
+            if bypass:
+                cache.bypassed += 1
+            else:
+                text = cache.get(key)
+                record_cache("llm", hits=int(text is not None), misses=int(text is None))
+                if text is not None:
+                    logger.debug("Resposta do LLM servida do cache (%s)", key[:12])
+                    current.set(cache_hit=True)
+                    if cassette is not None:
+                        cassette.record_llm(provider, key, text, time.perf_counter() - began, "cache")
+                    return text
+
+        def fetch():
+            text = call()
+            if cache is not None:
+                cache.set(key, text)
+            return text
+
+        text = get_single_flight("llm").do(key, fetch)
+    if cassette is not None:
+        cassette.record_llm(provider, key, text, time.perf_counter() - began, "upstream")
+    return text
+
+
+async def acached_completion(cache: Optional[LLMResponseCache], provider: str, params: Dict,
+                             call: Callable[[], Awaitable[str]], bypass: bool = False) -> str:
+    """
+    Equivalente assíncrono de cached_completion; o SQLite é lido e gravado fora do event loop e a
+    espera pelo provedor é limitada ao que resta do prazo da busca.
+    """
+    key = LLMResponseCache.key(provider, params)
+    cassette = current_cassette()
+    if cassette is not None and cassette.replaying:
+        return cassette.replay_llm(key)
+    began = time.perf_counter()
+    left = check_deadline("a chamada ao LLM")
+    with span("llm", provider=provider, cache_hit=False) as current:
+        if cache is not None:
+            if bypass:
+                cache.bypassed += 1
+            else:
+                text = await cache.aget(key)
+                record_cache("llm", hits=int(text is not None), misses=int(text is None))
+                if text is not None:
+                    logger.debug("Resposta do LLM servida do cache (%s)", key[:12])
+                    current.set(cache_hit=True)
+                    if cassette is not None:
+                        cassette.record_llm(provider, key, text, time.perf_counter() - began, "cache")
+                    return text
+
+        async def fetch():
+            text = await call()
+            if cache is not None:
+                await cache.aset(key, text)
+            return text
+
+        # O single-flight protege a chamada compartilhada: estourar o prazo cancela só esta espera
+        try:
+            text = await asyncio.wait_for(get_single_flight("llm", asynchronous=True).do(key, fetch), left)
+        except asyncio.TimeoutError:
+            if left is None or remaining() > 0:
+                raise
+            raise DeadlineExceeded("Prazo da busca esgotado esperando o LLM") from None
+    if cassette is not None:
+        cassette.record_llm(provider, key, text, time.perf_counter() - began, "upstream")
+    return text
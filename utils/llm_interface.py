@@ -1,11 +1,12 @@
 from openai import OpenAI, OpenAIError
 import os
 import logging
+from utils.llm_cache import cached_completion, get_llm_cache
 
 logger = logging.getLogger(__name__)
 
 class LLMInterface:
-    def __init__(self):
+    def __init__(self, use_cache=True):
         api_key = os.getenv("DEEPSEEK_API_KEY")
         if not api_key:
             raise ValueError("DEEPSEEK_API_KEY não definida no .env")
@@ -14,25 +15,30 @@ class LLMInterface:
             base_url="https://api.deepseek.com"
         )
         self.model = "deepseek-reasoner"
+        self.cache = get_llm_cache() if use_cache else None
 
-    def generate(self, prompt):
-        logger.debug(f"Enviando prompt para DeepSeek: {prompt}")
+    def generate(self, prompt, bypass_cache=False):
+        logger.debug("Enviando prompt para DeepSeek: %s", prompt)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            params = {
+                "model": self.model,
+                "messages": [
                     {"role": "system", "content": "You are a helpful assistant"},
                     {"role": "user", "content": prompt}
                 ],
-                max_tokens=int(os.getenv("DEFAULT_MAX_OUTPUT_TOKENS", 4000)),
-                stream=False
+                "max_tokens": int(os.getenv("DEFAULT_MAX_OUTPUT_TOKENS", 4000)),
+                "stream": False
+            }
+            content = cached_completion(
+                self.cache, "deepseek", params,
+                lambda: self.client.chat.completions.create(**params).choices[0].message.content,
+                bypass=bypass_cache
             )
-            content = response.choices[0].message.content
-            logger.debug(f"Resposta da DeepSeek: {content}")
+            logger.debug("Resposta da DeepSeek: %s", content)
             return content
         except OpenAIError as e:
-            logger.error(f"Erro na API DeepSeek: {e}")
+            logger.error("Erro na API DeepSeek: %s", e)
             return "Erro na resposta da LLM"
         except Exception as e:
-            logger.error(f"Erro inesperado ao chamar DeepSeek API: {e}")
+            logger.error("Erro inesperado ao chamar DeepSeek API: %s", e)
             return "Erro desconhecido"
\ No newline at end of file
@@ -0,0 +1,140 @@
+import bisect
+import threading
+from typing import Dict, List, Tuple, Union
+
+# Buckets em segundos, pensados para latências de rede (eutils/Claude)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Histograma de latências thread-safe, com séries separadas por labels.
+
+    Cada série guarda contagem por bucket (cumulativa só na exportação), soma e total,
+    no mesmo formato usado pelo Prometheus.
+    """
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], Dict] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> List[Dict]:
+        """Retorna uma cópia das séries com buckets cumulativos (le -> contagem)."""
+        with self._lock:
+            result = []
+            for key, series in self._series.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+                result.append({
+                    "labels": dict(key),
+                    "buckets": buckets,
+                    "sum": series["sum"],
+                    "count": series["count"],
+                })
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Contador monotônico thread-safe, com séries separadas por labels."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [{"labels": dict(key), "value": value} for key, value in self._series.items()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+Metric = Union[Histogram, Counter]
+
+_registry: Dict[str, Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def histogram(name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Retorna o histograma registrado com esse nome, criando-o na primeira chamada."""
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = Histogram(name, description, buckets)
+            _registry[name] = metric
+        return metric
+
+
+def counter(name: str, description: str) -> Counter:
+    """Retorna o contador registrado com esse nome, criando-o na primeira chamada."""
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = Counter(name, description)
+            _registry[name] = metric
+        return metric
+
+
+def all_metrics() -> Dict[str, Metric]:
+    with _registry_lock:
+        return dict(_registry)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str], **extra) -> str:
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs.items()) + "}"
+
+
+def render_prometheus(metrics: Dict[str, Metric] = None) -> str:
+    """Métricas registradas no formato texto de exposição do Prometheus (versão 0.0.4)."""
+    lines = []
+    for name, metric in sorted((metrics if metrics is not None else all_metrics()).items()):
+        lines.append(f"# HELP {name} {_escape(metric.description)}")
+        if isinstance(metric, Counter):
+            lines.append(f"# TYPE {name} counter")
+            for series in metric.snapshot():
+                lines.append(f"{name}{_labels(series['labels'])} {series['value']}")
+            continue
+        lines.append(f"# TYPE {name} histogram")
+        for series in metric.snapshot():
+            for bound, count in series["buckets"].items():
+                lines.append(f"{name}_bucket{_labels(series['labels'], le=bound)} {count}")
+            lines.append(f"{name}_sum{_labels(series['labels'])} {series['sum']}")
+            lines.append(f"{name}_count{_labels(series['labels'])} {series['count']}")
+    return "\n".join(lines) + "\n"
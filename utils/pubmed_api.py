@@ -1,74 +1,541 @@
+import contextvars
+import os
 import requests
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from xml.etree import ElementTree as ET
-from typing import List, Dict
+from dataclasses import asdict, dataclass, field, replace
+from typing import List, Dict, Iterator, Optional, Tuple
 
-class PubmedAPI:
-    def __init__(self, email: str, api_key: str = None):
-        self.base_esearch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
-        self.base_efetch = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+from utils.article import Article, parse_article
+from utils.article_store import ArticleStore, get_article_store
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.cassette import current_cassette
+from utils.metrics import histogram
+from utils.query_syntax import canonicalize_query
+from utils.rate_limiter import TokenBucket, get_rate_limiter
+from utils.resilience import (RETRIES, TRANSIENT_STATUS, CircuitBreaker, DeadlineExceeded, bounded_timeout,
+                              get_circuit_breaker, retry_delay, wait_allowed)
+from utils.single_flight import get_single_flight
+from utils.tracing import Stopwatch, record_cache, record_stage, span
+
+# Histograma de latência por requisição ao eutils (inclui handshake quando a conexão não é reaproveitada)
+REQUEST_LATENCY = histogram(
+    "pubmed_request_latency_seconds",
+    "Latência das requisições HTTP ao E-utilities do NCBI"
+)
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+
+def build_session(pool_size: int = None) -> requests.Session:
+    """
+    Cria uma requests.Session com pool de conexões keep-alive para o eutils.
+
+    Args:
+        pool_size (int): Número máximo de conexões mantidas abertas por host
+            (padrão: PUBMED_POOL_SIZE ou 10).
+    """
+    if pool_size is None:
+        pool_size = int(os.getenv("PUBMED_POOL_SIZE", 10))
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def get_shared_session() -> requests.Session:
+    """Retorna a sessão compartilhada pelo processo, criando-a na primeira chamada."""
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = build_session()
+        return _shared_session
+
+
+@dataclass
+class ESearchResult:
+    """
+    Resultado de uma esearch com usehistory=y: contagem, primeira página de PMIDs e o
+    handle (WebEnv/query_key) do history server, reutilizável por efetch sem lista de IDs.
+    """
+    query: str
+    count: int
+    pmids: List[str] = field(default_factory=list)
+    webenv: Optional[str] = None
+    query_key: Optional[str] = None
+
+    @property
+    def has_history(self) -> bool:
+        return bool(self.webenv and self.query_key)
+
+
+_esearch_cache = None
+_esearch_cache_lock = threading.Lock()
+
+
+def get_esearch_cache() -> Optional[TieredCache]:
+    """
+    Cache de resultados do esearch (contagem + página ordenada de PMIDs) do processo.
+
+    Variáveis de ambiente:
+        PUBMED_ESEARCH_CACHE: "off" desativa o cache.
+        PUBMED_ESEARCH_CACHE_TTL: validade em segundos (padrão 300).
+        PUBMED_ESEARCH_CACHE_SIZE: entradas mantidas em memória (padrão 1024).
+        PUBMED_ESEARCH_CACHE_PATH: arquivo SQLite opcional compartilhado entre workers.
+    """
+    global _esearch_cache
+    if os.getenv("PUBMED_ESEARCH_CACHE", "").lower() == "off":
+        return None
+    with _esearch_cache_lock:
+        if _esearch_cache is None:
+            memory = LRUCache(
+                maxsize=int(os.getenv("PUBMED_ESEARCH_CACHE_SIZE", 1024)),
+                ttl=float(os.getenv("PUBMED_ESEARCH_CACHE_TTL", 300)),
+            )
+            path = os.getenv("PUBMED_ESEARCH_CACHE_PATH")
+            _esearch_cache = TieredCache(memory, SQLiteCache(path, table="esearch") if path else None)
+        return _esearch_cache
+
+
+def parse_esearch(xml_data, query: str) -> ESearchResult:
+    root = ET.fromstring(xml_data)
+    webenv = root.find("WebEnv")
+    query_key = root.find("QueryKey")
+    return ESearchResult(
+        query=query,
+        count=int(root.find(".//Count").text),
+        pmids=[id_elem.text for id_elem in root.findall(".//Id")],
+        webenv=webenv.text if webenv is not None else None,
+        query_key=query_key.text if query_key is not None else None,
+    )
+
+
+
+class ArticleStreamParser:
+    """
+    Parser incremental da resposta do efetch.
+
+    Recebe o corpo em pedaços (feed) e devolve cada PubmedArticle como Article assim que a tag fecha;
+    o elemento é limpo e removido da raiz logo depois, então a memória fica limitada a
+    um artigo por vez, independentemente do tamanho do lote.
+
+    Conta os bytes recebidos, os artigos lidos e o tempo gasto só no parse (sem a espera pela rede).
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+        self.bytes = 0
+        self.articles = 0
+        self.stopwatch = Stopwatch()
+
+    def feed(self, chunk: bytes) -> List[Article]:
+        self.bytes += len(chunk)
+        with self.stopwatch:
+            self._parser.feed(chunk)
+            return self._drain()
+
+    def close(self) -> List[Article]:
+        with self.stopwatch:
+            self._parser.close()
+            return self._drain()
+
+    def record(self, elapsed: float) -> None:
+        """Registra as etapas efetch (requisição até o último artigo) e parse do lote."""
+        record_stage("efetch", elapsed, bytes=self.bytes, articles=self.articles)
+        record_stage("parse", self.stopwatch.seconds, kind="efetch", articles=self.articles)
+
+    def _drain(self) -> List[Article]:
+        articles = []
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                continue
+            if elem.tag in ("PubmedArticle", "PubmedBookArticle"):
+                if elem.tag == "PubmedArticle":
+                    articles.append(parse_article(elem))
+                elem.clear()
+                if self._root is not None and self._root is not elem:
+                    self._root.remove(elem)
+        self.articles += len(articles)
+        return articles
+
+
+def in_request_order(articles: List[Article], pmids: Optional[List[str]]) -> List[Article]:
+    """Reordena os artigos de um lote na ordem dos PMIDs pedidos (ordem de rank do esearch)."""
+    if not pmids:
+        return articles
+    rank = {pmid: index for index, pmid in enumerate(pmids)}
+    return sorted(articles, key=lambda article: rank.get(article["pmid"], len(rank)))
+
+
+def parse_abstracts(xml_data) -> List[Article]:
+    parser = ArticleStreamParser()
+    abstracts = parser.feed(xml_data.encode() if isinstance(xml_data, str) else xml_data)
+    abstracts.extend(parser.close())
+    return abstracts
+
+
+class BasePubmedAPI:
+    """Configuração e montagem de parâmetros comuns aos clientes síncrono e assíncrono."""
+
+    def __init__(self, email: str, api_key: str = None, connect_timeout: float = None, read_timeout: float = None,
+                 rate_limiter: Optional[TokenBucket] = None, article_store: Optional[ArticleStore] = None,
+                 esearch_cache: Optional[TieredCache] = None, circuit_breaker: Optional[CircuitBreaker] = None):
+        # PUBMED_EUTILS_URL aponta para outro servidor (ex.: o fake de benchmarks/fake_eutils.py)
+        base_url = os.getenv("PUBMED_EUTILS_URL", EUTILS_URL).rstrip("/")
+        self.base_esearch = f"{base_url}/esearch.fcgi"
+        self.base_efetch = f"{base_url}/efetch.fcgi"
         self.email = email
         self.api_key = api_key
         self.retmax = 500  # Limite prático por requisição
+        self.connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv("PUBMED_CONNECT_TIMEOUT", 3.05))
+        self.read_timeout = read_timeout if read_timeout is not None else float(os.getenv("PUBMED_READ_TIMEOUT", 10))
+        # Listas grandes de PMIDs são divididas em lotes enviados por POST, em paralelo
+        self.efetch_batch_size = int(os.getenv("PUBMED_EFETCH_BATCH_SIZE", 200))
+        self.efetch_concurrency = int(os.getenv("PUBMED_EFETCH_CONCURRENCY", 4))
+        # Artigos já baixados são servidos do disco; só os PMIDs ausentes vão ao efetch.
+        # O store padrão só é aberto no primeiro efetch: importar ou instanciar não cria arquivos
+        self._article_store = article_store
+        # Queries logicamente iguais (espaços, caixa, ordem dos ORs) compartilham a mesma entrada
+        self.esearch_cache = esearch_cache if esearch_cache is not None else get_esearch_cache()
+        # Limiter proativo compartilhado pelo processo (3 req/s sem chave, 10 req/s com PUBMED_API_KEY)
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(api_key)
+        # Um breaker por servidor: falhas seguidas do eutils fazem as buscas falharem na hora, sem rede
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else get_circuit_breaker(base_url)
+        # PUBMED_HEDGE_AFTER (s): esearch sem resposta nesse tempo ganha uma cópia (só no cliente assíncrono)
+        self.hedge_after = float(os.getenv("PUBMED_HEDGE_AFTER", 0)) or None
+
+    @property
+    def article_store(self) -> Optional[ArticleStore]:
+        if current_cassette() is not None:
+            return None  # Busca gravada/reproduzida: todo artigo vem do efetch (ou da cassete)
+        return self._article_store if self._article_store is not None else get_article_store()
+
+    @article_store.setter
+    def article_store(self, store: Optional[ArticleStore]) -> None:
+        self._article_store = store
+
+    def _before_attempt(self, endpoint: str) -> None:
+        """Circuito aberto ou prazo esgotado: falha antes de gastar orçamento do rate limiter."""
+        bounded_timeout(self.read_timeout, endpoint)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_request()
+
+    def _record_outcome(self, failed: bool) -> None:
+        if self.circuit_breaker is not None:
+            if failed:
+                self.circuit_breaker.record_failure()
+            else:
+                self.circuit_breaker.record_success()
 
-    def _make_request(self, url: str, retries: int = 3, backoff: float = 1.0) -> str:
+    @staticmethod
+    def _retry_wait(endpoint: str, attempt: int, backoff: float, reason, headers=None, error: Exception = None) -> float:
+        """Espera antes da próxima tentativa; levanta DeadlineExceeded se ela não couber no prazo."""
+        delay = retry_delay(attempt, backoff, headers)
+        if not wait_allowed(delay):
+            raise DeadlineExceeded(f"Prazo da busca esgotado aguardando nova tentativa do {endpoint}") from error
+        RETRIES.inc(endpoint=endpoint, reason=reason)
+        return delay
+
+    @staticmethod
+    def _endpoint(url: str) -> str:
+        return url.rsplit("/", 1)[-1].split(".", 1)[0]
+
+    def _base_params(self) -> Dict[str, str]:
+        params = {"db": "pubmed", "email": self.email}
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+
+    def _cached_esearch(self, query: str, retmax: int) -> Optional[ESearchResult]:
+        if self.esearch_cache is None or current_cassette() is not None:
+            return None
+        return self._esearch_from_entry(query, retmax, self.esearch_cache.get(canonicalize_query(query)))
+
+    @staticmethod
+    def _esearch_from_entry(query: str, retmax: int, entry: Optional[Dict]) -> Optional[ESearchResult]:
+        if entry is None or (retmax > len(entry["pmids"]) and len(entry["pmids"]) < entry["count"]):
+            record_cache("esearch", misses=1)  # Ausente, ou a página em cache é menor que a pedida
+            return None
+        record_cache("esearch", hits=1)
+        return ESearchResult(query=query, count=entry["count"], pmids=entry["pmids"][:retmax],
+                             webenv=entry["webenv"], query_key=entry["query_key"])
+
+    def _esearch_entry(self, result: ESearchResult) -> Optional[Tuple[str, Dict]]:
+        """(chave, entrada) a gravar no cache de esearch, ou None se não houver o que gravar."""
+        if self.esearch_cache is None:
+            return None
+        key = canonicalize_query(result.query)
+        current = self.esearch_cache.memory.peek(key)
+        if current is not None and len(current["pmids"]) > len(result.pmids):
+            return None  # Não troca uma página maior por uma só de contagem
+        entry = asdict(result)
+        del entry["query"]
+        return key, entry
+
+    def _remember_esearch(self, result: ESearchResult) -> None:
+        item = self._esearch_entry(result)
+        if item is not None:
+            self.esearch_cache.set(*item)
+
+    def _esearch_key(self, query: str, retmax: int, usehistory: bool) -> Tuple:
+        """Chave de single-flight: esearches logicamente iguais em andamento viram uma só."""
+        return (self.base_esearch, self.api_key, canonicalize_query(query), retmax, usehistory)
+
+    def _efetch_key(self, pmids: List[str] = None, history: ESearchResult = None,
+                    retstart: int = 0, retmax: int = None) -> Tuple:
+        if pmids is not None:
+            return (self.base_efetch, self.api_key, tuple(pmids))
+        return (self.base_efetch, self.api_key, history.webenv, history.query_key, tuple(history.pmids), retstart, retmax)
+
+    @staticmethod
+    def _for_query(result: ESearchResult, query: str) -> ESearchResult:
+        """Resultado compartilhado com outra grafia da mesma query: devolve com a query de quem pediu."""
+        return result if result.query == query else replace(result, query=query)
+
+    def _esearch_params(self, query: str, retmax: int, usehistory: bool = False) -> Dict:
+        params = self._base_params()
+        params.update({
+            "term": query,
+            "retmax": retmax,
+        })
+        if usehistory:
+            params["usehistory"] = "y"
+        return params
+
+    def _efetch_params(self, pmids: List[str]) -> Dict:
+        params = self._base_params()
+        params.update({
+            "id": ",".join(pmids),
+            "retmode": "xml",
+        })
+        return params
+
+    def _efetch_history_params(self, history: ESearchResult, retstart: int = 0, retmax: int = None) -> Dict:
+        """Parâmetros de efetch lendo do history server (sem lista de IDs na URL)."""
+        params = self._base_params()
+        params.update({
+            "WebEnv": history.webenv,
+            "query_key": history.query_key,
+            "retstart": retstart,
+            "retmax": retmax if retmax is not None else len(history.pmids),
+            "retmode": "xml",
+        })
+        return params
+
+    @staticmethod
+    def _known_pmids(pmids: List[str] = None, history: ESearchResult = None,
+                     retstart: int = 0, retmax: int = None) -> Optional[List[str]]:
+        """PMIDs que um efetch vai retornar, quando dá para saber sem consultar o history server."""
+        if pmids is not None:
+            return pmids
+        if history is None:
+            return None
+        end = len(history.pmids) if retmax is None else retstart + retmax
+        if end <= len(history.pmids) or len(history.pmids) >= history.count:
+            return history.pmids[retstart:end]
+        return None
+
+    def _efetch_batches(self, pmids: List[str] = None, history: ESearchResult = None,
+                        retstart: int = 0, retmax: int = None) -> List[Tuple[Dict, Optional[List[str]]]]:
+        """
+        Divide o efetch em lotes de efetch_batch_size.
+
+        Returns:
+            list: pares (params, pmids do lote); pmids é None para lotes lidos do history server,
+            que já chegam na ordem do esearch.
+        """
+        size = self.efetch_batch_size
+        if pmids is None and history is not None and history.has_history:
+            total = retmax if retmax is not None else len(history.pmids)
+            end = retstart + total
+            return [
+                (self._efetch_history_params(history, start, min(size, end - start)), None)
+                for start in range(retstart, end, size)
+            ]
+        ids = pmids if pmids is not None else history.pmids
+        return [(self._efetch_params(ids[i:i + size]), ids[i:i + size]) for i in range(0, len(ids), size)]
+
+
+class PubmedAPI(BasePubmedAPI):
+    def __init__(self, email: str, api_key: str = None, session: Optional[requests.Session] = None,
+                 connect_timeout: float = None, read_timeout: float = None, rate_limiter: Optional[TokenBucket] = None,
+                 article_store: Optional[ArticleStore] = None, esearch_cache: Optional[TieredCache] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        super().__init__(email, api_key, connect_timeout, read_timeout, rate_limiter, article_store, esearch_cache,
+                         circuit_breaker)
+        # Sessão com pool compartilhada entre todas as instâncias (evita um handshake TCP+TLS por chamada)
+        self.session = session if session is not None else get_shared_session()
+        self.timeout = (self.connect_timeout, self.read_timeout)
+
+    def _send(self, url: str, params: Dict = None, stream: bool = False, method: str = "GET",
+              retries: int = 3, backoff: float = 1.0) -> requests.Response:
+        """
+        Requisição ao eutils com novas tentativas (backoff com jitter) para 429, 5xx, conexão
+        recusada/resetada e timeout; passa pelo circuit breaker e respeita o prazo da busca
+        (utils.resilience), que também limita o timeout de cada tentativa.
+        """
+        endpoint = self._endpoint(url)
+        cassette = current_cassette()
+        if cassette is not None and cassette.replaying:
+            return cassette.replay_eutils(endpoint, method, params)
+        began = time.perf_counter()
+        error = None
         for attempt in range(retries):
+            self._before_attempt(endpoint)
+            self.rate_limiter.acquire()
+            timeout = (bounded_timeout(self.connect_timeout, endpoint), bounded_timeout(self.read_timeout, endpoint))
+            start = time.perf_counter()
+            response = None
             try:
-                response = requests.get(url, timeout=10)
+                # POST leva os parâmetros no corpo: listas longas de IDs não estouram o limite de URL
+                query, body = (None, params) if method == "POST" else (params, None)
+                response = self.session.request(method, url, params=query, data=body, timeout=timeout, stream=stream)
+                self._record_outcome(response.status_code >= 500)
                 response.raise_for_status()
-                return response.text
+                if cassette is not None:
+                    # Gravando: o corpo é lido inteiro (iter_content continua funcionando a partir dele)
+                    cassette.record_eutils(endpoint, method, params, response.status_code, response.text,
+                                           time.perf_counter() - began)
+                return response
             except requests.exceptions.HTTPError as e:
-                if response.status_code == 429:
-                    time.sleep(backoff * (2 ** attempt))  # Backoff exponencial
-                    continue
-                raise e
-        raise Exception("Max retries exceeded")
+                response.close()
+                if response.status_code not in TRANSIENT_STATUS:
+                    raise e
+                error, reason, headers = e, response.status_code, response.headers
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if isinstance(e, requests.exceptions.Timeout) and not wait_allowed(0):
+                    raise DeadlineExceeded(f"Prazo da busca esgotado durante o {endpoint}") from e
+                self._record_outcome(True)
+                error, reason, headers = e, type(e).__name__, None
+            finally:
+                status = response.status_code if response is not None else "error"
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+            if attempt + 1 < retries:
+                time.sleep(self._retry_wait(endpoint, attempt, backoff, reason, headers, error))
+        raise Exception(f"Max retries exceeded ({endpoint}): {error}") from error
+
+    def _make_request(self, url: str, params: Dict = None, retries: int = 3, backoff: float = 1.0) -> str:
+        return self._send(url, params, retries=retries, backoff=backoff).text
 
     def count_results(self, query: str) -> int:
-        params = {
-            "db": "pubmed",
-            "term": query,
-            "email": self.email,
-            "retmax": 0,  # Só contar, sem retornar PMIDs
-            "api_key": self.api_key
-        }
-        url = f"{self.base_esearch}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
-        xml_data = self._make_request(url)
-        root = ET.fromstring(xml_data)
-        count = int(root.find(".//Count").text)
-        return count
+        return self.esearch(query, retmax=0, usehistory=False).count  # Só contar, sem retornar PMIDs
 
     def fetch_pmids(self, query: str, retmax: int) -> List[str]:
-        params = {
-            "db": "pubmed",
-            "term": query,
-            "email": self.email,
-            "retmax": retmax,
-            "api_key": self.api_key
-        }
-        url = f"{self.base_esearch}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
-        xml_data = self._make_request(url)
-        root = ET.fromstring(xml_data)
-        return [id_elem.text for id_elem in root.findall(".//Id")]
-
-    def fetch_abstracts(self, pmids: List[str]) -> List[Dict[str, str]]:
-        params = {
-            "db": "pubmed",
-            "id": ",".join(pmids),
-            "retmode": "xml",
-            "email": self.email,
-            "api_key": self.api_key
-        }
-        url = f"{self.base_efetch}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
-        xml_data = self._make_request(url)
-        root = ET.fromstring(xml_data)
-        abstracts = []
-        for article in root.findall(".//PubmedArticle"):
-            pmid = article.find(".//PMID").text
-            abstract_elem = article.find(".//AbstractText")
-            abstract = abstract_elem.text if abstract_elem is not None else ""
-            abstracts.append({"pmid": pmid, "abstract": abstract})
-        return abstracts
+        return self.esearch(query, retmax, usehistory=False).pmids
+
+    def esearch(self, query: str, retmax: int, usehistory: bool = True) -> ESearchResult:
+        """Uma única esearch que retorna contagem, primeira página de PMIDs e o handle do history server."""
+        with span("esearch", retmax=retmax, cache_hit=False) as current:
+            cached = self._cached_esearch(query, retmax)
+            if cached is not None:
+                current.set(cache_hit=True)
+                return cached
+
+            def call():
+                xml_data = self._make_request(self.base_esearch, self._esearch_params(query, retmax, usehistory))
+                current.set(bytes=len(xml_data))
+                with span("parse", kind="esearch"):
+                    result = parse_esearch(xml_data, query)
+                self._remember_esearch(result)
+                return result
+
+            # Chamadas concorrentes com a mesma query (normalizada) esperam uma única requisição
+            result = get_single_flight("esearch").do(self._esearch_key(query, retmax, usehistory), call)
+            return self._for_query(result, query)
+
+    def _iter_batch(self, params: Dict, chunk_size: int = 64 * 1024) -> Iterator[Article]:
+        start = time.perf_counter()
+        response = self._send(self.base_efetch, params, stream=True, method="POST")
+        parser = ArticleStreamParser()
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                yield from parser.feed(chunk)
+            yield from parser.close()
+        finally:
+            response.close()
+            parser.record(time.perf_counter() - start)
+
+    def _fetch_batch(self, params: Dict, pmids: Optional[List[str]]) -> List[Article]:
+        return in_request_order(list(self._iter_batch(params)), pmids)
+
+    def iter_abstracts(self, pmids: List[str] = None, history: ESearchResult = None,
+                       retstart: int = 0, retmax: int = None) -> Iterator[Article]:
+        """
+        Gera os artigos na ordem do esearch, servindo do article store os PMIDs já conhecidos
+        e buscando no efetch (em streaming) apenas os que faltam.
+        """
+        wanted = self._known_pmids(pmids, history, retstart, retmax) if self.article_store is not None else None
+        cached = self.article_store.get_many(wanted) if wanted else {}
+        if wanted:
+            record_cache("article_store", hits=len(cached), misses=len(wanted) - len(cached))
+        if not cached:
+            yield from self._store_through(self._iter_efetch(pmids, history, retstart, retmax))
+            return
+        missing = [pmid for pmid in wanted if pmid not in cached]
+        fetched = {}
+        if missing:
+            fetched = {article["pmid"]: article for article in self._store_through(self._iter_efetch(missing))}
+        for pmid in wanted:
+            article = cached.get(pmid) or fetched.get(pmid)
+            if article is not None:
+                yield article
+
+    def _store_through(self, articles: Iterator[Article], flush_every: int = 100) -> Iterator[Article]:
+        """Repassa os artigos e grava no article store em blocos, sem acumular o lote inteiro."""
+        if self.article_store is None:
+            yield from articles
+            return
+        pending = []
+        for article in articles:
+            pending.append(article)
+            if len(pending) >= flush_every:
+                self.article_store.put_many(pending)
+                pending = []
+            yield article
+        self.article_store.put_many(pending)
+
+    def _iter_efetch(self, pmids: List[str] = None, history: ESearchResult = None,
+                     retstart: int = 0, retmax: int = None) -> Iterator[Article]:
+        """
+        Faz o efetch em streaming e gera cada artigo assim que ele é lido, na ordem do esearch.
+
+        Listas maiores que efetch_batch_size viram lotes buscados em paralelo (dentro do
+        rate limit); cada lote é emitido assim que ele e os anteriores terminam.
+        """
+        batches = self._efetch_batches(pmids, history, retstart, retmax)
+        if len(batches) == 1 and batches[0][1] is None:
+            # Lote único do history server já vem na ordem do esearch: repassa em streaming
+            yield from self._iter_batch(batches[0][0])
+            return
+        workers = min(len(batches), self.efetch_concurrency)
+        if workers <= 1:
+            for params, batch_pmids in batches:
+                yield from self._fetch_batch(params, batch_pmids)
+            return
+        # Cada lote roda numa cópia do contexto atual: a cassete ativa (se houver) segue para as threads
+        contexts = [contextvars.copy_context() for _ in batches]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for articles in executor.map(lambda context, batch: context.run(self._fetch_batch, *batch), contexts, batches):
+                yield from articles
+
+    def fetch_abstracts(self, pmids: List[str] = None, history: ESearchResult = None,
+                        retstart: int = 0, retmax: int = None) -> List[Article]:
+        articles = get_single_flight("efetch").do(
+            self._efetch_key(pmids, history, retstart, retmax),
+            lambda: list(self.iter_abstracts(pmids, history, retstart, retmax))
+        )
+        return list(articles)
 
 # Exemplo de uso no api.py
 from fastapi import FastAPI
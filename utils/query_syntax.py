@@ -0,0 +1,115 @@
+import re
+from typing import List, Optional, Tuple, Union
+
+OPERATORS = ("AND", "OR", "NOT")
+
+# Frase entre aspas ou palavra, ambas com tag de campo opcional ([tiab], [MeSH Terms]...), ou parênteses
+_TOKEN = re.compile(r'"[^"]*"(?:\[[^\]]*\])?|\(|\)|[^\s()"\[]+(?:\[[^\]]*\])?')
+
+Node = List[Union[str, "Node"]]
+
+
+def tokenize(query: str) -> List[str]:
+    return _TOKEN.findall(query or "")
+
+
+def _normalize_token(token: str) -> str:
+    if token in OPERATORS:
+        return token
+    # O PubMed não diferencia maiúsculas nos termos nem nas tags de campo; só os operadores booleanos
+    return " ".join(token.lower().split())
+
+
+def _parse(tokens: List[str], index: int = 0, depth: int = 0, normalize: bool = True) -> Tuple[Node, int]:
+    node: Node = []
+    while index < len(tokens):
+        token = tokens[index]
+        if token == "(":
+            child, index = _parse(tokens, index + 1, depth + 1, normalize)
+            node.append(child)
+            continue
+        if token == ")":
+            if depth == 0:
+                raise ValueError("Parêntese fechado sem abertura")
+            return node, index + 1
+        node.append(_normalize_token(token) if normalize else token)
+        index += 1
+    if depth != 0:
+        raise ValueError("Parêntese aberto sem fechamento")
+    return node, index
+
+
+def parse_query(query: str, normalize: bool = True) -> Optional[Node]:
+    """Converte a query em árvore de grupos (listas aninhadas) ou None se os parênteses não fecham."""
+    try:
+        node, _ = _parse(tokenize(query), normalize=normalize)
+    except ValueError:
+        return None
+    return node
+
+
+def _is_alternating(node: Node) -> bool:
+    """Operandos e operadores alternados (a OR b AND c), sem AND implícito entre termos."""
+    if len(node) % 2 == 0:
+        return False
+    for position, item in enumerate(node):
+        is_operator = isinstance(item, str) and item in OPERATORS
+        if is_operator != (position % 2 == 1):
+            return False
+    return True
+
+
+def _unwrap(node: Node) -> Node:
+    while len(node) == 1 and isinstance(node[0], list):
+        node = node[0]
+    return node
+
+
+def _render(node: Node) -> str:
+    node = _unwrap(node)
+    parts = [f"({_render(item)})" if isinstance(item, list) else item for item in node]
+    operators = set(parts[1::2])
+    if _is_alternating(node) and len(operators) == 1 and operators <= {"OR", "AND"}:
+        # (B OR A OR A) e (A OR B) são a mesma busca: ordena e remove repetidos (idem para AND)
+        return f" {operators.pop()} ".join(sorted(set(parts[0::2])))
+    return " ".join(parts)
+
+
+def parse_blocks(query: str) -> Optional[List[List[str]]]:
+    """
+    Lê uma query no formato do refinador, (A OR B ...) AND (C OR D ...), como lista de blocos de termos.
+
+    Retorna None para qualquer outra estrutura (NOT, grupos aninhados, AND implícito, operadores mistos).
+    """
+    node = parse_query(query, normalize=False)
+    if node is None:
+        return None
+    node = _unwrap(node)
+    if not _is_alternating(node) or set(node[1::2]) - {"AND"}:
+        return None
+    blocks = []
+    for item in node[0::2]:
+        group = _unwrap(item) if isinstance(item, list) else [item]
+        if not _is_alternating(group) or set(group[1::2]) - {"OR"} or any(isinstance(term, list) for term in group):
+            return None
+        blocks.append(group[0::2])
+    return blocks
+
+
+def render_blocks(blocks: List[List[str]]) -> str:
+    return " AND ".join(f"({' OR '.join(terms)})" for terms in blocks)
+
+
+def canonicalize_query(query: str) -> str:
+    """
+    Forma canônica de uma query do PubMed, usada como chave de cache.
+
+    Normaliza espaços, coloca termos e tags de campo em minúsculas (mantendo AND/OR/NOT),
+    ordena e deduplica os operandos de cada grupo que usa só OR (ou só AND) e remove
+    parênteses redundantes.
+    Queries com parênteses desbalanceados caem numa forma só com espaços e caixa normalizados.
+    """
+    node = parse_query(query)
+    if node is None:
+        return " ".join(_normalize_token(token) for token in tokenize(query))
+    return _render(node)
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from utils.metrics import histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o limite entre processos não está disponível
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Limites do NCBI E-utilities (requisições por segundo)
+RATE_WITHOUT_KEY = 3.0
+RATE_WITH_KEY = 10.0
+
+WAIT_TIME = histogram(
+    "pubmed_rate_limit_wait_seconds",
+    "Tempo de espera na fila do rate limiter antes de cada requisição ao eutils",
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, capacity: float,
+            block: bool = True) -> Tuple[float, Optional[float]]:
+    """
+    Reserva um token e retorna (tokens restantes, espera em segundos).
+
+    Os tokens podem ficar negativos: cada valor abaixo de zero é uma reserva já feita por
+    quem está esperando, o que garante ordem FIFO sem precisar de fila explícita.
+    Com block=False só reserva se houver token livre agora; senão a espera é None.
+    """
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if not block and tokens < 1:
+        return tokens, None
+    tokens -= 1
+    wait = -tokens / rate if tokens < 0 else 0.0
+    return tokens, wait
+
+
+class TokenBucket:
+    """
+    Token bucket compartilhado por threads e tasks asyncio do mesmo processo.
+
+    A reserva é feita sob um threading.Lock (rápido, nunca bloqueia esperando token);
+    quem chamou dorme depois, com time.sleep ou asyncio.sleep conforme o contexto.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, name: str = "eutils"):
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, block: bool = True) -> Optional[float]:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens, wait = _refill(self._tokens, self._updated, now, self.rate, self.capacity, block)
+            self._updated = now
+            return wait
+
+    def acquire(self) -> float:
+        """Bloqueia a thread até haver orçamento; retorna o tempo esperado."""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        WAIT_TIME.observe(wait, limiter=self.name)
+        return wait
+
+    async def acquire_async(self) -> float:
+        """Equivalente assíncrono de acquire(), sem bloquear o event loop."""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        WAIT_TIME.observe(wait, limiter=self.name)
+        return wait
+
+    def try_acquire(self) -> bool:
+        """Reserva um token só se houver um livre agora, sem esperar (ex.: requisições hedge)."""
+        return self._reserve(block=False) is not None
+
+
+class FileTokenBucket(TokenBucket):
+    """
+    Token bucket cujo estado fica num arquivo local protegido por flock, para que
+    vários workers do uvicorn dividam o mesmo orçamento do NCBI.
+    """
+
+    def __init__(self, path: str, rate: float, capacity: float = 1.0, name: str = "eutils"):
+        super().__init__(rate, capacity, name)
+        self.path = path
+
+    def _reserve(self, block: bool = True) -> Optional[float]:
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()  # Relógio comum a todos os processos
+                raw = os.read(fd, 64).decode().split()
+                tokens, updated = (float(raw[0]), float(raw[1])) if len(raw) == 2 else (self.capacity, now)
+                tokens, wait = _refill(tokens, updated, now, self.rate, self.capacity, block)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, f"{tokens:.6f} {now:.6f}".encode())
+                return wait
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+_limiters: Dict[Tuple[float, Optional[str]], TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str = None) -> TokenBucket:
+    """
+    Retorna o limiter do processo para o orçamento correspondente à chave configurada.
+
+    Variáveis de ambiente:
+        PUBMED_RATE_LIMIT: sobrescreve o limite (req/s); padrão 10 com API key, 3 sem.
+        PUBMED_RATE_BURST: tamanho máximo de rajada (padrão 1, espaçamento uniforme).
+        PUBMED_RATE_LIMIT_FILE: arquivo de estado para dividir o orçamento entre processos.
+    """
+    rate = float(os.getenv("PUBMED_RATE_LIMIT", RATE_WITH_KEY if api_key else RATE_WITHOUT_KEY))
+    capacity = float(os.getenv("PUBMED_RATE_BURST", 1))
+    path = os.getenv("PUBMED_RATE_LIMIT_FILE") or None
+    if path and fcntl is None:
+        logger.warning("PUBMED_RATE_LIMIT_FILE ignorado: flock indisponível nesta plataforma")
+        path = None
+    key = (rate, path)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            if path:
+                limiter = FileTokenBucket(path, rate, capacity)
+            else:
+                limiter = TokenBucket(rate, capacity)
+            _limiters[key] = limiter
+        return limiter
@@ -0,0 +1,192 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+from utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+# Respostas do eutils que valem nova tentativa; 429 é limite de taxa, os demais são falha do servidor
+TRANSIENT_STATUS = frozenset({429, 500, 502, 503, 504})
+MAX_BACKOFF = 10.0
+
+CIRCUIT_TRANSITIONS = counter("pubmed_circuit_transitions_total", "Mudanças de estado do circuit breaker do eutils")
+CIRCUIT_REJECTIONS = counter("pubmed_circuit_rejections_total", "Requisições recusadas com o circuito aberto")
+RETRIES = counter("pubmed_retries_total", "Novas tentativas de requisições ao eutils por motivo")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """O prazo total da busca (deadline_seconds) acabou antes da etapa terminar."""
+
+
+class CircuitOpenError(Exception):
+    """O eutils falhou seguidamente; as requisições são recusadas sem ir à rede até o próximo teste."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuito {name} aberto: eutils indisponível, nova tentativa em {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# --- prazo ---
+
+def set_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """
+    Define o prazo da busca no contexto atual (herdado por tasks e cópias de contexto criadas
+    depois). Um prazo já ativo e mais curto prevalece; None mantém o atual.
+    """
+    current = _deadline.get()
+    if seconds is None:
+        return _deadline.set(current)
+    deadline = time.monotonic() + seconds
+    return _deadline.set(deadline if current is None else min(current, deadline))
+
+
+def reset_deadline(token: contextvars.Token) -> None:
+    try:
+        _deadline.reset(token)
+    except ValueError:
+        pass  # Gerador finalizado em outro contexto: o prazo daquele contexto já não importa
+
+
+def remaining() -> Optional[float]:
+    """Segundos até o prazo da busca atual, ou None se não houver prazo."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(stage: str = "busca") -> Optional[float]:
+    """Levanta DeadlineExceeded se o prazo acabou; senão devolve o tempo restante (ou None)."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Prazo da busca esgotado antes de {stage}")
+    return left
+
+
+def bounded_timeout(timeout: float, stage: str = "requisição") -> float:
+    """Timeout de uma operação limitado ao que resta do prazo."""
+    left = check_deadline(stage)
+    return timeout if left is None else min(timeout, left)
+
+
+# --- novas tentativas ---
+
+def retry_delay(attempt: int, backoff: float, headers: Optional[Mapping] = None) -> float:
+    """
+    Espera antes da tentativa attempt + 1: Retry-After do servidor, se houver, ou backoff
+    exponencial com jitter completo (uniforme entre 0 e backoff * 2^attempt), para que clientes
+    que falharam juntos não voltem todos no mesmo instante.
+    """
+    retry_after = headers.get("Retry-After") if headers is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_BACKOFF)
+    return random.uniform(0, min(MAX_BACKOFF, backoff * (2 ** attempt)))
+
+
+def wait_allowed(delay: float) -> bool:
+    """A espera cabe no prazo (com folga para a própria requisição)?"""
+    left = remaining()
+    return left is None or delay < left
+
+
+# --- circuit breaker ---
+
+class CircuitBreaker:
+    """
+    Circuit breaker por servidor, compartilhado por threads e tasks do processo.
+
+    closed: requisições normais; failure_threshold falhas seguidas (5xx, conexão, timeout) abrem
+    o circuito. open: tudo é recusado com CircuitOpenError por reset_timeout segundos.
+    half_open: passa uma única requisição de teste; sucesso fecha, falha reabre. Se o teste não
+    voltar (cancelado), outro é liberado depois de reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            CIRCUIT_TRANSITIONS.inc(breaker=self.name, state=state)
+            log = logger.warning if state == "open" else logger.info
+            log("Circuito %s: %s (%s falhas seguidas)", self.name, state, self.failures)
+
+    def before_request(self) -> None:
+        """Reserva a passagem de uma requisição; levanta CircuitOpenError se o circuito recusar."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == "open":
+                waited = now - self._opened_at
+                if waited < self.reset_timeout:
+                    CIRCUIT_REJECTIONS.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self._transition("half_open")
+                self._probe_started = now
+                return
+            if self.state == "half_open":
+                if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                    CIRCUIT_REJECTIONS.inc(breaker=self.name)
+                    raise CircuitOpenError(self.name, self.reset_timeout - (now - self._probe_started))
+                self._probe_started = now
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._probe_started = None
+            self._transition("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+                self._transition("open")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> Optional[CircuitBreaker]:
+    """
+    Retorna o breaker do processo para o servidor `name` (ex.: a URL base do eutils).
+
+    Variáveis de ambiente:
+        PUBMED_BREAKER: "off" desativa o circuit breaker.
+        PUBMED_BREAKER_FAILURES: falhas seguidas que abrem o circuito (padrão 5).
+        PUBMED_BREAKER_RESET: segundos com o circuito aberto antes do teste (padrão 30).
+    """
+    if os.getenv("PUBMED_BREAKER", "").lower() == "off":
+        return None
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=int(os.getenv("PUBMED_BREAKER_FAILURES", 5)),
+                reset_timeout=float(os.getenv("PUBMED_BREAKER_RESET", 30)),
+            )
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    with _breakers_lock:
+        return {name: breaker.stats() for name, breaker in _breakers.items()}
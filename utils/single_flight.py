@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from utils.cassette import current_cassette
+
+logger = logging.getLogger(__name__)
+
+
+def _enabled() -> bool:
+    # Com cassete ativa, cada busca faz as próprias chamadas para que a gravação fique completa
+    return os.getenv("SINGLE_FLIGHT", "").lower() != "off" and current_cassette() is None
+
+
+class SingleFlight:
+    """
+    Coalescência de chamadas idênticas em andamento (threads): quem chega com a mesma chave
+    enquanto a primeira chamada roda espera por ela e recebe o mesmo resultado (ou exceção).
+    Nada fica guardado depois que a chamada termina; isso é papel dos caches.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.joined = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "_Call"] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not _enabled():
+            return fn()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.joined += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict:
+        return {"leaders": self.leaders, "joined": self.joined, "in_flight": len(self._calls)}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AsyncSingleFlight:
+    """
+    Versão asyncio do SingleFlight: a primeira chamada vira uma task compartilhada pelas demais.
+    Cada chamador espera com shield, então cancelar um deles não cancela a chamada dos outros.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.joined = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not _enabled():
+            return await fn()
+        task = self._tasks.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.joined += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            self.leaders += 1
+            task.add_done_callback(lambda done: self._tasks.pop(key, None) if self._tasks.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {"leaders": self.leaders, "joined": self.joined, "in_flight": len(self._tasks)}
+
+
+_flights: Dict[str, Any] = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str, asynchronous: bool = False):
+    """
+    SingleFlight (ou AsyncSingleFlight) do processo registrado com esse nome.
+
+    Variáveis de ambiente:
+        SINGLE_FLIGHT: "off" desativa a coalescência (cada chamada vai ao upstream).
+    """
+    key = f"{name}:async" if asynchronous else name
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = (AsyncSingleFlight if asynchronous else SingleFlight)(key)
+        return flight
+
+
+def flight_stats() -> Dict[str, Dict]:
+    with _flights_lock:
+        return {name: flight.stats() for name, flight in _flights.items()}
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional
+
+from utils.query_syntax import parse_blocks
+
+logger = logging.getLogger(__name__)
+
+# O esearch não devolve mais que 10000 PMIDs por requisição
+MAX_CAP = 10_000
+
+
+class TermMatrix:
+    """
+    PMIDs de cada termo (OR-term) guardados como bitmaps sobre um espaço denso de índices, para
+    contar localmente qualquer combinação (A OR B ...) AND (C OR D ...) dos termos.
+
+    Os índices seguem a ordem decrescente de PMID. Um termo com mais resultados que o cap só é
+    conhecido até o menor PMID da sua página; a contagem é então feita dentro da janela de PMIDs
+    que todos os termos da query cobrem e extrapolada pela razão total/janela dos próprios termos.
+    O esearch não tem ordenação por PMID: a página vem na ordem padrão do PubMed (mais recentes
+    primeiro, por data de entrada), que só aproxima a decrescente de PMID, então com termos
+    truncados a contagem é uma estimativa aproximada (o QueryTuner confere a query escolhida).
+    Sem termos truncados, a contagem é exata.
+    """
+
+    def __init__(self, postings: Dict[str, List[str]], totals: Dict[str, int]):
+        self.postings = postings
+        universe = sorted({int(pmid) for pmids in postings.values() for pmid in pmids}, reverse=True)
+        index = {pmid: position for position, pmid in enumerate(universe)}
+        # PMIDs em ordem crescente, para achar quantos índices (os primeiros) ficam acima de um corte
+        self._ascending = universe[::-1]
+        self.bitmaps: Dict[str, int] = {}
+        self.totals = totals
+        self.floors: Dict[str, Optional[int]] = {}
+        for term, pmids in postings.items():
+            positions = [index[int(pmid)] for pmid in pmids]
+            self.bitmaps[term] = _bitmap(positions)
+            # Termo truncado: só os PMIDs >= floor são conhecidos
+            self.floors[term] = min(map(int, pmids)) if pmids and len(pmids) < totals[term] else None
+
+    @classmethod
+    async def build(cls, api, terms: Iterable[str], cap: int = 2000, base: Optional["TermMatrix"] = None) -> "TermMatrix":
+        """
+        Uma esearch por termo (concorrentes, via cache de esearch quando ativo). Com base, só os
+        termos que ela ainda não tem vão ao eutils; se não faltar nenhum, a própria base é devolvida.
+        """
+        terms = [term for term in dict.fromkeys(terms) if base is None or term not in base.postings]
+        if base is not None and not terms:
+            return base
+        cap = min(cap, MAX_CAP)
+        results = await asyncio.gather(*(api.esearch(term, retmax=cap, usehistory=False) for term in terms))
+        postings = dict(base.postings) if base is not None else {}
+        totals = dict(base.totals) if base is not None else {}
+        postings.update({term: result.pmids for term, result in zip(terms, results)})
+        totals.update({term: result.count for term, result in zip(terms, results)})
+        matrix = cls(postings, totals)
+        logger.info("Matriz de termos: %s termos (%s novos), %s PMIDs distintos, exata: %s",
+                    len(postings), len(terms), len(matrix._ascending), matrix.exact)
+        return matrix
+
+    def missing(self, terms: Iterable[str]) -> List[str]:
+        return [term for term in dict.fromkeys(terms) if term not in self.postings]
+
+    @property
+    def exact(self) -> bool:
+        return all(floor is None for floor in self.floors.values())
+
+    def covers(self, blocks: List[List[str]]) -> bool:
+        return all(term in self.bitmaps for terms in blocks for term in terms)
+
+    def count(self, blocks: List[List[str]]) -> int:
+        """Contagem (exata, ou estimada se houver termo truncado) da interseção das uniões dos blocos."""
+        intersection = None
+        for terms in blocks:
+            union = 0
+            for term in terms:
+                union |= self.bitmaps[term]
+            intersection = union if intersection is None else intersection & union
+        terms = [term for block in blocks for term in block]
+        floors = [self.floors[term] for term in terms if self.floors[term] is not None]
+        if not floors:
+            return intersection.bit_count()
+        # Janela que todos os termos cobrem: PMIDs >= o maior dos cortes (os primeiros índices)
+        window = (1 << (len(self._ascending) - bisect_right(self._ascending, max(floors) - 1))) - 1
+        seen = sum((self.bitmaps[term] & window).bit_count() for term in terms)
+        if not seen:
+            return 0
+        scale = sum(self.totals[term] for term in terms) / seen
+        return round((intersection & window).bit_count() * scale)
+
+    def count_query(self, query: str) -> Optional[int]:
+        """Contagem local de uma query no formato de blocos, ou None se ela usa termos fora da matriz."""
+        blocks = parse_blocks(query)
+        if not blocks or not self.covers(blocks):
+            return None
+        return self.count(blocks)
+
+
+def _bitmap(positions: Iterable[int]) -> int:
+    """Inteiro com os bits das posições ligados, montado num bytearray (linear no número de posições)."""
+    positions = list(positions)
+    if not positions:
+        return 0
+    buffer = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
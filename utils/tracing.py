@@ -0,0 +1,125 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from utils.metrics import counter, histogram
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry é opcional: sem ele, só as métricas do Prometheus
+    otel_trace = None
+
+logger = logging.getLogger(__name__)
+
+# Buckets mais finos embaixo: parse e resumo ficam na casa dos milissegundos
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_LATENCY = histogram(
+    "pubmed_stage_seconds",
+    "Duração de cada etapa da busca (validate, refine, llm, esearch, efetch, parse, summarize)",
+    STAGE_BUCKETS,
+)
+STAGE_BYTES = counter("pubmed_stage_bytes_total", "Bytes recebidos do eutils por etapa")
+CACHE_REQUESTS = counter("pubmed_cache_requests_total", "Consultas aos caches locais por resultado (hit/miss)")
+
+# Atributos que viram label no Prometheus; os demais (iteration, query...) só vão para o log e o trace
+_METRIC_LABELS = ("cache_hit",)
+
+
+def _tracer():
+    """Tracer do OpenTelemetry, se instalado e ligado por PUBMED_OTEL=on (o exportador é do SDK)."""
+    if otel_trace is None or os.getenv("PUBMED_OTEL", "").lower() != "on":
+        return None
+    return otel_trace.get_tracer("pubmed_search")
+
+
+class Span:
+    """Etapa em andamento; set() acrescenta atributos conhecidos só no meio dela (bytes, cache_hit)."""
+
+    __slots__ = ("stage", "attributes")
+
+    def __init__(self, stage: str, attributes: Dict):
+        self.stage = stage
+        self.attributes = attributes
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+
+def _observe(stage: str, elapsed: float, attributes: Dict) -> None:
+    labels = {name: str(attributes[name]).lower() for name in _METRIC_LABELS if name in attributes}
+    STAGE_LATENCY.observe(elapsed, stage=stage, **labels)
+    if attributes.get("bytes"):
+        STAGE_BYTES.inc(attributes["bytes"], stage=stage)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %.1f ms %s", stage, elapsed * 1000, attributes)
+
+
+def _otel_attributes(attributes: Dict) -> Dict:
+    return {name: value if isinstance(value, (bool, int, float, str)) else str(value)
+            for name, value in attributes.items() if value is not None}
+
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[Span]:
+    """
+    Mede a etapa no histograma pubmed_stage_seconds{stage} e, com OpenTelemetry ligado,
+    abre um span filho do span atual.
+
+    Não use em volta de um yield de gerador: o contexto do trace seria trocado no meio do
+    consumidor. Para etapas medidas aos pedaços, use record_stage.
+    """
+    current = Span(stage, attributes)
+    tracer = _tracer()
+    start = time.perf_counter()
+    try:
+        if tracer is None:
+            yield current
+        else:
+            with tracer.start_as_current_span(f"pubmed.{stage}") as otel_span:
+                try:
+                    yield current
+                finally:
+                    otel_span.set_attributes(_otel_attributes(current.attributes))
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _observe(stage, time.perf_counter() - start, current.attributes)
+
+
+def record_stage(stage: str, elapsed: float, **attributes) -> None:
+    """Registra uma etapa já medida (ex.: parse acumulado ao longo do streaming de um lote)."""
+    _observe(stage, elapsed, attributes)
+    tracer = _tracer()
+    if tracer is not None:
+        end = time.time_ns()
+        otel_span = tracer.start_span(f"pubmed.{stage}", start_time=end - int(elapsed * 1e9),
+                                      attributes=_otel_attributes(attributes))
+        otel_span.end(end_time=end)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0) -> None:
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache, result="miss")
+
+
+class Stopwatch:
+    """Soma o tempo de vários trechos (with stopwatch: ...), para etapas intercaladas com outras."""
+
+    __slots__ = ("seconds", "_start")
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._start: Optional[float] = None
+
+    def __enter__(self) -> "Stopwatch":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.seconds += time.perf_counter() - self._start